@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Compare GRIB2 decoding through cfgrib against the direct eccodes engine.
+
+    python benchmarks/bench_grib.py [--rows 3500 --cols 7000] [--repeat 3]
+
+A synthetic MRMS-sized message is written gzipped. cfgrib is timed cold
+(decompress and index the file) and warm (index already in the cache).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic import write_mesh
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--rows', type=int, default=3500)
+    p.add_argument('--cols', type=int, default=7000)
+    p.add_argument('--repeat', type=int, default=3)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # a private cache, so the cfgrib index starts cold
+        os.environ['MESH_CACHE_DIR'] = os.path.join(tmp, 'cache')
+        from process_mesh import load_mesh
+
+        path = write_mesh(tmp, 'grib2.gz', args.rows, args.cols)
+        runs = [('cfgrib cold', 'cfgrib', 1), ('cfgrib warm', 'cfgrib', args.repeat),
+                ('eccodes', 'eccodes', args.repeat)]
+        for label, engine, repeat in runs:
+            best = float('inf')
+            for _ in range(repeat):
+                t = time.perf_counter()
+                load_mesh(path, engine=engine)
+                best = min(best, time.perf_counter() - t)
+            print(f'{label:>12}: {best:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
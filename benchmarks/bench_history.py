@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Compare a point history lookup in the index against rescanning raw files.
+
+    python benchmarks/bench_history.py [--files 48 --rows 3500 --cols 7000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mesh_utils import append_history, point_history, sample
+from process_mesh import load_mesh
+from synthetic import write_mesh
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--files', type=int, default=48)
+    p.add_argument('--rows', type=int, default=3500)
+    p.add_argument('--cols', type=int, default=7000)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = datetime(2024, 5, 1)
+        files = []
+        for i in range(args.files):
+            when = start + timedelta(minutes=30 * i)
+            files.append(write_mesh(tmp, 'nc.gz', args.rows, args.cols, seed=i, when=when))
+        index = os.path.join(tmp, 'history.h5')
+
+        t = time.perf_counter()
+        append_history(index, files)
+        build = time.perf_counter() - t
+
+        lat, lon = 39.74, -104.99
+        t = time.perf_counter()
+        hits = point_history(index, lat, lon, radius_km=5)
+        indexed = time.perf_counter() - t
+
+        t = time.perf_counter()
+        scanned = 0
+        for path in files:
+            lats, lons, data = load_mesh(path)
+            scanned += int(np.isfinite(sample(lats, lons, data, [lat], [lon], radius_km=5))[0])
+        rescan = time.perf_counter() - t
+
+        assert scanned == len(hits)
+        print(f'index build: {build:.2f} s for {args.files} files '
+              f'({os.path.getsize(index) / 2 ** 20:.1f} MiB)')
+        print(f'indexed query: {indexed * 1000:.1f} ms ({len(hits)} hits)')
+        print(f'rescan query:  {rescan * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
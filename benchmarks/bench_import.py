@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Measure start-up import time of the command-line entry points.
+
+    python benchmarks/bench_import.py [--repeat 5] [--budget-ms 400]
+
+Each module is imported in a fresh interpreter with ``-X importtime`` and
+the best cumulative time is reported. With ``--budget-ms`` the exit status
+is 1 if any module goes over, so the check can run in CI.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ('mesh_cli', 'realtime', 'mesh_utils', 'process_mesh')
+
+
+def import_us(module: str) -> int:
+    """Return the cumulative import time of ``module`` in microseconds."""
+    err = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                         cwd=ROOT, check=True, capture_output=True, text=True).stderr
+    for line in err.splitlines():
+        fields = [f.strip() for f in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1])
+    raise RuntimeError(f'no importtime line for {module}')
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('--budget-ms', type=float)
+    args = p.parse_args()
+
+    over = False
+    for module in MODULES:
+        ms = min(import_us(module) for _ in range(args.repeat)) / 1000
+        flag = ''
+        if args.budget_ms is not None and ms > args.budget_ms:
+            over = True
+            flag = f'  over {args.budget_ms:.0f} ms budget'
+        print(f'{module:>12}: {ms:7.1f} ms{flag}')
+    sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Compare gzip loading in ``load_mesh`` against the old temp-file approach.
+
+Each variant runs in a fresh interpreter with imports done up front, so
+the reported peak RSS growth covers the load alone.
+
+    python benchmarks/bench_load_mesh.py [--rows 3500 --cols 7000]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from synthetic import write_mesh
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LEGACY = '''
+import gzip, os
+import numpy as np
+from netCDF4 import Dataset
+path = {path!r}
+tmp_path = path[:-3]
+with gzip.open(path, "rb") as f_in, open(tmp_path, "wb") as f_out:
+    f_out.write(f_in.read())
+ds = Dataset(tmp_path)
+data = np.array(ds.variables["MESH"][:])
+lats = np.array(ds.variables["lat"][:])
+lons = np.array(ds.variables["lon"][:])
+ds.close()
+os.remove(tmp_path)
+'''
+
+CURRENT = '''
+lats, lons, data = load_mesh({path!r})
+'''
+
+RUNNER = '''
+import resource, sys, time
+sys.path.insert(0, {root!r})
+import numpy, netCDF4
+from process_mesh import load_mesh
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base)
+'''
+
+
+def run(body: str, path: str):
+    code = RUNNER.format(root=ROOT, body=body.format(path=path))
+    out = subprocess.run([sys.executable, '-c', code], check=True,
+                         capture_output=True, text=True).stdout
+    elapsed, rss = out.split()
+    return float(elapsed), int(rss)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--rows', type=int, default=3500)
+    p.add_argument('--cols', type=int, default=7000)
+    p.add_argument('--repeat', type=int, default=3)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_mesh(tmp, 'nc.gz', args.rows, args.cols)
+        for name, body in (('temp file', LEGACY), ('in memory', CURRENT)):
+            runs = [run(body, path) for _ in range(args.repeat)]
+            best = min(r[0] for r in runs)
+            rss = max(r[1] for r in runs)
+            print(f'{name:>10}: {best:.3f} s, peak RSS growth {rss / 1024:.0f} MiB')
+
+
+if __name__ == '__main__':
+    main()
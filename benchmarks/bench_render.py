@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Compare overlay rendering with matplotlib pcolormesh against the raster engine.
+
+    python benchmarks/bench_render.py [--rows 3500 --cols 7000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mesh_utils import save_overlay
+from synthetic import conus_coords, mesh_field
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--rows', type=int, default=3500)
+    p.add_argument('--cols', type=int, default=7000)
+    args = p.parse_args()
+
+    lats, lons = conus_coords(args.rows, args.cols)
+    data = mesh_field(args.rows, args.cols)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for engine in ('raster', 'matplotlib'):
+            path = os.path.join(tmp, f'{engine}.png')
+            t = time.perf_counter()
+            save_overlay(lats, lons, data, path, engine=engine)
+            elapsed = time.perf_counter() - t
+            print(f'{engine:>10}: {elapsed:.2f} s, {os.path.getsize(path) / 2 ** 20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""Time the main loading, rendering and CLI paths on synthetic MRMS-sized files.
+
+    python benchmarks/bench_suite.py [--size conus|small] [--only 'load_mesh*']
+    python benchmarks/bench_suite.py --save main          # record a baseline
+    python benchmarks/bench_suite.py --compare main       # exit 1 on regressions
+
+Every case runs in a fresh interpreter. Inputs are loaded and modules
+imported before the clock starts, so a case's time covers only its own
+step. Peak memory is how far the process high-water RSS rose during that
+step. For CLI cases it is the peak RSS of the whole command, with the
+command's wall time including interpreter start-up.
+
+Baselines are JSON files in ``benchmarks/baselines/``, one per name. They
+depend on the machine, so compare against a baseline recorded on the same
+host.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from synthetic import FORMATS, write_mesh
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+SIZES = {'conus': (3500, 7000), 'small': (700, 1400)}
+# changes smaller than this are noise, whatever the ratio
+NOISE = {'seconds': 0.05, 'peak_mib': 5.0}
+
+RUNNER = '''
+import json, os, resource, subprocess, sys, time
+sys.path.insert(0, {root!r})
+P = {paths!r}
+OUT = {out!r}
+CLI = [sys.executable, os.path.join({root!r}, 'mesh_cli.py'), '--no-cache']
+
+def status_kib(field):
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field))
+
+{setup}
+try:
+    # reset the high-water mark so set-up peaks do not hide the step's
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    base, peak = status_kib('VmRSS'), lambda: status_kib('VmHWM')
+except OSError:
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak = lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+grown = peak() - base
+child = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+print(json.dumps({{'seconds': elapsed, 'peak_kib': max(grown, child)}}))
+'''
+
+LOADED = '''
+from process_mesh import load_mesh
+from mesh_utils import {names}
+import matplotlib.pyplot as plt
+{imports}
+lats, lons, data = load_mesh(P['nc'])
+'''
+
+
+def loaded(names: str, imports: str = '') -> str:
+    """Set-up importing ``names`` from mesh_utils, plus the lazy ``imports`` they use."""
+    return LOADED.format(names=names, imports=imports)
+
+
+# name -> (setup, body); P holds the input paths and OUT a scratch directory
+CASES = {
+    **{f'load_mesh[{fmt}]': ('import netCDF4, eccodes\nfrom process_mesh import load_mesh',
+                             f'load_mesh(P[{fmt!r}])') for fmt in FORMATS},
+    'load_mesh[nc.gz,sparse]': ('import netCDF4\nfrom process_mesh import load_mesh',
+                                "load_mesh(P['nc.gz'], sparse=True)"),
+    'make_figure': (loaded('make_figure'),
+                    'fig = make_figure(lats, lons, data)'),
+    'save_figure': (loaded('make_figure, save_figure')
+                    + 'fig = make_figure(lats, lons, data)',
+                    "save_figure(fig, os.path.join(OUT, 'figure.png'))"),
+    'save_overlay': (loaded('save_overlay'),
+                     "save_overlay(lats, lons, data, os.path.join(OUT, 'overlay.png'))"),
+    'save_geotiff': (loaded('save_geotiff',
+                            'import rasterio.shutil, rasterio.transform, rasterio.windows'),
+                     "save_geotiff(lats, lons, data, os.path.join(OUT, 'mesh.tif'))"),
+    'save_docx': (loaded('make_figure, save_docx', 'import docx')
+                  + 'fig = make_figure(lats, lons, data)',
+                  "save_docx(fig, os.path.join(OUT, 'report.docx'))"),
+    'make_contour': (loaded('make_contour'),
+                     'fig = make_contour(lats, lons, data)'),
+    'save_animation': (loaded('save_animation'),
+                       "save_animation(P['frames'], os.path.join(OUT, 'anim.gif'), jobs=1)"),
+    'cli --help': ('', "subprocess.run(CLI + ['--help'], check=True, stdout=subprocess.DEVNULL)"),
+    'mesh-watch --help': ('', "subprocess.run([sys.executable, os.path.join({root!r}, 'realtime.py'),"
+                              " '--help'], check=True, stdout=subprocess.DEVNULL)".format(root=ROOT)),
+    'cli plot': ('', "subprocess.run(CLI + ['plot', P['grib2.gz'], '--png', os.path.join(OUT, 'p.png'),"
+                     " '--geotiff', os.path.join(OUT, 'p.tif')], check=True)"),
+}
+
+
+def make_inputs(out_dir: str, rows: int, cols: int, frames: int) -> dict:
+    """Write one file per format plus ``frames`` gzipped netCDF animation frames."""
+    paths = {}
+    for fmt in FORMATS:
+        fmt_dir = os.path.join(out_dir, fmt)
+        os.makedirs(fmt_dir)
+        paths[fmt] = write_mesh(fmt_dir, fmt, rows, cols)
+    frame_dir = os.path.join(out_dir, 'frames')
+    os.makedirs(frame_dir)
+    start = datetime(2024, 5, 1)
+    paths['frames'] = [write_mesh(frame_dir, 'nc.gz', rows, cols, seed=i,
+                                  when=start + timedelta(minutes=2 * i))
+                       for i in range(frames)]
+    return paths
+
+
+def run_case(name: str, paths: dict, out_dir: str, env: dict) -> dict:
+    setup, body = CASES[name]
+    code = RUNNER.format(root=ROOT, paths=paths, out=out_dir, setup=setup, body=body)
+    proc = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f'{name} failed:\n{proc.stderr}')
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """Print the change against ``baseline`` and return whether anything regressed."""
+    regressed = False
+    for name, now in results.items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        ratios = {key: now[key] / old[key] if old[key] else 1.0 for key in ('seconds', 'peak_mib')}
+        worse = [key for key, ratio in ratios.items()
+                 if ratio > 1 + tolerance and now[key] - old[key] > NOISE[key]]
+        regressed |= bool(worse)
+        print(f'{name:>26}: time x{ratios["seconds"]:.2f}, memory x{ratios["peak_mib"]:.2f}'
+              + ('  REGRESSED' if worse else ''))
+    return regressed
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--size', choices=sorted(SIZES), default='conus')
+    p.add_argument('--repeat', type=int, default=3, help='Runs per case; the best is kept')
+    p.add_argument('--frames', type=int, default=4, help='Files in the animation case')
+    p.add_argument('--only', help='Run the cases matching this glob')
+    p.add_argument('--save', metavar='NAME', help='Store the results as baseline NAME')
+    p.add_argument('--compare', metavar='NAME', help='Compare with baseline NAME')
+    p.add_argument('--tolerance', type=float, default=0.25,
+                   help='Allowed slowdown or memory growth before a case counts as regressed')
+    args = p.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, args.compare + '.json')) as f:
+            baseline = json.load(f)
+        if baseline['size'] != args.size:
+            p.error(f"baseline {args.compare!r} was recorded at --size {baseline['size']}")
+    names = [n for n in CASES if not args.only or fnmatch.fnmatch(n, args.only)]
+    rows, cols = SIZES[args.size]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_inputs(tmp, rows, cols, args.frames)
+        out_dir = os.path.join(tmp, 'out')
+        os.makedirs(out_dir)
+        # a private grid cache, so nothing is served from a previous run
+        env = dict(os.environ, MESH_CACHE_DIR=os.path.join(tmp, 'cache'), MPLBACKEND='Agg')
+        for name in names:
+            runs = [run_case(name, paths, out_dir, env) for _ in range(args.repeat)]
+            results[name] = {'seconds': round(min(r['seconds'] for r in runs), 4),
+                             'peak_mib': round(max(r['peak_kib'] for r in runs) / 1024, 1)}
+            print(f'{name:>26}: {results[name]["seconds"]:8.3f} s '
+                  f'{results[name]["peak_mib"]:8.1f} MiB', flush=True)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        record = {'size': args.size, 'python': platform.python_version(),
+                  'machine': platform.machine(), 'cpus': os.cpu_count(),
+                  'recorded': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                  'results': results}
+        with open(os.path.join(BASELINE_DIR, args.save + '.json'), 'w') as f:
+            json.dump(record, f, indent=2)
+            f.write('\n')
+    if baseline is not None and compare(results, baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
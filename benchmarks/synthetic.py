@@ -0,0 +1,139 @@
+"""Realistic synthetic MESH files for benchmarks.
+
+Grids default to the MRMS CONUS layout: 3500 x 7000 cells of 0.01 degree
+from 54.995N, 129.995W, rows running north to south. Hail falls in a few
+dozen elongated storm swaths that peak along their track and taper to the
+edges, so about 1% of cells are non-zero, as on an active convective day.
+Files can be written as netCDF, GRIB2 (0..360 longitudes, as MRMS ships
+them) or gzipped copies of either.
+"""
+import gzip
+import os
+import shutil
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+
+CONUS_SHAPE = (3500, 7000)
+FORMATS = ('nc', 'nc.gz', 'grib2', 'grib2.gz')
+NORTH = 54.995
+WEST = -129.995
+STEP = 0.01
+
+
+def conus_coords(rows: int = CONUS_SHAPE[0],
+                 cols: int = CONUS_SHAPE[1]) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the cell-centre latitudes (descending) and longitudes of the grid."""
+    lats = np.round(NORTH - STEP * np.arange(rows), 3)
+    lons = np.round(WEST + STEP * np.arange(cols), 3)
+    return lats, lons
+
+
+def mesh_field(rows: int = CONUS_SHAPE[0], cols: int = CONUS_SHAPE[1], seed: int = 0,
+               coverage: float = 0.01) -> np.ndarray:
+    """Return a float32 MESH grid (mm) of storm swaths covering ``coverage`` of the cells.
+
+    Each swath is a straight track 50-400 cells long and 4-20 cells in
+    half-width. Its peak size is gamma distributed around 1" and values
+    fall off with distance from the track, rounded to 0.1 mm as in MRMS.
+    """
+    rng = np.random.default_rng(seed)
+    data = np.zeros((rows, cols), dtype=np.float32)
+    target = coverage * rows * cols
+    covered = 0
+    while covered < target:
+        length = rng.uniform(50, 400) * min(1.0, max(rows, cols) / 1000)
+        width = rng.uniform(4, 20)
+        heading = rng.uniform(0, np.pi / 2)   # storms move east to north-east
+        r0, c0 = rng.uniform(0, rows), rng.uniform(0, cols)
+        r1, c1 = r0 - length * np.sin(heading), c0 + length * np.cos(heading)
+        peak = 10.0 + rng.gamma(2.0, 8.0)
+
+        top = int(max(min(r0, r1) - width, 0))
+        bottom = int(min(max(r0, r1) + width + 1, rows))
+        left = int(max(min(c0, c1) - width, 0))
+        right = int(min(max(c0, c1) + width + 1, cols))
+        if top >= bottom or left >= right:
+            continue
+        rr, cc = np.mgrid[top:bottom, left:right].astype(np.float32)
+        # distance of each cell from the track segment
+        dr, dc = r1 - r0, c1 - c0
+        t = np.clip(((rr - r0) * dr + (cc - c0) * dc) / (dr * dr + dc * dc), 0, 1)
+        dist = np.hypot(rr - (r0 + t * dr), cc - (c0 + t * dc))
+        swath = peak * np.sqrt(np.clip(1 - dist / width, 0, None))
+        window = data[top:bottom, left:right]
+        covered += int(np.count_nonzero((swath > 0) & (window == 0)))
+        np.maximum(window, np.round(swath, 1), out=window)
+    return data
+
+
+def _gzip(path: str) -> str:
+    with open(path, 'rb') as f_in, gzip.open(path + '.gz', 'wb', compresslevel=6) as f_out:
+        shutil.copyfileobj(f_in, f_out, 1 << 20)
+    os.remove(path)
+    return path + '.gz'
+
+
+def write_netcdf(path: str, lats: np.ndarray, lons: np.ndarray, data: np.ndarray) -> None:
+    import netCDF4
+
+    with netCDF4.Dataset(path, 'w') as ds:
+        ds.createDimension('lat', lats.size)
+        ds.createDimension('lon', lons.size)
+        ds.createVariable('lat', 'f4', ('lat',))[:] = lats
+        ds.createVariable('lon', 'f4', ('lon',))[:] = lons
+        ds.createVariable('MESH', 'f4', ('lat', 'lon'))[:] = data
+
+
+def write_grib2(path: str, lats: np.ndarray, lons: np.ndarray, data: np.ndarray,
+                step: float = STEP, decimals: Optional[int] = 1) -> None:
+    """Write one simple-packed GRIB2 message, by default at 0.1 mm precision.
+
+    ``step`` is the grid spacing in degrees. With ``decimals`` None the
+    eccodes sample's packing is kept. NaN cells are left out through the
+    bitmap.
+    """
+    import eccodes
+
+    values = np.asarray(data, dtype=np.float64).ravel()
+    missing = np.isnan(values)
+    gid = eccodes.codes_new_from_samples('GRIB2', eccodes.CODES_PRODUCT_GRIB)
+    try:
+        eccodes.codes_set(gid, 'Ni', lons.size)
+        eccodes.codes_set(gid, 'Nj', lats.size)
+        eccodes.codes_set(gid, 'latitudeOfFirstGridPointInDegrees', float(lats[0]))
+        eccodes.codes_set(gid, 'longitudeOfFirstGridPointInDegrees', float(lons[0]) % 360)
+        eccodes.codes_set(gid, 'latitudeOfLastGridPointInDegrees', float(lats[-1]))
+        eccodes.codes_set(gid, 'longitudeOfLastGridPointInDegrees', float(lons[-1]) % 360)
+        eccodes.codes_set(gid, 'iDirectionIncrementInDegrees', step)
+        eccodes.codes_set(gid, 'jDirectionIncrementInDegrees', step)
+        if decimals is not None:
+            eccodes.codes_set(gid, 'decimalScaleFactor', decimals)
+        if missing.any():
+            eccodes.codes_set(gid, 'bitmapPresent', 1)
+            values = np.where(missing, eccodes.codes_get(gid, 'missingValue', float), values)
+        eccodes.codes_set_values(gid, values)
+        with open(path, 'wb') as f:
+            eccodes.codes_write(gid, f)
+    finally:
+        eccodes.codes_release(gid)
+
+
+def write_mesh(out_dir: str, fmt: str, rows: int = CONUS_SHAPE[0], cols: int = CONUS_SHAPE[1],
+               seed: int = 0, when: datetime = datetime(2024, 5, 1),
+               coverage: float = 0.01) -> str:
+    """Write a synthetic MESH file in ``fmt`` (one of ``FORMATS``) and return its path.
+
+    The name follows MRMS, e.g. ``MESH_00.50_20240501-000000.grib2.gz``.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'unknown format {fmt!r}, expected one of {FORMATS}')
+    lats, lons = conus_coords(rows, cols)
+    data = mesh_field(rows, cols, seed=seed, coverage=coverage)
+    path = os.path.join(out_dir, f'MESH_00.50_{when:%Y%m%d-%H%M%S}.{fmt.split(".")[0]}')
+    if fmt.startswith('grib2'):
+        write_grib2(path, lats, lons, data)
+    else:
+        write_netcdf(path, lats, lons, data)
+    return _gzip(path) if fmt.endswith('.gz') else path
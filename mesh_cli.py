@@ -1,73 +1,387 @@
 #!/usr/bin/env python3
 """Simple command-line interface for MESH-MAP."""
 import argparse
-from typing import List
+import glob
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Sequence, Tuple
 import os
 
+import numpy as np
+
+import mesh_trace
 from process_mesh import load_mesh
-from mesh_utils import (
-    make_figure,
-    save_figure,
-    save_overlay,
-    save_geotiff,
-    make_contour,
-    save_animation,
-    save_docx,
-)
 
 
 def cmd_plot(args: argparse.Namespace) -> None:
-    lats, lons, data = load_mesh(args.input)
+    from mesh_utils import make_figure, save_docx, save_figure, save_geotiff
+
+    lats, lons, data = load_mesh(args.input, bbox=args.bbox, cache=not args.no_cache)
     fig = make_figure(lats, lons, data)
     if args.png:
         save_figure(fig, args.png)
     if args.geotiff:
-        save_geotiff(lats, lons, data, args.geotiff)
+        save_geotiff(lats, lons, data, args.geotiff, dtype=args.geotiff_dtype,
+                     compress=args.compress)
     if args.docx:
         save_docx(fig, args.docx)
 
 
 def cmd_contour(args: argparse.Namespace) -> None:
-    lats, lons, data = load_mesh(args.input)
+    from mesh_utils import make_contour, save_figure
+
+    lats, lons, data = load_mesh(args.input, bbox=args.bbox, cache=not args.no_cache)
     fig = make_contour(lats, lons, data)
     save_figure(fig, args.output)
 
 
 def cmd_animate(args: argparse.Namespace) -> None:
-    save_animation(args.inputs, args.output)
+    from mesh_utils import save_animation
+
+    save_animation(_expand_inputs(args.inputs), args.output, bbox=args.bbox, cache=not args.no_cache,
+                   downsample=args.downsample, fps=args.fps, jobs=args.jobs, ahead=args.ahead,
+                   vmin=args.vmin, vmax=args.vmax)
+
+
+def cmd_ingest(args: argparse.Namespace) -> None:
+    from mesh_utils import find_mesh_files, ingest
+
+    files = find_mesh_files(args.inputs)
+    added = ingest(files, args.store, variable=args.variable)
+    print(f"Ingested {added} of {len(files)} files into {args.store}")
+
+
+BATCH_OUTPUTS = ("png", "geotiff", "contour", "docx")
+
+
+def _expand_inputs(items: Iterable[str]) -> List[str]:
+    """Expand globs, ``@listfile`` entries and directories into file paths."""
+    from mesh_utils import find_mesh_files
+
+    paths = []
+    for item in items:
+        if item.startswith("@"):
+            with open(item[1:]) as f:
+                paths.extend(line.strip() for line in f if line.strip())
+        elif glob.has_magic(item):
+            paths.extend(glob.glob(item))
+        else:
+            paths.append(item)
+    return find_mesh_files(paths)
+
+
+def _stem(path: str) -> str:
+    name = os.path.basename(path)
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return os.path.splitext(name)[0]
+
+
+def _batch_one(path: str, out_dir: str, outputs: Sequence[str], bbox,
+               cache: bool) -> Tuple[str, Optional[str], float]:
+    """Render ``outputs`` for one file, returning (path, error, seconds)."""
+    import matplotlib.pyplot as plt
+    from mesh_utils import make_contour, make_figure, save_docx, save_figure, save_geotiff
+
+    start = time.perf_counter()
+    try:
+        lats, lons, data = load_mesh(path, bbox=bbox, cache=cache)
+        base = os.path.join(out_dir, _stem(path))
+        if "png" in outputs or "docx" in outputs:
+            fig = make_figure(lats, lons, data)
+            if "png" in outputs:
+                save_figure(fig, base + ".png")
+            if "docx" in outputs:
+                save_docx(fig, base + ".docx")
+            plt.close(fig)
+        if "contour" in outputs:
+            fig = make_contour(lats, lons, data)
+            save_figure(fig, base + "_contour.png")
+            plt.close(fig)
+        if "geotiff" in outputs:
+            save_geotiff(lats, lons, data, base + ".tif")
+    except Exception as exc:
+        return path, f"{type(exc).__name__}: {exc}", time.perf_counter() - start
+    return path, None, time.perf_counter() - start
+
+
+def cmd_batch(args: argparse.Namespace) -> None:
+    files = _expand_inputs(args.inputs)
+    outputs = [o.strip() for o in args.outputs.split(",") if o.strip()]
+    unknown = set(outputs) - set(BATCH_OUTPUTS)
+    if unknown:
+        raise SystemExit(f"unknown outputs: {', '.join(sorted(unknown))}")
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    results = []
+    task = (args.out_dir, outputs, args.bbox, not args.no_cache)
+    if args.jobs == 1:
+        results = [_batch_one(path, *task) for path in files]
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = {pool.submit(_batch_one, path, *task): path for path in files}
+            for fut in as_completed(futures):
+                try:
+                    results.append(fut.result())
+                except Exception as exc:  # worker died, e.g. out of memory
+                    results.append((futures[fut], f"{type(exc).__name__}: {exc}", 0.0))
+    elapsed = time.perf_counter() - start
+
+    failed = [(path, err) for path, err, _ in results if err]
+    print(f"Processed {len(results)} files in {elapsed:.1f} s: "
+          f"{len(results) - len(failed)} ok, {len(failed)} failed")
+    for path, err in failed:
+        print(f"  FAILED {path}: {err}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({
+                "elapsed": elapsed,
+                "files": [{"path": p, "error": e, "seconds": s} for p, e, s in sorted(results)],
+            }, f, indent=2)
+    if failed:
+        sys.exit(1)
+
+
+def _utc(value: str) -> datetime:
+    """Parse an ISO or MRMS-style (YYYYMMDD-HHMMSS) timestamp as UTC."""
+    try:
+        when = datetime.strptime(value, "%Y%m%d-%H%M%S")
+    except ValueError:
+        when = datetime.fromisoformat(value)
+    return when.replace(tzinfo=when.tzinfo or timezone.utc)
+
+
+def cmd_composite(args: argparse.Namespace) -> None:
+    from mesh_utils import composite
+
+    comp = composite(_expand_inputs(args.inputs), threshold=args.threshold, bbox=args.bbox,
+                     start=args.start, end=args.end, jobs=args.jobs)
+    print(f"Composited {comp.files} files")
+    if args.png or args.docx:
+        from mesh_utils import make_figure, save_docx, save_figure
+
+        fig = make_figure(comp.lats, comp.lons, comp.max)
+        if args.png:
+            save_figure(fig, args.png)
+        if args.docx:
+            save_docx(fig, args.docx)
+    if args.geotiff:
+        from mesh_utils import save_geotiff
+
+        save_geotiff(comp.lats, comp.lons, comp.max, args.geotiff)
+    if args.npz:
+        np.savez_compressed(args.npz, lats=comp.lats, lons=comp.lons, max=comp.max,
+                            first_time=comp.first_time, count=comp.count)
+
+
+def cmd_query(args: argparse.Namespace) -> None:
+    from mesh_utils import query_table, select_files
+
+    files = select_files(_expand_inputs(args.inputs), args.start, args.end)
+    n = query_table(args.points, files, args.output, radius_km=args.radius_km, jobs=args.jobs)
+    print(f"Queried {n} points against {len(files)} files")
+
+
+def cmd_index_history(args: argparse.Namespace) -> None:
+    from mesh_utils import append_history
+
+    files = _expand_inputs(args.inputs)
+    added = append_history(args.index, files, threshold=args.threshold)
+    print(f"Indexed {added} of {len(files)} files into {args.index}")
+
+
+def cmd_history(args: argparse.Namespace) -> None:
+    from mesh_utils import point_history
+
+    for when, value in point_history(args.index, args.lat, args.lon, radius_km=args.radius_km,
+                                     min_value=args.min):
+        print(f"{when:%Y-%m-%d %H:%M:%S}Z  {value:.1f}")
+
+
+def cmd_geocode(args: argparse.Namespace) -> None:
+    from mesh_utils import Geocoder, NominatimBackend, OfflineBackend, geocode_table
+
+    backend = OfflineBackend.from_csv(args.offline) if args.offline else NominatimBackend()
+    geocoder = Geocoder(backend, min_interval=args.min_interval)
+    found = geocode_table(args.input, args.output, geocoder, column=args.column, jobs=args.jobs)
+    print(f"Geocoded {found} addresses into {args.output}")
+
+
+def cmd_tiles(args: argparse.Namespace) -> None:
+    from mesh_utils import make_tiles
+
+    root, written = make_tiles(args.input, out_dir=args.out_dir, min_zoom=args.min_zoom,
+                               max_zoom=args.max_zoom, jobs=args.jobs, cache=not args.no_cache)
+    print(f"Wrote {written} tiles under {root}")
+
+
+def cmd_polygons(args: argparse.Namespace) -> None:
+    from mesh_utils import file_polygons, write_polygons
+
+    levels = [v * 25.4 for v in args.levels]
+    features = file_polygons(args.input, levels=levels, bbox=args.bbox, simplify=args.simplify,
+                             cache=not args.no_cache)
+    write_polygons(features, args.output)
+    print(f"Wrote {len(features)} swath bands to {args.output}")
+
+
+def _add_bbox(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--bbox", nargs=4, type=float,
+                   metavar=("SOUTH", "WEST", "NORTH", "EAST"),
+                   help="Only load the grid window inside this box (degrees)")
 
 
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="MESH-MAP CLI")
+    p.add_argument("--no-cache", action="store_true",
+                   help="Always decode files instead of using the decoded-grid cache")
+    p.add_argument("--profile", metavar="PATH",
+                   help="Write timing spans to PATH (Chrome trace, or JSON lines for .jsonl)")
     sub = p.add_subparsers(dest="cmd")
 
     plot_p = sub.add_parser("plot", help="Plot single file")
     plot_p.add_argument("input")
     plot_p.add_argument("--png")
-    plot_p.add_argument("--geotiff")
+    plot_p.add_argument("--geotiff", help="Write a cloud-optimised GeoTIFF")
+    plot_p.add_argument("--geotiff-dtype", default="float32",
+                        choices=("float32", "uint16", "uint8"),
+                        help="Quantise to integers with a stored scale (uint16: 0.01 mm, uint8: 1 mm)")
+    plot_p.add_argument("--compress", default="deflate", choices=("deflate", "zstd", "lzw"))
     plot_p.add_argument("--docx")
+    _add_bbox(plot_p)
     plot_p.set_defaults(func=cmd_plot)
 
     contour_p = sub.add_parser("contour", help="Generate contour map")
     contour_p.add_argument("input")
     contour_p.add_argument("output")
+    _add_bbox(contour_p)
     contour_p.set_defaults(func=cmd_contour)
 
     anim_p = sub.add_parser("animate", help="Animate multiple files")
     anim_p.add_argument("output")
-    anim_p.add_argument("inputs", nargs="+")
+    anim_p.add_argument("inputs", nargs="+",
+                        help="Files, directories, globs or @file lists")
+    anim_p.add_argument("--downsample", type=int, default=1,
+                        help="Max-pool each grid by this factor before rendering")
+    anim_p.add_argument("--fps", type=float, default=2)
+    anim_p.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1)
+    anim_p.add_argument("--ahead", type=int,
+                        help="Frames decoded ahead of the writer (default: twice --jobs)")
+    anim_p.add_argument("--vmin", type=float, help="Fixed colour scale minimum (mm)")
+    anim_p.add_argument("--vmax", type=float, help="Fixed colour scale maximum (mm)")
+    _add_bbox(anim_p)
     anim_p.set_defaults(func=cmd_animate)
 
+    ingest_p = sub.add_parser("ingest", help="Append files to a chunked HDF5 store")
+    ingest_p.add_argument("store")
+    ingest_p.add_argument("inputs", nargs="+", help="MESH files or directories of them")
+    ingest_p.add_argument("--variable", help="Product variable to store")
+    ingest_p.set_defaults(func=cmd_ingest)
+
+    comp_p = sub.add_parser("composite", help="Max-composite many files into a swath")
+    comp_p.add_argument("inputs", nargs="+",
+                        help="Files, directories, globs or @file lists")
+    comp_p.add_argument("--start", type=_utc, help="First valid time (YYYYMMDD-HHMMSS or ISO)")
+    comp_p.add_argument("--end", type=_utc, help="Last valid time (YYYYMMDD-HHMMSS or ISO)")
+    comp_p.add_argument("--threshold", type=float, default=2.0,
+                        help="MESH for first-exceed time and exceed count")
+    comp_p.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1)
+    comp_p.add_argument("--png")
+    comp_p.add_argument("--geotiff")
+    comp_p.add_argument("--docx")
+    comp_p.add_argument("--npz", help="Save max, first_time and count grids")
+    _add_bbox(comp_p)
+    comp_p.set_defaults(func=cmd_composite)
+
+    query_p = sub.add_parser("query", help="Max hail at many lat/lon points")
+    query_p.add_argument("points", help="CSV or Parquet table with lat/lon columns")
+    query_p.add_argument("output", help="CSV or Parquet output table")
+    query_p.add_argument("inputs", nargs="+",
+                         help="Files, directories, globs or @file lists")
+    query_p.add_argument("--radius-km", type=float, default=0,
+                         help="Take the max within this distance of each point")
+    query_p.add_argument("--start", type=_utc)
+    query_p.add_argument("--end", type=_utc)
+    query_p.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1)
+    query_p.set_defaults(func=cmd_query)
+
+    index_p = sub.add_parser("index-history", help="Append files to a per-cell history index")
+    index_p.add_argument("index")
+    index_p.add_argument("inputs", nargs="+",
+                         help="Files, directories, globs or @file lists")
+    index_p.add_argument("--threshold", type=float, default=2.0,
+                         help="Only store cells at or above this MESH")
+    index_p.set_defaults(func=cmd_index_history)
+
+    hist_p = sub.add_parser("history", help="List hail dates at a point from a history index")
+    hist_p.add_argument("index")
+    hist_p.add_argument("lat", type=float)
+    hist_p.add_argument("lon", type=float)
+    hist_p.add_argument("--radius-km", type=float, default=0)
+    hist_p.add_argument("--min", type=float, default=0, help="Only list MESH at or above this")
+    hist_p.set_defaults(func=cmd_history)
+
+    geo_p = sub.add_parser("geocode", help="Add lat/lon columns to a CSV of addresses")
+    geo_p.add_argument("input")
+    geo_p.add_argument("output", help="CSV or Parquet output table")
+    geo_p.add_argument("--column", default="address")
+    geo_p.add_argument("--jobs", "-j", type=int, default=1)
+    geo_p.add_argument("--min-interval", type=float,
+                       help="Seconds between provider requests (default: provider policy)")
+    geo_p.add_argument("--offline", metavar="CSV",
+                       help="Resolve from an address,lat,lon table instead of Nominatim")
+    geo_p.set_defaults(func=cmd_geocode)
+
+    tiles_p = sub.add_parser("tiles", help="Cut a file into an XYZ map tile pyramid")
+    tiles_p.add_argument("input")
+    tiles_p.add_argument("--out-dir", help="Tile root (default: tile cache keyed by file contents)")
+    tiles_p.add_argument("--min-zoom", type=int, default=3)
+    tiles_p.add_argument("--max-zoom", type=int, default=7)
+    tiles_p.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1)
+    tiles_p.set_defaults(func=cmd_tiles)
+
+    poly_p = sub.add_parser("polygons", help="Export hail swath polygons")
+    poly_p.add_argument("input")
+    poly_p.add_argument("output", help="GeoJSON, or FlatGeobuf for a .fgb path")
+    poly_p.add_argument("--levels", nargs="+", type=float, default=[1, 1.5, 2, 2.5, 3, 3.5, 4],
+                        metavar="INCHES", help="Band thresholds in inches")
+    poly_p.add_argument("--simplify", type=float, default=0.0, metavar="DEGREES",
+                        help="Topology-preserving simplification tolerance (needs shapely)")
+    _add_bbox(poly_p)
+    poly_p.set_defaults(func=cmd_polygons)
+
+    batch_p = sub.add_parser("batch", help="Render many files in parallel")
+    batch_p.add_argument("inputs", nargs="+",
+                         help="Files, directories, globs or @file lists")
+    batch_p.add_argument("--out-dir", default="output")
+    batch_p.add_argument("--outputs", default="png",
+                         help=f"Comma-separated subset of {','.join(BATCH_OUTPUTS)}")
+    batch_p.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1)
+    batch_p.add_argument("--report", help="Write a JSON summary to this path")
+    _add_bbox(batch_p)
+    batch_p.set_defaults(func=cmd_batch)
+
     return p
 
 
 def main(argv: List[str] | None = None) -> None:
     parser = build_parser()
     args = parser.parse_args(argv)
-    if hasattr(args, "func"):
-        args.func(args)
-    else:
-        parser.print_help()
+    if args.profile:
+        mesh_trace.enable(args.profile, truncate=True)
+    try:
+        if hasattr(args, "func"):
+            with mesh_trace.span(f"cli.{args.cmd}"):
+                args.func(args)
+        else:
+            parser.print_help()
+    finally:
+        if args.profile:
+            mesh_trace.disable()
 
 
 if __name__ == "__main__":
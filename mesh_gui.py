@@ -1,57 +1,217 @@
 import os
+import queue
+import threading
 import tkinter as tk
-from tkinter import filedialog, messagebox, simpledialog
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import filedialog, messagebox, simpledialog, ttk
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
 import folium
 import webbrowser
-import tempfile
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from geopy.geocoders import Nominatim
-import boto3
+from mesh_trace import span
 from process_mesh import load_mesh
-from mesh_utils import make_figure, save_figure, save_overlay
+from mesh_utils import Geocoder, LevelOfDetail, make_tiles, save_figure
+from mesh_utils.tiles import MAX_ZOOM, MIN_ZOOM
+from realtime import ListingCache, download_all, hour_groups, make_client
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), 'output')
-BUCKET = 'noaa-mrms-pds'
-PREFIX = 'MESHMax/'
+
+def _human(size: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
 
 class S3Browser(tk.Toplevel):
-    def __init__(self, master):
+    """Lazy tree of the bucket's prefixes; each folder is listed when opened.
+
+    Listings come from a shared ``ListingCache`` on worker threads and are
+    handed to the Tk loop through a queue. Day folders with many files are
+    grouped by hour. Selected files and hours download concurrently.
+    """
+    POLL_MS = 100
+    # folders with more files than this are grouped by hour
+    GROUP_ABOVE = 60
+
+    def __init__(self, master, listing: ListingCache = None, jobs: int = 4):
         super().__init__(master)
         self.title('S3 Browser')
-        self.geometry('400x300')
-        self.listbox = tk.Listbox(self)
-        self.listbox.pack(fill=tk.BOTH, expand=True)
-        self.listbox.bind('<Double-1>', self.download_file)
-        tk.Button(self, text='Refresh', command=self.refresh).pack()
-        self.s3 = boto3.client('s3')
-        self.refresh()
+        self.geometry('600x450')
+        self.listing = listing or ListingCache(make_client())
+        self.jobs = jobs
+        self.pool = ThreadPoolExecutor(max_workers=4)
+        self.results = queue.Queue()
+        self.loaded = set()
+        self.sizes = {}
+        self.received = {}
+        self.closed = False
+
+        self.tree = ttk.Treeview(self, columns=('size',), selectmode='extended')
+        self.tree.heading('#0', text='Key')
+        self.tree.heading('size', text='Size')
+        self.tree.column('size', width=90, anchor=tk.E, stretch=False)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.tree.bind('<<TreeviewOpen>>', self.on_open)
+        self.tree.bind('<Double-1>', self.download_selected)
+        bar = tk.Frame(self)
+        bar.pack(fill=tk.X)
+        tk.Button(bar, text='Refresh', command=self.refresh).pack(side=tk.LEFT)
+        tk.Button(bar, text='Download', command=self.download_selected).pack(side=tk.LEFT)
+        self.progress = ttk.Progressbar(bar, mode='determinate')
+        self.progress.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.status = tk.Label(bar)
+        self.status.pack(side=tk.LEFT)
+        self.protocol('WM_DELETE_WINDOW', self.close)
+        self.load('')
+        self.after(self.POLL_MS, self._drain)
+
+    def close(self):
+        self.closed = True
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+
+    def load(self, prefix, refresh=False):
+        self.loaded.add(prefix)
+        self.status.config(text=f'Listing {prefix or self.listing.bucket}...')
+        future = self.pool.submit(self.listing.list, prefix, refresh)
+        future.add_done_callback(lambda f: self.results.put(('listed', prefix, f)))
+
+    def on_open(self, event=None):
+        node = self.tree.focus()
+        if node.endswith('/') and node not in self.loaded:
+            self.load(node)
 
     def refresh(self):
-        self.listbox.delete(0, tk.END)
+        selection = self.tree.selection()
+        prefix = selection[0] if selection and selection[0].endswith('/') else ''
+        self.listing.invalidate(prefix)
+        self.loaded = {p for p in self.loaded if not p.startswith(prefix)}
+        self.load(prefix, refresh=True)
+
+    def _drain(self):
+        if self.closed:
+            return
+        while True:
+            try:
+                kind, *item = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'listed':
+                self._show_listing(*item)
+            elif kind == 'progress':
+                key, received = item
+                self.received[key] = received
+                self.progress['value'] = sum(self.received.values())
+            elif kind == 'downloaded':
+                self._downloaded(*item)
+        self.after(self.POLL_MS, self._drain)
+
+    def _show_listing(self, prefix, future):
         try:
-            resp = self.s3.list_objects_v2(Bucket=BUCKET, Prefix=PREFIX, Delimiter='/', MaxKeys=1000)
-            for obj in resp.get('Contents', []):
-                key = obj['Key']
-                if key.endswith('.gz'):
-                    self.listbox.insert(tk.END, key)
+            prefixes, objects = future.result()
         except Exception as exc:
-            messagebox.showerror('Error', f'Failed to list bucket: {exc}')
+            self.loaded.discard(prefix)
+            self.status.config(text='')
+            messagebox.showerror('Error', f'Failed to list bucket: {exc}', parent=self)
+            return
+        self.status.config(text='')
+        if prefix and not self.tree.exists(prefix):
+            return
+        self.tree.delete(*self.tree.get_children(prefix))
+        for sub in prefixes:
+            self.tree.insert(prefix, tk.END, iid=sub, text=sub[len(prefix):])
+            # placeholder so the folder shows an expander before it is listed
+            self.tree.insert(sub, tk.END, text='Loading...')
+        objects = [o for o in objects if o['Key'].endswith('.gz')]
+        if len(objects) > self.GROUP_ABOVE:
+            for hour, group in hour_groups(objects).items():
+                node = self.tree.insert(prefix, tk.END, iid=f'{prefix}#{hour}',
+                                        text=f'{hour}Z' if hour else 'other',
+                                        values=(f'{len(group)} files',))
+                for obj in group:
+                    self._insert_object(node, obj)
+        else:
+            for obj in objects:
+                self._insert_object(prefix, obj)
 
-    def download_file(self, event=None):
-        selection = self.listbox.curselection()
-        if not selection:
+    def _insert_object(self, parent, obj):
+        key = obj['Key']
+        self.sizes[key] = obj.get('Size', 0)
+        self.tree.insert(parent, tk.END, iid=key, text=os.path.basename(key),
+                         values=(_human(self.sizes[key]),))
+
+    def download_selected(self, event=None):
+        keys = []
+        for node in self.tree.selection():
+            if node in self.sizes:
+                keys.append(node)
+            elif '#' in node:
+                keys.extend(self.tree.get_children(node))
+        keys = sorted(set(keys))
+        if not keys:
             return
-        key = self.listbox.get(selection[0])
-        local_path = os.path.join(DATA_DIR, os.path.basename(key))
+        self.received = {}
+        self.progress.config(maximum=max(sum(self.sizes[k] for k in keys), 1), value=0)
+        self.status.config(text=f'Downloading {len(keys)} files...')
+
+        def progress(key, received):
+            self.results.put(('progress', key, received))
+
+        future = self.pool.submit(download_all, self.listing.s3, keys, DATA_DIR, self.jobs,
+                                  bucket=self.listing.bucket, progress=progress)
+        future.add_done_callback(lambda f: self.results.put(('downloaded', f)))
+
+    def _downloaded(self, future):
+        self.status.config(text='')
         try:
-            self.s3.download_file(BUCKET, key, local_path)
-            messagebox.showinfo('Downloaded', f'Saved to {local_path}')
+            done, failed = future.result()
         except Exception as exc:
-            messagebox.showerror('Error', f'Failed to download: {exc}')
+            messagebox.showerror('Error', f'Failed to download: {exc}', parent=self)
+            return
+        if failed:
+            messagebox.showerror('Error', f'Downloaded {len(done)} files; '
+                                 f'{len(failed)} failed: {", ".join(sorted(failed))}', parent=self)
+        else:
+            messagebox.showinfo('Downloaded', f'Saved {len(done)} files to {DATA_DIR}', parent=self)
+
+
+class Cancelled(Exception):
+    """Raised inside a background task whose result is no longer wanted."""
+
+
+# screen size assumed for the first, full-extent view
+FULL_VIEW_PIXELS = (1600, 1200)
+
+
+def prepare_file(path, cancel: threading.Event):
+    """Decode ``path`` and build its level-of-detail pyramid; runs off the Tk thread."""
+    lats, lons, data = load_mesh(path, cache=True, sparse=True)
+    if cancel.is_set():
+        raise Cancelled()
+    lod = LevelOfDetail(lats, lons, data)
+    if cancel.is_set():
+        raise Cancelled()
+    xlim = (float(lons.min()), float(lons.max()))
+    ylim = (float(lats.min()), float(lats.max()))
+    return (lats, lons, data), lod, lod.view(xlim, ylim, *FULL_VIEW_PIXELS)
+
+
+def build_tiles(path, cancel: threading.Event):
+    """Build the map tile pyramid of ``path``, stopping between zoom levels on ``cancel``."""
+    root, _ = make_tiles(path, cancel=cancel)
+    if cancel.is_set():
+        raise Cancelled()
+    return root
+
 
 class MeshApp(tk.Tk):
+    # how often (ms) the Tk loop checks on a background task
+    POLL_MS = 100
+
     def __init__(self):
         super().__init__()
         self.title('MESH-MAP')
@@ -61,8 +221,19 @@ class MeshApp(tk.Tk):
         self.canvas = None
         self.toolbar = None
         self.pin = None
+        self.pin_marker = None
+        self.lod = None
+        self.image = None
+        self.view_key = None
+        self.refresh_pending = False
         self.last_data = None
-        self.pin = None
+        self.last_path = None
+        self.last_stat = None
+        self.geocoder = None
+        self.s3_listing = None
+        # one worker: tasks run in the order they were started
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.task = None
 
         open_btn = tk.Button(self, text='Open File', command=self.open_file)
         open_btn.pack(side=tk.TOP, fill=tk.X)
@@ -78,6 +249,69 @@ class MeshApp(tk.Tk):
 
         map_btn = tk.Button(self, text='Interactive Map', command=self.show_map)
         map_btn.pack(side=tk.TOP, fill=tk.X)
+
+        self.status = tk.Frame(self)
+        self.status_label = tk.Label(self.status)
+        self.status_label.pack(side=tk.LEFT)
+        self.progress = ttk.Progressbar(self.status, mode='indeterminate', length=160)
+        self.progress.pack(side=tk.LEFT, padx=5)
+        tk.Button(self.status, text='Cancel', command=self.cancel_task).pack(side=tk.LEFT)
+        self.protocol('WM_DELETE_WINDOW', self.quit_app)
+
+    def run_task(self, label, fn, on_done, *args):
+        """Run ``fn(*args, cancel)`` in the background and pass its result to ``on_done``.
+
+        Starting a task cancels the current one. A task that has not started
+        is dropped; a running one stops at its next ``cancel`` check, and
+        whatever it returns is discarded.
+        """
+        self.cancel_task()
+        cancel = threading.Event()
+
+        def task():
+            with span('gui.task', label=label):
+                return fn(*args, cancel)
+
+        future = self.executor.submit(task)
+        self.task = (future, cancel)
+        self.status_label.config(text=label)
+        self.status.pack(side=tk.BOTTOM, fill=tk.X)
+        self.progress.start(10)
+        self.after(self.POLL_MS, self._poll_task, future, on_done)
+
+    def _poll_task(self, future, on_done):
+        if self.task is None or self.task[0] is not future:
+            return  # cancelled or superseded
+        if not future.done():
+            self.after(self.POLL_MS, self._poll_task, future, on_done)
+            return
+        self._end_task()
+        try:
+            result = future.result()
+        except Cancelled:
+            return
+        except Exception as exc:
+            messagebox.showerror('Error', str(exc))
+            return
+        on_done(result)
+
+    def cancel_task(self):
+        if self.task is not None:
+            future, cancel = self.task
+            cancel.set()
+            future.cancel()
+            self._end_task()
+
+    def _end_task(self):
+        self.task = None
+        self.progress.stop()
+        self.status.pack_forget()
+
+    def quit_app(self):
+        self.cancel_task()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+
     def open_file(self):
         try:
             import cfgrib  # noqa: F401
@@ -88,41 +322,95 @@ class MeshApp(tk.Tk):
         path = filedialog.askopenfilename(initialdir=DATA_DIR, filetypes=types)
         if not path:
             return
-        try:
-            lats, lons, data = load_mesh(path)
-
-            self.last_data = (lats, lons, data)
-            self.fig = make_figure(lats, lons, data, pin=self.pin)
-            if self.canvas:
-                self.canvas.get_tk_widget().destroy()
-                if self.toolbar:
-                    self.toolbar.destroy()
-            self.canvas = FigureCanvasTkAgg(self.fig, master=self)
-            self.canvas.draw()
-            self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-            self.toolbar = NavigationToolbar2Tk(self.canvas, self)
-            self.toolbar.update()
-            self.toolbar.pack(side=tk.TOP, fill=tk.X)
-        except Exception as exc:
-            messagebox.showerror('Error', str(exc))
+        st = os.stat(path)
+        stat = (st.st_size, st.st_mtime_ns)
+        if path == self.last_path and stat == self.last_stat and self.fig:
+            return  # already showing this file
+        self.run_task(f'Loading {os.path.basename(path)}...', prepare_file,
+                      lambda result: self._show(path, stat, *result), path)
+
+    def _show(self, path, stat, grid, lod, view):
+        self.last_data = grid
+        self.last_path = path
+        self.last_stat = stat
+        self.lod = lod
+        self.view_key, rgba, extent = view
+        fig = Figure(figsize=(8, 6))
+        ax = fig.add_subplot()
+        self.image = ax.imshow(rgba, extent=extent, aspect='auto')
+        fig.colorbar(ScalarMappable(Normalize(lod.vmin, lod.vmax), cmap='turbo'), ax=ax,
+                     label='MESH (inches)')
+        self.pin_marker, = ax.plot([], [], 'ro', markersize=8)
+        # zoom and pan set the limits; the image must not reset them
+        ax.set_autoscale_on(False)
+        ax.callbacks.connect('xlim_changed', self._on_limits)
+        ax.callbacks.connect('ylim_changed', self._on_limits)
+        ax.set_xlabel('Longitude')
+        ax.set_ylabel('Latitude')
+        self.fig = fig
+        if self.canvas:
+            self.canvas.get_tk_widget().destroy()
+            if self.toolbar:
+                self.toolbar.destroy()
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self)
+        self._update_pin()
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self)
+        self.toolbar.update()
+        self.toolbar.pack(side=tk.TOP, fill=tk.X)
+
+    def _on_limits(self, ax):
+        # zoom sets both limits and panning fires on every mouse move;
+        # coalesce them into one redraw
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            self.after(30, self._refresh_view)
+
+    def _refresh_view(self):
+        """Swap in the level-of-detail image for the visible extent."""
+        self.refresh_pending = False
+        if self.lod is None or self.image is None:
+            return
+        ax = self.image.axes
+        with span('gui.view') as s:
+            view = self.lod.view(ax.get_xlim(), ax.get_ylim(), ax.bbox.width, ax.bbox.height)
+            s.set(key=view and view[0])
+        if view is None or view[0] == self.view_key:
+            return
+        self.view_key, rgba, extent = view
+        self.image.set_data(rgba)
+        self.image.set_extent(extent)
+        self.canvas.draw_idle()
+
+    def _update_pin(self):
+        """Move the pin marker without touching the rendered grid."""
+        if not self.pin_marker:
+            return
+        if self.pin:
+            self.pin_marker.set_data([self.pin[1]], [self.pin[0]])
+        else:
+            self.pin_marker.set_data([], [])
+        self.canvas.draw_idle()
 
     def open_s3(self):
-        S3Browser(self)
+        # the listing cache outlives the window, so reopening it is instant
+        if self.s3_listing is None:
+            self.s3_listing = ListingCache(make_client())
+        S3Browser(self, listing=self.s3_listing)
 
     def pin_address(self):
         address = simpledialog.askstring('Address', 'Enter address:')
         if not address:
             return
-        geolocator = Nominatim(user_agent='mesh_map')
-        try:
-            location = geolocator.geocode(address)
-        except Exception as exc:
-            messagebox.showerror('Error', f'Geocode failed: {exc}')
-            return
+        if self.geocoder is None:
+            self.geocoder = Geocoder()
+        self.run_task('Geocoding...', lambda addr, cancel: self.geocoder.geocode(addr),
+                      self._pin_found, address)
+
+    def _pin_found(self, location):
         if location:
-            self.pin = (location.latitude, location.longitude)
-            if self.fig:
-                self.open_file()  # redraw with pin
+            self.pin = location
+            self._update_pin()
         else:
             messagebox.showinfo('Not found', 'Address not found')
 
@@ -140,14 +428,16 @@ class MeshApp(tk.Tk):
         if not self.last_data:
             messagebox.showinfo('No data', 'Load data first')
             return
-        lats, lons, data = self.last_data
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-            save_overlay(lats, lons, data, tmp.name)
-            overlay_path = tmp.name
-        bounds = [[float(lats.min()), float(lons.min())], [float(lats.max()), float(lons.max())]]
+        self.run_task('Building map tiles...', build_tiles, self._open_map, self.last_path)
+
+    def _open_map(self, tile_dir):
+        lats, lons, _ = self.last_data
         center = self.pin if self.pin else [float(lats.mean()), float(lons.mean())]
         m = folium.Map(location=center, tiles='OpenStreetMap', zoom_start=5)
-        folium.raster_layers.ImageOverlay(overlay_path, bounds=bounds, opacity=0.6).add_to(m)
+        folium.raster_layers.TileLayer(
+            tiles='file://' + os.path.abspath(tile_dir) + '/{z}/{x}/{y}.png',
+            attr='NOAA MRMS MESH', name='MESH', overlay=True, opacity=0.6,
+            min_native_zoom=MIN_ZOOM, max_native_zoom=MAX_ZOOM).add_to(m)
         if self.pin:
             folium.Marker(location=self.pin, popup='Pinned Location').add_to(m)
         map_file = os.path.join(OUTPUT_DIR, 'interactive_map.html')
@@ -0,0 +1,147 @@
+"""Lightweight timing spans for profiling where a run spends its time.
+
+Wrap a stage in ``with span("gunzip", bytes=n) as s:`` and attach sizes
+found along the way with ``s.set(cells=data.size)``. Each finished span
+records its wall time, the attached values and the process peak RSS.
+
+Profiling is off until ``enable(path)`` is called, which the ``--profile``
+flags of ``mesh-cli`` and ``mesh-watch`` do, or ``MESH_PROFILE`` is set.
+While it is off ``span`` returns one shared no-op object, so instrumented
+code pays a function call per stage. A ``.jsonl`` path gets one JSON
+object per line. Any other path gets Chrome trace events that open in
+chrome://tracing or https://ui.perfetto.dev. Every event is a single
+append to the file, so threads and the worker processes that inherit
+``MESH_PROFILE`` all write to the same trace.
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+ENV_VAR = "MESH_PROFILE"
+
+# (file descriptor, chrome format) while enabled
+_out = None
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args) -> None:
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class Span:
+    """A stage being timed; use through ``span``."""
+
+    __slots__ = ("name", "args", "wall", "start")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def set(self, **args) -> None:
+        """Attach values (bytes, shapes, counts) to the span."""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _emit(self.name, self.wall, seconds, self.args)
+        return False
+
+
+def span(name: str, **args):
+    """Return a context manager timing the stage ``name``; a no-op when disabled."""
+    if _out is None:
+        return _NULL
+    return Span(name, args)
+
+
+def enabled() -> bool:
+    return _out is not None
+
+
+def _peak_rss_mib() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+def _jsonable(value):
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def _write(fd: int, record: dict, chrome: bool) -> None:
+    line = json.dumps(record, default=_jsonable) + (",\n" if chrome else "\n")
+    os.write(fd, line.encode())
+
+
+def _emit(name: str, wall: float, seconds: float, args: dict) -> None:
+    out = _out
+    if out is None:
+        return
+    fd, chrome = out
+    args["peak_rss_mib"] = _peak_rss_mib()
+    pid, tid = os.getpid(), threading.get_native_id()
+    if chrome:
+        record = {"name": name, "ph": "X", "ts": round(wall * 1e6), "dur": round(seconds * 1e6, 1),
+                  "pid": pid, "tid": tid, "args": args}
+    else:
+        record = {"name": name, "start": round(wall, 6), "ms": round(seconds * 1e3, 3),
+                  "pid": pid, "tid": tid, **args}
+    _write(fd, record, chrome)
+
+
+def enable(path: str, truncate: bool = False) -> None:
+    """Record spans to ``path``, and to it from child processes too.
+
+    ``truncate`` starts a new file; otherwise events are appended, which is
+    how worker processes join their parent's trace.
+    """
+    global _out
+    disable()
+    flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | (os.O_TRUNC if truncate else 0)
+    fd = os.open(path, flags, 0o644)
+    chrome = not path.endswith(".jsonl")
+    if chrome:
+        if os.fstat(fd).st_size == 0:
+            # the closing bracket is optional in the trace event format
+            os.write(fd, b"[\n")
+        _write(fd, {"name": "process_name", "ph": "M", "pid": os.getpid(),
+                    "args": {"name": os.path.basename(sys.argv[0] or "python")}}, chrome)
+    _out = (fd, chrome)
+    os.environ[ENV_VAR] = os.path.abspath(path)
+
+
+def disable() -> None:
+    """Stop recording, here and in child processes started from now on."""
+    global _out
+    out, _out = _out, None
+    if out is not None:
+        os.close(out[0])
+        os.environ.pop(ENV_VAR, None)
+
+
+if os.environ.get(ENV_VAR):
+    enable(os.environ[ENV_VAR])
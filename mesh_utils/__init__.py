@@ -1,12 +1,43 @@
-from .hail_plot import (
-    make_figure,
-    save_figure,
-    save_overlay,
-    save_geotiff,
-    make_contour,
-    save_animation,
-    save_docx,
-)
+"""Plotting, storage, query and export helpers for MESH grids.
+
+Submodules are imported on first use of one of their names (PEP 562),
+so ``import mesh_utils`` does not pull in matplotlib, rasterio, h5py or
+python-docx until a command needs them.
+"""
+import importlib
+
+# composite is both a submodule and a function; bind the function up
+# front so importing the submodule never shadows it (numpy only)
+from .composite import Composite, composite, select_files
+
+_EXPORTS = {
+    'hail_plot': ('make_figure', 'save_figure', 'save_overlay', 'save_geotiff',
+                  'make_contour', 'save_animation', 'save_docx'),
+    'store': ('ingest', 'load_store', 'store_times', 'find_mesh_files'),
+    'query': ('point_cells', 'sample', 'query_points', 'query_table'),
+    'history': ('append_history', 'append_grid', 'point_history'),
+    'raster': ('render_rgba', 'encode_png', 'save_png', 'colormap_lut', 'max_pool'),
+    'tiles': ('make_tiles', 'tile_root'),
+    'lod': ('LevelOfDetail',),
+    'polygons': ('swath_polygons', 'file_polygons', 'write_polygons'),
+    'geocode': ('Geocoder', 'GeocodeCache', 'NominatimBackend', 'OfflineBackend',
+                'geocode_table'),
+}
+_MODULE_OF = {name: module for module, names in _EXPORTS.items() for name in names}
+
+
+def __getattr__(name):
+    module = _MODULE_OF.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 
 __all__ = [
     'make_figure',
@@ -16,5 +47,35 @@ __all__ = [
     'make_contour',
     'save_animation',
     'save_docx',
+    'ingest',
+    'load_store',
+    'store_times',
+    'find_mesh_files',
+    'Composite',
+    'composite',
+    'select_files',
+    'point_cells',
+    'sample',
+    'query_points',
+    'query_table',
+    'append_history',
+    'append_grid',
+    'point_history',
+    'Geocoder',
+    'GeocodeCache',
+    'NominatimBackend',
+    'OfflineBackend',
+    'geocode_table',
+    'render_rgba',
+    'encode_png',
+    'save_png',
+    'colormap_lut',
+    'max_pool',
+    'make_tiles',
+    'tile_root',
+    'LevelOfDetail',
+    'swath_polygons',
+    'file_polygons',
+    'write_polygons',
 ]
 
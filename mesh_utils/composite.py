@@ -0,0 +1,109 @@
+"""Streaming storm-total composites over many MESH files.
+
+Each file is decoded to a ``SparseGrid`` (in parallel when ``jobs > 1``)
+and folded into three running grids, so memory stays constant in the
+number of files:
+
+* ``max``         cell-wise maximum MESH, NaN where no file reached the
+                  hail threshold
+* ``first_time``  valid time (Unix seconds) a cell first reached
+                  ``threshold``, -1 if never
+* ``count``       number of files in which a cell reached ``threshold``
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Iterable, Optional
+
+import numpy as np
+
+from process_mesh import HAIL_THRESHOLD, BBox, SparseGrid, load_mesh, valid_time
+
+
+class Composite:
+    """Running max / first-exceed time / exceed count over a sequence of grids."""
+
+    def __init__(self, threshold: float = HAIL_THRESHOLD):
+        self.threshold = threshold
+        self.lats = None
+        self.lons = None
+        self.max = None
+        self.first_time = None
+        self.count = None
+        self.files = 0
+
+    def _init(self, lats, lons, shape) -> None:
+        self.lats, self.lons = lats, lons
+        self.max = np.full(shape, np.nan, dtype=np.float32)
+        self.first_time = np.full(shape, -1, dtype=np.int64)
+        self.count = np.zeros(shape, dtype=np.uint32)
+
+    def add(self, lats, lons, data, time: datetime) -> None:
+        """Fold one dense array or ``SparseGrid`` valid at ``time`` into the composite."""
+        if not isinstance(data, SparseGrid):
+            data = SparseGrid.from_dense(lats, lons, data, min(self.threshold, HAIL_THRESHOLD))
+        if self.max is None:
+            self._init(lats, lons, data.shape)
+        elif data.shape != self.max.shape:
+            raise ValueError(f"grid {data.shape} does not match composite grid {self.max.shape}")
+        # flat indices are unique within a grid, so fancy assignment is safe
+        idx, vals = data.index, data.values
+        flat_max = self.max.reshape(-1)
+        flat_max[idx] = np.fmax(flat_max[idx], vals)
+        hit = idx[vals >= self.threshold]
+        self.count.reshape(-1)[hit] += 1
+        first = self.first_time.reshape(-1)
+        when = int(time.timestamp())
+        prev = first[hit]
+        first[hit] = np.where((prev < 0) | (prev > when), when, prev)
+        self.files += 1
+
+
+def _load_sparse(path: str, bbox: Optional[BBox], floor: float):
+    lats, lons, grid = load_mesh(path, bbox=bbox, sparse=True, threshold=floor)
+    return path, lats, lons, grid
+
+
+def select_files(files: Iterable[str], start: Optional[datetime] = None,
+                 end: Optional[datetime] = None) -> list:
+    """Return ``files`` whose valid time lies in ``[start, end]``, in time order."""
+    files = sorted(files, key=valid_time)
+    return [f for f in files
+            if (start is None or valid_time(f) >= start) and (end is None or valid_time(f) <= end)]
+
+
+def composite(files: Iterable[str], threshold: float = HAIL_THRESHOLD,
+              bbox: Optional[BBox] = None, start: Optional[datetime] = None,
+              end: Optional[datetime] = None, jobs: Optional[int] = None) -> Composite:
+    """Reduce ``files`` (optionally limited to a time range) into a ``Composite``.
+
+    Up to ``jobs`` worker processes decode files while the parent folds
+    finished grids in; at most two grids per worker are in flight.
+    """
+    files = select_files(files, start, end)
+    if not files:
+        raise ValueError("no files to composite")
+    result = Composite(threshold)
+    floor = min(threshold, HAIL_THRESHOLD)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        for path in files:
+            _, lats, lons, grid = _load_sparse(path, bbox, floor)
+            result.add(lats, lons, grid, valid_time(path))
+        return result
+
+    todo = iter(files)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = set()
+        while True:
+            for path in todo:
+                pending.add(pool.submit(_load_sparse, path, bbox, floor))
+                if len(pending) >= 2 * jobs:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                path, lats, lons, grid = fut.result()
+                result.add(lats, lons, grid, valid_time(path))
+    return result
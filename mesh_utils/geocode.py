@@ -0,0 +1,172 @@
+"""Cached, rate-limited geocoding for single pins and bulk address lists.
+
+Results are cached in SQLite keyed by a normalised form of the address,
+so repeated and resumed batches only reach the provider for new
+addresses. Backends are objects with a ``geocode(address)`` method that
+returns ``(lat, lon)`` or ``None``.
+"""
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from process_mesh import CACHE_DIR
+from .query import write_table
+
+LatLon = Tuple[float, float]
+
+_ABBREVIATIONS = {
+    'st': 'street', 'ave': 'avenue', 'av': 'avenue', 'rd': 'road', 'dr': 'drive',
+    'blvd': 'boulevard', 'ln': 'lane', 'ct': 'court', 'hwy': 'highway', 'pkwy': 'parkway',
+    'pl': 'place', 'ter': 'terrace', 'cir': 'circle', 'apt': 'apartment', 'ste': 'suite',
+    'n': 'north', 's': 'south', 'e': 'east', 'w': 'west',
+    'ne': 'northeast', 'nw': 'northwest', 'se': 'southeast', 'sw': 'southwest',
+}
+
+
+def normalise_address(address: str) -> str:
+    """Return a cache key that ignores case, punctuation and common abbreviations."""
+    words = re.sub(r"[^\w#]+", " ", address.casefold()).split()
+    return " ".join(_ABBREVIATIONS.get(w, w) for w in words)
+
+
+class GeocodeCache:
+    """Persistent SQLite cache of geocoding results, including misses."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(CACHE_DIR, 'geocode.sqlite')
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS geocode ('
+                         'key TEXT PRIMARY KEY, lat REAL, lon REAL, updated REAL)')
+        self._db.commit()
+
+    def get(self, key: str) -> Tuple[bool, Optional[LatLon]]:
+        """Return ``(hit, location)``; a hit with no location is a cached miss."""
+        with self._lock:
+            row = self._db.execute('SELECT lat, lon FROM geocode WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return False, None
+        return True, None if row[0] is None else (row[0], row[1])
+
+    def put(self, key: str, location: Optional[LatLon]) -> None:
+        lat, lon = location if location else (None, None)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?)',
+                             (key, lat, lon, time.time()))
+            self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class RateLimiter:
+    """Space calls at least ``min_interval`` seconds apart across threads."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class NominatimBackend:
+    """OpenStreetMap Nominatim via geopy; its usage policy allows 1 request/s."""
+
+    min_interval = 1.0
+
+    def __init__(self, user_agent: str = 'mesh_map'):
+        from geopy.geocoders import Nominatim
+
+        self._geolocator = Nominatim(user_agent=user_agent)
+
+    def geocode(self, address: str) -> Optional[LatLon]:
+        location = self._geolocator.geocode(address)
+        return (location.latitude, location.longitude) if location else None
+
+
+class OfflineBackend:
+    """Lookup table backend for tests and air-gapped runs."""
+
+    min_interval = 0.0
+
+    def __init__(self, table: Dict[str, LatLon]):
+        self.table = {normalise_address(k): v for k, v in table.items()}
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'OfflineBackend':
+        """Load ``address,lat,lon`` rows."""
+        with open(path, newline='') as f:
+            return cls({r['address']: (float(r['lat']), float(r['lon'])) for r in csv.DictReader(f)})
+
+    def geocode(self, address: str) -> Optional[LatLon]:
+        return self.table.get(normalise_address(address))
+
+
+class Geocoder:
+    """Geocode through ``backend``, consulting ``cache`` first."""
+
+    def __init__(self, backend=None, cache: Optional[GeocodeCache] = None,
+                 min_interval: Optional[float] = None):
+        self.backend = backend if backend is not None else NominatimBackend()
+        self.cache = cache if cache is not None else GeocodeCache()
+        if min_interval is None:
+            min_interval = getattr(self.backend, 'min_interval', 1.0)
+        self.limiter = RateLimiter(min_interval)
+
+    def geocode(self, address: str) -> Optional[LatLon]:
+        key = normalise_address(address)
+        hit, location = self.cache.get(key)
+        if hit:
+            return location
+        self.limiter.wait()
+        location = self.backend.geocode(address)
+        self.cache.put(key, location)
+        return location
+
+    def geocode_batch(self, addresses: Iterable[str], jobs: int = 1) -> List[Optional[LatLon]]:
+        """Geocode many addresses, in order, with ``jobs`` concurrent requests.
+
+        Each result is cached as soon as it arrives, so an interrupted batch
+        resumes where it stopped. A failed lookup is not cached; its error is
+        raised once the rest of the batch has finished. An interrupt such as
+        Ctrl-C drops the queued lookups and waits only for the running ones.
+        """
+        pool = ThreadPoolExecutor(max_workers=max(jobs, 1))
+        try:
+            # not pool.map: it cancels the queued lookups when one fails
+            futures = [pool.submit(self.geocode, a) for a in addresses]
+            for f in futures:
+                f.exception()
+        except BaseException:
+            pool.shutdown(cancel_futures=True)
+            raise
+        pool.shutdown()
+        return [f.result() for f in futures]
+
+
+def geocode_table(input_path: str, output_path: str, geocoder: Geocoder,
+                  column: str = 'address', jobs: int = 1) -> int:
+    """Add ``lat``/``lon`` columns to a CSV of addresses and return the number found."""
+    with open(input_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    results = geocoder.geocode_batch((r[column] for r in rows), jobs=jobs)
+    found = 0
+    for row, loc in zip(rows, results):
+        row['lat'], row['lon'] = loc if loc else ('', '')
+        found += loc is not None
+    write_table(output_path, rows)
+    return found
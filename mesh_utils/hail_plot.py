@@ -3,20 +3,25 @@ matplotlib.use('Agg')  # for headless environments
 import matplotlib.pyplot as plt
 from typing import Optional, Tuple, List
 import numpy as np
-import rasterio
-from rasterio.transform import from_bounds
 from matplotlib import animation
-from docx import Document
 import os
-from process_mesh import load_mesh
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from mesh_trace import span
+from process_mesh import BBox, SparseGrid, as_dense, load_mesh
+from .raster import max_pool, render_rgba, save_png
 
 
 def make_figure(lats, lons, data, pin: Optional[Tuple[float, float]] = None):
     """Return a Matplotlib figure showing the hail swath."""
-    # mask values below 2 to avoid plotting insignificant hail sizes
-    data = np.where(data >= 2, data, np.nan)
+    with span('mask', shape=data.shape):
+        data = as_dense(data)
+        # mask values below 2 to avoid plotting insignificant hail sizes
+        data = np.where(data >= 2, data, np.nan)
     fig, ax = plt.subplots(figsize=(8, 6))
-    mesh = ax.pcolormesh(lons, lats, data, cmap='turbo', shading='auto')
+    with span('pcolormesh', shape=data.shape):
+        mesh = ax.pcolormesh(lons, lats, data, cmap='turbo', shading='auto')
     fig.colorbar(mesh, ax=ax, label='MESH (inches)')
     if pin:
         ax.plot(pin[1], pin[0], 'ro', markersize=8)
@@ -26,46 +31,121 @@ def make_figure(lats, lons, data, pin: Optional[Tuple[float, float]] = None):
 
 
 def save_figure(fig, path: str):
-    fig.savefig(path, bbox_inches='tight')
+    with span('savefig', file=os.path.basename(path)):
+        fig.savefig(path, bbox_inches='tight')
+
 
+def save_overlay(lats, lons, data, path: str, engine: str = 'raster'):
+    """Save transparent image for use as map overlay.
 
-def save_overlay(lats, lons, data, path: str):
-    """Save transparent image for use as map overlay."""
-    data = np.where(data >= 2, data, np.nan)
+    The default ``raster`` engine writes one pixel per grid cell straight
+    from a colour lookup table; ``matplotlib`` draws it with pcolormesh.
+    """
+    if engine == 'raster':
+        with span('render_rgba', shape=data.shape):
+            rgba = render_rgba(lats, lons, data)
+        with span('save_png', file=os.path.basename(path)):
+            save_png(rgba, path)
+        return
+    with span('mask', shape=data.shape):
+        data = as_dense(data)
+        data = np.where(data >= 2, data, np.nan)
     fig, ax = plt.subplots(figsize=(8, 6))
-    mesh = ax.pcolormesh(lons, lats, data, cmap='turbo', shading='auto')
+    with span('pcolormesh', shape=data.shape):
+        ax.pcolormesh(lons, lats, data, cmap='turbo', shading='auto')
     ax.axis('off')
     ax.set_xlim(np.min(lons), np.max(lons))
     ax.set_ylim(np.min(lats), np.max(lats))
-    fig.savefig(path, transparent=True, bbox_inches='tight', pad_inches=0)
+    with span('savefig', file=os.path.basename(path)):
+        fig.savefig(path, transparent=True, bbox_inches='tight', pad_inches=0)
     plt.close(fig)
 
 
-def save_geotiff(lats, lons, data, path: str):
-    """Save data array to GeoTIFF with geographic bounds."""
-    data = np.where(data >= 2, data, 0)
+# quantised GeoTIFFs store round(mesh / scale); code 0 is nodata
+GEOTIFF_SCALES = {'uint8': 1.0, 'uint16': 0.01}
+GEOTIFF_BLOCK = 512
+
+
+def _row_block(data, start: int, stop: int) -> np.ndarray:
+    """Return a float32 copy of rows ``start:stop`` of a dense or sparse grid."""
+    if isinstance(data, SparseGrid):
+        ncols = data.shape[1]
+        lo, hi = np.searchsorted(data.index, [start * ncols, stop * ncols])
+        block = np.full((stop - start, ncols), np.nan, dtype=np.float32)
+        block.reshape(-1)[data.index[lo:hi] - start * ncols] = data.values[lo:hi]
+        return block
+    # a copy, since callers mask it in place and the grid may be a read-only memmap
+    return np.array(data[start:stop], dtype=np.float32)
+
+
+def save_geotiff(lats, lons, data, path: str, dtype: str = 'float32',
+                 compress: str = 'deflate', scale: Optional[float] = None,
+                 threshold: float = 2.0):
+    """Save data array as a cloud-optimised GeoTIFF with geographic bounds.
+
+    Cells below ``threshold`` are nodata (NaN for float32). With ``dtype``
+    ``uint8`` or ``uint16`` values are stored as ``round(mesh / scale)`` and
+    the scale is recorded in the file, with 0 as nodata. Rows are written
+    in blocks to a tiled temporary GTiff, which GDAL's COG driver then
+    copies with overviews, so a dense copy of the grid is never made.
+    """
+    import rasterio
+    from rasterio.shutil import copy as rio_copy
+    from rasterio.transform import from_bounds
+    from rasterio.windows import Window
+
+    if dtype not in ('float32',) + tuple(GEOTIFF_SCALES):
+        raise ValueError(f"unsupported GeoTIFF dtype {dtype!r}")
+    height, width = data.shape[-2:]
     transform = from_bounds(float(lons.min()), float(lats.min()),
                             float(lons.max()), float(lats.max()),
-                            data.shape[1], data.shape[0])
-    with rasterio.open(
-        path,
-        'w',
-        driver='GTiff',
-        height=data.shape[0],
-        width=data.shape[1],
-        count=1,
-        dtype=data.dtype,
-        crs='EPSG:4326',
-        transform=transform,
-    ) as dst:
-        dst.write(data, 1)
+                            width, height)
+    quantised = dtype != 'float32'
+    if quantised:
+        scale = scale or GEOTIFF_SCALES[dtype]
+        top = np.iinfo(dtype).max
+    nodata = 0 if quantised else np.nan
+    if not isinstance(data, SparseGrid):
+        data = np.asarray(data).reshape(height, width)
+
+    fd, tmp = tempfile.mkstemp(suffix='.tif', dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    try:
+        with span('geotiff_write', shape=data.shape, dtype=dtype):
+            with rasterio.open(tmp, 'w', driver='GTiff', height=height, width=width, count=1,
+                               dtype=dtype, crs='EPSG:4326', transform=transform, nodata=nodata,
+                               tiled=True, blockxsize=GEOTIFF_BLOCK, blockysize=GEOTIFF_BLOCK,
+                               compress=compress, BIGTIFF='IF_SAFER') as dst:
+                for start in range(0, height, GEOTIFF_BLOCK):
+                    stop = min(start + GEOTIFF_BLOCK, height)
+                    block = _row_block(data, start, stop)
+                    hail = block >= threshold
+                    if quantised:
+                        codes = np.zeros(block.shape, dtype=dtype)
+                        codes[hail] = np.clip(np.rint(block[hail] / scale), 1, top)
+                        block = codes
+                    else:
+                        block[~hail] = np.nan
+                    dst.write(block, 1, window=Window(0, start, width, stop - start))
+                if quantised:
+                    dst.scales = (scale,)
+                    dst.offsets = (0.0,)
+        with span('cog_copy', file=os.path.basename(path)) as s:
+            rio_copy(tmp, path, driver='COG', compress=compress, blocksize=GEOTIFF_BLOCK,
+                     resampling='NEAREST', predictor='YES', BIGTIFF='IF_SAFER')
+            s.set(bytes=os.path.getsize(path))
+    finally:
+        os.remove(tmp)
 
 
 def make_contour(lats, lons, data, pin: Optional[Tuple[float, float]] = None):
     """Return a Matplotlib figure with contour lines."""
-    data = np.where(data >= 2, data, np.nan)
+    with span('mask', shape=data.shape):
+        data = as_dense(data)
+        data = np.where(data >= 2, data, np.nan)
     fig, ax = plt.subplots(figsize=(8, 6))
-    cs = ax.contour(lons, lats, data, colors='k')
+    with span('contour', shape=data.shape):
+        cs = ax.contour(lons, lats, data, colors='k')
     ax.clabel(cs, inline=1, fontsize=8)
     if pin:
         ax.plot(pin[1], pin[0], 'ro', markersize=8)
@@ -74,26 +154,76 @@ def make_contour(lats, lons, data, pin: Optional[Tuple[float, float]] = None):
     return fig
 
 
-def save_animation(files: List[str], path: str, pin: Optional[Tuple[float, float]] = None):
-    """Create an animation from a list of MRMS files."""
-    frames = []
-    for f in files:
-        lats, lons, data = load_mesh(f)
-        data = np.where(data >= 2, data, np.nan)
-        fig = make_figure(lats, lons, data, pin=pin)
-        frames.append([plt.imshow(data, animated=True)])
-        plt.close(fig)
+def _render_frame(path: str, bbox: Optional[BBox], cache, downsample: int,
+                  vmin: Optional[float], vmax: Optional[float]):
+    lats, lons, data = load_mesh(path, bbox=bbox, cache=cache, sparse=downsample <= 1)
+    with span('render_frame', file=os.path.basename(path), downsample=downsample):
+        lats, lons, data = max_pool(lats, lons, data, downsample)
+        extent = (float(lons.min()), float(lons.max()), float(lats.min()), float(lats.max()))
+        return render_rgba(lats, lons, data, vmin=vmin, vmax=vmax), extent
+
+
+def _animation_writer(fps: float):
+    name = matplotlib.rcParams['animation.writer']
+    if not animation.writers.is_available(name):
+        name = 'pillow'
+    return animation.writers[name](fps=fps)
+
+
+def save_animation(files: List[str], path: str, pin: Optional[Tuple[float, float]] = None,
+                   bbox: Optional[BBox] = None, cache=False, downsample: int = 1,
+                   fps: float = 2, jobs: Optional[int] = None, ahead: Optional[int] = None,
+                   vmin: Optional[float] = None, vmax: Optional[float] = None):
+    """Create an animation from a list of MRMS files, optionally windowed to ``bbox``.
+
+    Frames are decoded and rendered in a pool of ``jobs`` processes, with at
+    most ``ahead`` (by default twice ``jobs``) in flight, and streamed to the
+    movie writer in order, so memory does not grow with the number of
+    files. ``downsample`` max-pools each grid by that factor first. Pass
+    ``vmin``/``vmax`` for one colour scale across frames.
+    Frames are piped to ffmpeg when it is installed; the Pillow fallback
+    for GIFs keeps the encoded frames until the end.
+    """
     fig, ax = plt.subplots()
-    ani = animation.ArtistAnimation(fig, frames, interval=500, blit=True)
-    ani.save(path)
+    if pin:
+        ax.plot(pin[1], pin[0], 'ro', markersize=8)
+    image = None
+    pending = deque()
+    files = iter(files)
+    jobs = jobs or os.cpu_count() or 1
+    if ahead is None:
+        ahead = 2 * jobs
+    with ProcessPoolExecutor(jobs) as pool:
+        def submit():
+            f = next(files, None)
+            if f is not None:
+                pending.append(pool.submit(_render_frame, f, bbox, cache, downsample, vmin, vmax))
+
+        for _ in range(max(ahead, 1)):
+            submit()
+        writer = _animation_writer(fps)
+        with writer.saving(fig, path, dpi=fig.dpi):
+            while pending:
+                rgba, extent = pending.popleft().result()
+                submit()
+                if image is None:
+                    image = ax.imshow(rgba, extent=extent)
+                else:
+                    image.set_data(rgba)
+                    image.set_extent(extent)
+                with span('grab_frame', shape=rgba.shape):
+                    writer.grab_frame()
     plt.close(fig)
 
 
 def save_docx(fig, path: str):
     """Save figure to DOCX report."""
+    from docx import Document
+
     tmp_png = path + '.png'
     save_figure(fig, tmp_png)
-    doc = Document()
-    doc.add_picture(tmp_png)
-    doc.save(path)
+    with span('docx', file=os.path.basename(path)):
+        doc = Document()
+        doc.add_picture(tmp_png)
+        doc.save(path)
     os.remove(tmp_png)
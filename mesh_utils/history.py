@@ -0,0 +1,257 @@
+"""Per-cell hail history index for fast point lookups over many files.
+
+Only cells at or above the index threshold are stored. Records are
+bucketed by spatial tile of ``TILE`` x ``TILE`` cells. Each tile holds a
+few immutable segments whose records are sorted by cell, then time, so the
+history of one cell is a contiguous slice that a query reads on its own::
+
+    lat, lon                        grid coordinates
+    files     (n,) str              ingested file names, the commit log
+    tiles/<row>_<col>               attrs: segments (live ids), next (id)
+    tiles/<row>_<col>/<id>/cell     sorted cell index within the tile
+    tiles/<row>_<col>/<id>/start    (cells + 1,) offset of each cell's records
+    tiles/<row>_<col>/<id>/time     int64 valid time, Unix seconds
+    tiles/<row>_<col>/<id>/value    float32 MESH
+
+Each append adds a small segment per tile it touches, and segments are
+merged while the newer one is at least half the size of the one before
+it, so a tile has O(log n) segments and a record is rewritten O(log n)
+times. A tile's ``segments`` attribute is replaced only once new segments
+are written, and the ones it replaces are kept, listed in ``previous``,
+until the file's name is added to ``files`` after all its tiles. The name
+is kept in the ``pending`` attribute while that happens. If an append is
+interrupted, the next writer puts each tile it touched back to its
+previous segments and ingests the file again.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Iterable, List, Tuple
+
+import h5py
+import numpy as np
+
+from process_mesh import HAIL_THRESHOLD, SparseGrid, load_mesh, valid_time
+from .query import KM_PER_DEGREE, grid_spacing, point_cells
+
+TILE = 256
+# bumped when the on-disk layout changes
+LAYOUT = 2
+
+
+def _records(seg: h5py.Group) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the ``(cell, time, value)`` records of a segment."""
+    cells = np.repeat(seg['cell'][:], np.diff(seg['start'][:]))
+    return cells, seg['time'][:], seg['value'][:]
+
+
+def _write_segment(tile: h5py.Group, cells, times, values) -> int:
+    """Write records as a new segment of ``tile`` and return its id."""
+    order = np.lexsort((times, cells))
+    cells, times, values = cells[order], times[order], values[order]
+    directory, first = np.unique(cells, return_index=True)
+    seg_id = int(tile.attrs['next'])
+    tile.attrs['next'] = seg_id + 1
+    seg = tile.create_group(str(seg_id))
+    seg.create_dataset('cell', data=directory.astype(np.min_scalar_type(TILE * TILE - 1)))
+    seg.create_dataset('start', data=np.r_[first, cells.size].astype(np.int64))
+    seg.create_dataset('time', data=times.astype(np.int64))
+    seg.create_dataset('value', data=values.astype(np.float32))
+    return seg_id
+
+
+def _add_segment(tile: h5py.Group, cells, times, values) -> None:
+    """Add records to ``tile``, keeping the segments it had before the append.
+
+    Segments the append replaces stay on disk, listed in the ``previous``
+    attribute, until ``_finish`` runs once the file is committed.
+    """
+    if 'previous' not in tile.attrs:
+        tile.attrs['previous'] = tile.attrs['segments']
+    segments = list(tile.attrs['segments']) + [_write_segment(tile, cells, times, values)]
+    sizes = [tile[str(s)]['time'].shape[0] for s in segments]
+    while len(segments) > 1 and sizes[-2] < 2 * sizes[-1]:
+        older, newer = _records(tile[str(segments[-2])]), _records(tile[str(segments[-1])])
+        merged = _write_segment(tile, *(np.concatenate(pair) for pair in zip(older, newer)))
+        segments[-2:] = [merged]
+        sizes[-2:] = [sizes[-2] + sizes[-1]]
+    tile.attrs['segments'] = np.asarray(segments, dtype=np.int64)
+    # segments merged away within this append are not needed to roll it back
+    keep = {str(s) for s in segments} | {str(s) for s in tile.attrs['previous']}
+    for name in [n for n in tile if n not in keep]:
+        del tile[name]
+
+
+def _finish(tile: h5py.Group, rollback: bool = False) -> None:
+    """End an append to ``tile``: drop replaced segments, or with ``rollback`` its new ones."""
+    if rollback:
+        tile.attrs['segments'] = tile.attrs['previous']
+    live = {str(s) for s in tile.attrs['segments']}
+    for name in [n for n in tile if n not in live]:
+        del tile[name]
+    del tile.attrs['previous']
+
+
+def _recover(h5: h5py.File) -> None:
+    """Finish or roll back an append that was interrupted.
+
+    If the file reached the commit log its tiles only need their replaced
+    segments removed. Otherwise each tile it touched goes back to the
+    segments it had before, so records of other files are never dropped.
+    """
+    pending = h5.attrs.get('pending', '')
+    if not pending:
+        return
+    committed = pending in set(h5['files'].asstr()[:])
+    tiles = h5['tiles']
+    for name in list(tiles):
+        tile = tiles[name]
+        if 'segments' not in tile.attrs:
+            # created just before the interruption
+            del tiles[name]
+        elif 'previous' in tile.attrs:
+            _finish(tile, rollback=not committed)
+    h5.attrs['pending'] = ''
+
+
+def add_grid(h5: h5py.File, name: str, when: datetime, lats, lons, data) -> int:
+    """Append the above-threshold cells of one grid and return how many were stored."""
+    threshold = float(h5.attrs['threshold'])
+    if not isinstance(data, SparseGrid):
+        data = SparseGrid.from_dense(lats, lons, data, threshold)
+    if data.shape != (h5['lat'].size, h5['lon'].size):
+        raise ValueError(f"{name}: grid {data.shape} does not match index grid")
+    h5.attrs['pending'] = name
+    index, values = data.index, data.values
+    keep = values >= threshold
+    index, values = index[keep], values[keep]
+    rows, cols = np.unravel_index(index, data.shape)
+    tiles = (rows // TILE) * (1 << 20) + cols // TILE
+    order = np.argsort(tiles, kind='stable')
+    tiles, rows, cols, values = tiles[order], rows[order], cols[order], values[order]
+    bounds = np.flatnonzero(np.diff(tiles)) + 1
+    stamp = int(when.timestamp())
+    touched = []
+    for start, stop in zip(np.r_[0, bounds], np.r_[bounds, tiles.size]):
+        if start == stop:
+            continue
+        tr, tc = int(tiles[start] >> 20), int(tiles[start] & 0xFFFFF)
+        tile = h5.require_group(f'tiles/{tr}_{tc}')
+        if 'segments' not in tile.attrs:
+            tile.attrs['segments'] = np.zeros(0, dtype=np.int64)
+            tile.attrs['next'] = 0
+        local = (rows[start:stop] - tr * TILE) * TILE + (cols[start:stop] - tc * TILE)
+        _add_segment(tile, local, np.full(stop - start, stamp, dtype=np.int64), values[start:stop])
+        touched.append(tile)
+    files = h5['files']
+    files.resize((files.shape[0] + 1,))
+    files[-1] = name
+    for tile in touched:
+        _finish(tile)
+    h5.attrs['pending'] = ''
+    h5.flush()
+    return int(values.size)
+
+
+def _open(path: str, lats, lons, threshold: float) -> h5py.File:
+    if os.path.exists(path):
+        h5 = h5py.File(path, 'a')
+    else:
+        # merges delete segments, so keep track of the space they free
+        h5 = h5py.File(path, 'w-', fs_strategy='fsm', fs_persist=True)
+    if 'files' not in h5:
+        h5.attrs['threshold'] = threshold
+        h5.attrs['tile'] = TILE
+        h5.attrs['layout'] = LAYOUT
+        h5.attrs['pending'] = ''
+        h5.create_dataset('lat', data=lats)
+        h5.create_dataset('lon', data=lons)
+        h5.create_dataset('files', shape=(0,), maxshape=(None,),
+                          dtype=h5py.string_dtype(), chunks=(1024,))
+        h5.create_group('tiles')
+    elif h5.attrs.get('layout', 1) != LAYOUT:
+        h5.close()
+        raise ValueError(f"{path}: history index uses an older layout; rebuild it")
+    _recover(h5)
+    return h5
+
+
+def append_history(index_path: str, files: Iterable[str],
+                   threshold: float = HAIL_THRESHOLD) -> int:
+    """Add ``files`` to the index at ``index_path``, skipping ones already in it.
+
+    Returns the number of files added.
+    """
+    done = set()
+    if os.path.exists(index_path):
+        with h5py.File(index_path, 'r') as h5:
+            if 'files' in h5:
+                done = set(h5['files'].asstr()[:])
+    todo = [f for f in sorted(files, key=valid_time) if os.path.basename(f) not in done]
+    h5 = None
+    try:
+        for path in todo:
+            lats, lons, grid = load_mesh(path, sparse=True, threshold=threshold)
+            if h5 is None:
+                h5 = _open(index_path, lats, lons, threshold)
+            add_grid(h5, os.path.basename(path), valid_time(path), lats, lons, grid)
+    finally:
+        if h5 is not None:
+            h5.close()
+    return len(todo)
+
+
+def append_grid(index_path: str, path: str, lats, lons, data,
+                threshold: float = HAIL_THRESHOLD) -> None:
+    """Add one already-decoded file to the index, e.g. from the realtime pipeline."""
+    with _open(index_path, lats, lons, threshold) as h5:
+        name = os.path.basename(path)
+        if name not in set(h5['files'].asstr()[:]):
+            add_grid(h5, name, valid_time(path), lats, lons, data)
+
+
+def point_history(index_path: str, lat: float, lon: float, radius_km: float = 0,
+                  min_value: float = 0) -> List[Tuple[datetime, float]]:
+    """Return ``(valid time, max MESH)`` for every file with hail at a point.
+
+    With ``radius_km`` the max is over the cells within that distance.
+    Only the records of those cells are read, a slice per segment of each
+    tile covering them.
+    """
+    with h5py.File(index_path, 'r') as h5:
+        lats, lons = h5['lat'][:], h5['lon'][:]
+        rows, cols, inside = point_cells(lats, lons, [lat], [lon])
+        if not inside[0]:
+            return []
+        _, dlat, _, dlon = grid_spacing(lats, lons)
+        ky = KM_PER_DEGREE * abs(dlat)
+        kx = KM_PER_DEGREE * abs(dlon) * np.cos(np.radians(lat))
+        ry, rx = int(radius_km // ky), int(radius_km // kx)
+        dy, dx = (a.ravel() for a in np.mgrid[-ry:ry + 1, -rx:rx + 1])
+        near = (dy * ky) ** 2 + (dx * kx) ** 2 <= radius_km ** 2
+        r, c = rows[0] + dy[near], cols[0] + dx[near]
+        ok = (r >= 0) & (r < lats.size) & (c >= 0) & (c < lons.size)
+        r, c = r[ok], c[ok]
+
+        best = {}
+        for tr, tc in set(zip((r // TILE).tolist(), (c // TILE).tolist())):
+            name = f'tiles/{tr}_{tc}'
+            if name not in h5:
+                continue
+            tile = h5[name]
+            mine = (r // TILE == tr) & (c // TILE == tc)
+            local = np.unique((r[mine] - tr * TILE) * TILE + (c[mine] - tc * TILE))
+            for seg_id in tile.attrs['segments']:
+                seg = tile[str(seg_id)]
+                directory = seg['cell'][:]
+                i = np.searchsorted(directory, local)
+                i = i[(i < directory.size) & (directory[np.minimum(i, directory.size - 1)] == local)]
+                if not i.size:
+                    continue
+                starts = seg['start'][i[0]:i[-1] + 2]
+                # neighbouring cells' records are adjacent, so read runs of them at once
+                for run in np.split(i, np.flatnonzero(np.diff(i) != 1) + 1):
+                    a, b = starts[run[0] - i[0]], starts[run[-1] + 1 - i[0]]
+                    for t, v in zip(seg['time'][a:b], seg['value'][a:b]):
+                        if v >= min_value and v > best.get(int(t), -np.inf):
+                            best[int(t)] = float(v)
+    return [(datetime.fromtimestamp(t, timezone.utc), v) for t, v in sorted(best.items())]
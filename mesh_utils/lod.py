@@ -0,0 +1,84 @@
+"""Level-of-detail views of a MESH grid for interactive zoom and pan.
+
+A pyramid of max-pooled copies is built once, each half the size of the
+one before, so hail never disappears from a zoomed-out view. A view of
+the visible extent is rendered from the coarsest level that still gives
+at least one cell per screen pixel, cut to that extent. Wide views read
+a small pooled level and close-ups read a small window of the full
+grid, so each redraw touches about a screen's worth of cells.
+"""
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+
+from process_mesh import HAIL_THRESHOLD, as_dense, grid_window
+from .raster import max_pool, render_rgba
+
+# pooling stops once a level fits in this many cells per axis
+MIN_LEVEL_SIZE = 512
+
+
+class LevelOfDetail:
+    """Max-pooled pyramid of a grid that renders views of any extent."""
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, data,
+                 vmin: Optional[float] = None, vmax: Optional[float] = None,
+                 threshold: float = HAIL_THRESHOLD, min_size: int = MIN_LEVEL_SIZE):
+        data = np.asarray(as_dense(data), dtype=np.float32)
+        data = data.reshape(data.shape[-2:])
+        hail = data[data >= threshold]
+        self.vmin = vmin if vmin is not None else (float(hail.min()) if hail.size else 0.0)
+        self.vmax = vmax if vmax is not None else (float(hail.max()) if hail.size else 1.0)
+        self.threshold = threshold
+        self.levels = [(lats, lons, data)]
+        while max(self.levels[-1][2].shape) > min_size:
+            self.levels.append(max_pool(*self.levels[-1], 2))
+
+    def level_for(self, rows: int, cols: int, width: float, height: float) -> int:
+        """Return the pyramid level for ``rows x cols`` full-resolution cells on screen."""
+        needed = max(rows / max(height, 1), cols / max(width, 1))
+        if needed < 2:
+            return 0
+        return min(int(math.log2(needed)), len(self.levels) - 1)
+
+    def view(self, xlim: Tuple[float, float], ylim: Tuple[float, float],
+             width: float, height: float):
+        """Return ``(key, rgba, extent)`` for the visible lon/lat limits.
+
+        ``width`` and ``height`` are the axes size in pixels. ``key``
+        identifies the level and window, so an unchanged view can be
+        skipped. Returns None if the limits miss the grid.
+        """
+        bbox = (min(ylim), min(xlim), max(ylim), max(xlim))
+        lats, lons, _ = self.levels[0]
+        try:
+            rows, cols = grid_window(lats, lons, bbox)
+        except ValueError:
+            return None
+        level = self.level_for(rows.stop - rows.start, cols.stop - cols.start, width, height)
+        lats, lons, data = self.levels[level]
+        try:
+            rows, cols = grid_window(lats, lons, bbox)
+        except ValueError:
+            return None
+        # one cell of margin so the image covers the axes edges
+        rows = slice(max(rows.start - 1, 0), rows.stop + 1)
+        cols = slice(max(cols.start - 1, 0), cols.stop + 1)
+        lats, lons = lats[rows], lons[cols]
+        rgba = render_rgba(lats, lons, data[rows, cols], vmin=self.vmin, vmax=self.vmax,
+                           threshold=self.threshold)
+        extent = _extent(lats, lons)
+        return (level, rows.start, rows.stop, cols.start, cols.stop), rgba, extent
+
+
+def _extent(lats: np.ndarray, lons: np.ndarray) -> Tuple[float, float, float, float]:
+    """Return the imshow extent of cell-centred coordinates, half a cell out."""
+    def edges(coord):
+        lo, hi = float(coord.min()), float(coord.max())
+        half = (hi - lo) / (coord.size - 1) / 2 if coord.size > 1 else 0.0
+        return lo - half, hi + half
+
+    west, east = edges(lons)
+    south, north = edges(lats)
+    return west, east, south, north
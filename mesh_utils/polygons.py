@@ -0,0 +1,181 @@
+"""Hail swath polygons for spatial joins.
+
+All thresholds are traced in one contourpy pass over the grid. Each
+threshold becomes a band from it up to the next one, with the top band
+open-ended. Bands do not overlap, so a point falls in at most one of
+them. To get the area with "at least X", select the bands whose
+``min_mm`` is at or above X.
+
+Features are GeoJSON-style dicts with ``MultiPolygon`` geometries in
+EPSG:4326. Exterior rings are counter-clockwise, as RFC 7946 requires.
+Results for a file are cached as GeoJSON under ``CACHE_DIR/polygons``,
+keyed by its contents and the extraction options, and evicted least
+recently used first like the decoded grids.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from process_mesh import CACHE_DIR, BBox, GridCache, as_dense, file_digest, load_mesh
+
+MM_PER_INCH = 25.4
+# 1", 1.5", 2", ... 4" in mm
+DEFAULT_LEVELS = tuple(round(MM_PER_INCH * i / 2, 2) for i in range(2, 9))
+
+
+def _ring_area(ring: np.ndarray) -> float:
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+
+
+def _polygon(rings: Sequence[np.ndarray]) -> List[list]:
+    """Return closed rings, exterior counter-clockwise and holes clockwise."""
+    out = []
+    for i, ring in enumerate(rings):
+        ring = np.asarray(ring, dtype=np.float64)
+        if not np.array_equal(ring[0], ring[-1]):
+            ring = np.vstack([ring, ring[:1]])
+        if (_ring_area(ring) > 0) != (i == 0):
+            ring = ring[::-1]
+        out.append(np.round(ring, 6).tolist())
+    return out
+
+
+def _simplify(features: List[dict], tolerance: float) -> List[dict]:
+    import shapely
+    from shapely.geometry import shape
+
+    geoms = [shape(f['geometry']) for f in features]
+    if hasattr(shapely, 'coverage_simplify'):
+        # bands share their edges; simplify them together so no gaps open
+        geoms = shapely.coverage_simplify(geoms, tolerance)
+    else:
+        geoms = [g.simplify(tolerance, preserve_topology=True) for g in geoms]
+    out = []
+    for feature, geom in zip(features, geoms):
+        if geom.is_empty:
+            continue
+        parts = geom.geoms if hasattr(geom, 'geoms') else [geom]
+        coords = [_polygon([p.exterior.coords] + [h.coords for h in p.interiors])
+                  for p in parts if not p.is_empty]
+        out.append({**feature, 'geometry': {'type': 'MultiPolygon', 'coordinates': coords}})
+    return out
+
+
+def swath_polygons(lats: np.ndarray, lons: np.ndarray, data,
+                   levels: Sequence[float] = DEFAULT_LEVELS,
+                   simplify: float = 0.0) -> List[dict]:
+    """Return one MultiPolygon feature per non-empty band of ``levels`` (mm).
+
+    ``simplify`` is a tolerance in degrees for topology-preserving
+    simplification, which needs shapely.
+    """
+    import contourpy
+
+    levels = sorted(float(v) for v in levels)
+    data = as_dense(data)
+    z = np.nan_to_num(np.asarray(data, dtype=np.float64).reshape(data.shape[-2:]),
+                      nan=levels[0] - 1)
+    lons = np.where(lons > 180, lons - 360.0, lons)
+    gen = contourpy.contour_generator(lons, lats, z, fill_type='OuterOffset')
+    bands = gen.multi_filled(levels + [np.inf])
+
+    features = []
+    for lo, hi, (polys, offsets) in zip(levels, levels[1:] + [None], bands):
+        if not polys:
+            continue
+        coords = [_polygon(np.split(p, o[1:-1])) for p, o in zip(polys, offsets)]
+        features.append({
+            'type': 'Feature',
+            'properties': {'min_mm': lo, 'max_mm': hi,
+                           'min_in': round(lo / MM_PER_INCH, 3)},
+            'geometry': {'type': 'MultiPolygon', 'coordinates': coords},
+        })
+    if simplify and features:
+        features = _simplify(features, simplify)
+    return features
+
+
+def _cache_path(path: str, variable: Optional[str], bbox: Optional[BBox],
+                levels: Sequence[float], simplify: float) -> str:
+    options = json.dumps([variable, list(bbox) if bbox else None,
+                          sorted(float(v) for v in levels), simplify])
+    digest = hashlib.sha256(f'{file_digest(path)}:{options}'.encode()).hexdigest()[:32]
+    return os.path.join(CACHE_DIR, 'polygons', digest, 'features.geojson')
+
+
+def _cache_put(features: List[dict], cached: str) -> None:
+    """Publish ``cached`` as a GridCache entry, then evict over the size limit."""
+    entry = os.path.dirname(cached)
+    polygon_cache = GridCache(os.path.dirname(entry))
+    tmp = os.path.join(polygon_cache.root, f'.tmp-{os.path.basename(entry)}-{uuid.uuid4().hex}')
+    os.mkdir(tmp)
+    try:
+        _write_geojson(features, os.path.join(tmp, os.path.basename(cached)))
+        os.rename(tmp, entry)
+    except OSError:
+        # another process published the same entry first
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(entry):
+            raise
+    polygon_cache.evict()
+
+
+def file_polygons(path: str, levels: Sequence[float] = DEFAULT_LEVELS,
+                  bbox: Optional[BBox] = None, simplify: float = 0.0,
+                  variable: Optional[str] = None, cache: bool = True) -> List[dict]:
+    """Return the swath polygons of a MESH file, from the cache when possible."""
+    cached = _cache_path(path, variable, bbox, levels, simplify) if cache else None
+    if cached:
+        try:
+            with open(cached) as f:
+                features = json.load(f)['features']
+            # the entry mtime records last use, as for cached grids
+            os.utime(os.path.dirname(cached))
+            return features
+        except (FileNotFoundError, NotADirectoryError):
+            # missing, or evicted by another process while opening
+            pass
+    lats, lons, data = load_mesh(path, bbox=bbox, variable=variable, cache=cache)
+    features = swath_polygons(lats, lons, data, levels, simplify)
+    if cached:
+        _cache_put(features, cached)
+    return features
+
+
+def _write_geojson(features: List[dict], path: str) -> None:
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'type': 'FeatureCollection', 'features': features}, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def write_polygons(features: List[dict], path: str) -> None:
+    """Write features to GeoJSON, or to FlatGeobuf for a ``.fgb`` path.
+
+    FlatGeobuf needs pyogrio and shapely.
+    """
+    if not path.endswith('.fgb'):
+        _write_geojson(features, path)
+        return
+    import pyogrio.raw
+    import shapely
+    from shapely.geometry import shape
+
+    geometry = np.array([shapely.to_wkb(shape(f['geometry'])) for f in features],
+                        dtype=object)
+    fields = ['min_mm', 'max_mm', 'min_in']
+    field_data = [np.array([f['properties'][k] if f['properties'][k] is not None else np.nan
+                            for f in features], dtype=np.float64) for k in fields]
+    pyogrio.raw.write(path, geometry, field_data, fields, driver='FlatGeobuf',
+                      crs='EPSG:4326', geometry_type='MultiPolygon')
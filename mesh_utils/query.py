@@ -0,0 +1,189 @@
+"""Vectorised MESH lookups for large sets of lat/lon points.
+
+MRMS grids are regular, so a point maps to its cell with one multiply
+and round instead of a search of the coordinate arrays. Each file is
+then sampled for every point in a single gather.
+"""
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from process_mesh import HAIL_THRESHOLD, SparseGrid, load_mesh, valid_time
+
+KM_PER_DEGREE = 111.195
+LAT_COLUMNS = ('lat', 'latitude', 'y')
+LON_COLUMNS = ('lon', 'lng', 'long', 'longitude', 'x')
+# points gathered per block when sampling a neighbourhood
+BLOCK = 8192
+
+
+def grid_spacing(lats: np.ndarray, lons: np.ndarray) -> Tuple[float, float, float, float]:
+    """Return ``(lat0, dlat, lon0, dlon)`` of a regular grid with 1-D coordinates."""
+    if lats.ndim != 1 or lons.ndim != 1:
+        raise ValueError("point queries need a regular grid with 1-D lat/lon coordinates")
+    spacing = []
+    for coord in (lats, lons):
+        coord = coord.astype(np.float64)
+        step = (coord[-1] - coord[0]) / (coord.size - 1) if coord.size > 1 else 1.0
+        # float32 coordinates drift by a small fraction of a cell
+        expected = coord[0] + step * np.arange(coord.size)
+        if not np.allclose(coord, expected, rtol=0, atol=abs(step) * 0.01):
+            raise ValueError("grid coordinates are not evenly spaced")
+        spacing += [float(coord[0]), float(step)]
+    return tuple(spacing)
+
+
+def point_cells(lats: np.ndarray, lons: np.ndarray, plat, plon) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the row, column and in-grid mask of each point."""
+    lat0, dlat, lon0, dlon = grid_spacing(lats, lons)
+    plat = np.asarray(plat, dtype=np.float64)
+    plon = np.asarray(plon, dtype=np.float64)
+    if np.nanmax(lons) > 180:
+        plon = np.mod(plon, 360)
+    rows = np.rint((plat - lat0) / dlat).astype(np.int64)
+    cols = np.rint((plon - lon0) / dlon).astype(np.int64)
+    inside = (rows >= 0) & (rows < lats.size) & (cols >= 0) & (cols < lons.size)
+    return rows, cols, inside
+
+
+def _gather(data, rows: np.ndarray, cols: np.ndarray, inside: np.ndarray) -> np.ndarray:
+    out = np.full(rows.shape, np.nan, dtype=np.float32)
+    if isinstance(data, SparseGrid):
+        out[inside] = data.lookup(rows[inside], cols[inside])
+    else:
+        data = data.reshape(data.shape[-2:])
+        out[inside] = data[rows[inside], cols[inside]]
+        out[out < HAIL_THRESHOLD] = np.nan
+    return out
+
+
+def sample(lats: np.ndarray, lons: np.ndarray, data, plat, plon,
+           radius_km: float = 0) -> np.ndarray:
+    """Return MESH at each point, or the max within ``radius_km`` of it.
+
+    ``data`` may be dense or a ``SparseGrid``. Points off the grid or below
+    the hail threshold get NaN.
+    """
+    rows, cols, inside = point_cells(lats, lons, plat, plon)
+    if not radius_km:
+        return _gather(data, rows, cols, inside)
+
+    _, dlat, _, dlon = grid_spacing(lats, lons)
+    plat = np.asarray(plat, dtype=np.float64)
+    ky = KM_PER_DEGREE * abs(dlat)
+    kx = KM_PER_DEGREE * abs(dlon) * np.cos(np.radians(plat))
+    ry = int(np.ceil(radius_km / ky))
+    rx = int(np.ceil(radius_km / max(float(np.nanmin(kx)), 1e-6)))
+    dy, dx = (a.ravel() for a in np.mgrid[-ry:ry + 1, -rx:rx + 1])
+
+    out = np.full(rows.shape, np.nan, dtype=np.float32)
+    for lo in range(0, rows.size, BLOCK):
+        sl = slice(lo, lo + BLOCK)
+        near = (dy * ky) ** 2 + (dx * kx[sl, None]) ** 2 <= radius_km ** 2
+        r = rows[sl, None] + dy
+        c = cols[sl, None] + dx
+        ok = near & (r >= 0) & (r < lats.size) & (c >= 0) & (c < lons.size)
+        out[sl] = np.fmax.reduce(_gather(data, r, c, ok), axis=1)
+    return out
+
+
+_points = None
+
+
+def _init_points(plat, plon, radius_km) -> None:
+    global _points
+    _points = (plat, plon, radius_km)
+
+
+def _sample_file(path: str):
+    plat, plon, radius_km = _points
+    lats, lons, grid = load_mesh(path, sparse=True)
+    return path, sample(lats, lons, grid, plat, plon, radius_km)
+
+
+def query_points(files: Iterable[str], plat, plon, radius_km: float = 0,
+                 jobs: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the max MESH at each point over ``files`` and its valid time.
+
+    Times are Unix seconds, -1 where no file had hail at the point.
+    """
+    plat = np.asarray(plat, dtype=np.float64)
+    plon = np.asarray(plon, dtype=np.float64)
+    best = np.full(plat.shape, np.nan, dtype=np.float32)
+    when = np.full(plat.shape, -1, dtype=np.int64)
+
+    def fold(path, values):
+        better = values > np.nan_to_num(best, nan=-np.inf)
+        best[better] = values[better]
+        when[better] = int(valid_time(path).timestamp())
+
+    files = list(files)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        _init_points(plat, plon, radius_km)
+        for path in files:
+            fold(*_sample_file(path))
+    else:
+        with ProcessPoolExecutor(jobs, initializer=_init_points,
+                                 initargs=(plat, plon, radius_km)) as pool:
+            for path, values in pool.map(_sample_file, files):
+                fold(path, values)
+    return best, when
+
+
+def _find_column(columns: Sequence[str], names: Sequence[str]) -> str:
+    lower = {c.lower(): c for c in columns}
+    for name in names:
+        if name in lower:
+            return lower[name]
+    raise ValueError(f"no column named any of {', '.join(names)}")
+
+
+def read_points(path: str) -> Tuple[List[dict], np.ndarray, np.ndarray]:
+    """Read a CSV or Parquet table and return its rows with lat/lon arrays."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        rows = pq.read_table(path).to_pylist()
+    else:
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+    if not rows:
+        return rows, np.empty(0), np.empty(0)
+    lat_col = _find_column(list(rows[0]), LAT_COLUMNS)
+    lon_col = _find_column(list(rows[0]), LON_COLUMNS)
+    plat = np.array([float(r[lat_col]) for r in rows])
+    plon = np.array([float(r[lon_col]) for r in rows])
+    return rows, plat, plon
+
+
+def write_table(path: str, rows: List[dict]) -> None:
+    """Write ``rows`` to CSV, or to Parquet for a ``.parquet`` path."""
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_table(pa.Table.from_pylist(rows), path)
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def query_table(points_path: str, files: Iterable[str], output: str,
+                radius_km: float = 0, jobs: Optional[int] = None) -> int:
+    """Add ``mesh_max`` and ``mesh_max_time`` columns to a point table."""
+    rows, plat, plon = read_points(points_path)
+    best, when = query_points(files, plat, plon, radius_km, jobs)
+    for row, value, t in zip(rows, best, when):
+        # None is an empty CSV cell and a null in Parquet
+        row['mesh_max'] = None if np.isnan(value) else round(float(value), 2)
+        row['mesh_max_time'] = (datetime.fromtimestamp(int(t), timezone.utc).isoformat()
+                                if t >= 0 else None)
+    write_table(output, rows)
+    return len(rows)
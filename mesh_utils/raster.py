@@ -0,0 +1,117 @@
+"""Direct numpy rasteriser for regular MESH grids.
+
+MRMS grids are regular in lat/lon, so an overlay is just the grid mapped
+through a precomputed colour lookup table, one pixel per cell. No
+quadrilaterals are built and no figure is drawn. Cells below the hail
+threshold, and NaN cells, are fully transparent.
+"""
+import struct
+import zlib
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+from process_mesh import HAIL_THRESHOLD, SparseGrid, as_dense
+
+
+@lru_cache(maxsize=None)
+def colormap_lut(name: str = 'turbo', n: int = 256) -> np.ndarray:
+    """Return an ``(n, 4)`` uint8 RGBA lookup table for a matplotlib colormap.
+
+    Only the colormap registry is used, not pyplot, and the table is built
+    once per process.
+    """
+    from matplotlib import colormaps
+
+    lut = colormaps[name].resampled(n)(np.arange(n), bytes=True)
+    lut.flags.writeable = False
+    return lut
+
+
+def _colour(values: np.ndarray, vmin: float, vmax: float, lut: np.ndarray) -> np.ndarray:
+    n = lut.shape[0]
+    scale = n / (vmax - vmin) if vmax > vmin else 0.0
+    idx = ((values - vmin) * scale).astype(np.intp)
+    np.clip(idx, 0, n - 1, out=idx)
+    return lut[idx]
+
+
+def render_rgba(lats: np.ndarray, lons: np.ndarray, data, vmin: Optional[float] = None,
+                vmax: Optional[float] = None, threshold: float = HAIL_THRESHOLD,
+                lut: Optional[np.ndarray] = None) -> np.ndarray:
+    """Return a north-up ``(rows, cols, 4)`` uint8 image of ``data``.
+
+    ``vmin``/``vmax`` default to the range of the visible cells, as
+    pcolormesh would autoscale. ``data`` may be a ``SparseGrid``; then only
+    its stored cells are coloured.
+    """
+    lut = colormap_lut() if lut is None else lut
+    if isinstance(data, SparseGrid):
+        keep = data.values >= threshold
+        index, values = data.index[keep], data.values[keep]
+        shape = data.shape
+    else:
+        data = np.asarray(data)
+        flat = data.reshape(-1)
+        # NaN >= threshold is False, so NaN cells stay transparent
+        index = np.flatnonzero(flat >= threshold)
+        values = flat[index]
+        shape = data.shape[-2:]
+    if vmin is None:
+        vmin = float(values.min()) if values.size else 0.0
+    if vmax is None:
+        vmax = float(values.max()) if values.size else 1.0
+
+    rgba = np.zeros(shape + (4,), dtype=np.uint8)
+    rgba.reshape(-1, 4)[index] = _colour(values, vmin, vmax, lut)
+    if lats.ndim == 1 and lats.size > 1 and lats[0] < lats[-1]:
+        rgba = rgba[::-1]
+    if lons.ndim == 1 and lons.size > 1 and lons[0] > lons[-1]:
+        rgba = rgba[:, ::-1]
+    return rgba
+
+
+def _pool_coord(coord: np.ndarray, factor: int) -> np.ndarray:
+    pad = -coord.size % factor
+    coord = np.concatenate([coord.astype(np.float64), np.full(pad, np.nan)])
+    return np.nanmean(coord.reshape(-1, factor), axis=1).astype(np.float32)
+
+
+def max_pool(lats: np.ndarray, lons: np.ndarray, data, factor: int):
+    """Return the grid reduced ``factor`` times per axis, keeping each block's max.
+
+    Unlike striding, no hail cell is dropped. Blocks at the edges may be
+    partial; coordinates are block centres.
+    """
+    data = as_dense(data)
+    if factor <= 1:
+        return lats, lons, data
+    data = data.reshape(data.shape[-2:]).astype(np.float32, copy=False)
+    h, w = data.shape
+    padded = np.full((h + -h % factor, w + -w % factor), np.nan, dtype=np.float32)
+    padded[:h, :w] = data
+    blocks = padded.reshape(padded.shape[0] // factor, factor, padded.shape[1] // factor, factor)
+    # fmax ignores NaN, so an all-NaN block stays NaN without a warning
+    pooled = np.fmax.reduce(np.fmax.reduce(blocks, axis=3), axis=1)
+    return _pool_coord(lats, factor), _pool_coord(lons, factor), pooled
+
+
+def _chunk(kind: bytes, payload: bytes) -> bytes:
+    return (struct.pack('>I', len(payload)) + kind + payload
+            + struct.pack('>I', zlib.crc32(kind + payload) & 0xFFFFFFFF))
+
+
+def encode_png(rgba: np.ndarray, level: int = 1) -> bytes:
+    """Encode an ``(h, w, 4)`` uint8 array as an RGBA PNG."""
+    h, w = rgba.shape[:2]
+    raw = np.zeros((h, 1 + 4 * w), dtype=np.uint8)  # filter byte 0 per row
+    raw[:, 1:] = rgba.reshape(h, 4 * w)
+    header = struct.pack('>IIBBBBB', w, h, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', header)
+            + _chunk(b'IDAT', zlib.compress(raw.tobytes(), level)) + _chunk(b'IEND', b''))
+
+
+def save_png(rgba: np.ndarray, path: str, level: int = 1) -> None:
+    with open(path, 'wb') as f:
+        f.write(encode_png(rgba, level))
@@ -0,0 +1,131 @@
+"""Chunked, compressed HDF5 store of MESH grids along a time axis.
+
+Layout of a store file::
+
+    lat     (ny,)           latitude of each row
+    lon     (nx,)           longitude of each column
+    time    (nt,) int64     valid time, seconds since the Unix epoch
+    source  (nt,) str       base name of the ingested file
+    mesh    (nt, ny, nx)    float32, one chunk per time step and spatial tile
+
+``source`` is written last for every time step and acts as the commit
+record: rows of ``time``/``mesh`` beyond ``len(source)`` are left over
+from an interrupted ingest and are overwritten by the next one.
+"""
+import glob
+import os
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from process_mesh import BBox, grid_window, load_mesh, valid_time
+
+CHUNK = 256
+MESH_PATTERNS = ('*.gz', '*.grib2', '*.nc')
+
+
+def find_mesh_files(inputs: Iterable[str]) -> List[str]:
+    """Expand directories in ``inputs`` to the MESH files they contain."""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for pattern in MESH_PATTERNS:
+                files.extend(glob.glob(os.path.join(item, pattern)))
+        else:
+            files.append(item)
+    return sorted(set(files))
+
+
+def _create(h5, lats: np.ndarray, lons: np.ndarray, variable: str) -> None:
+    import h5py
+
+    if lats.ndim != 1 or lons.ndim != 1:
+        raise ValueError("the store needs a regular grid with 1-D lat/lon coordinates")
+    ny, nx = lats.size, lons.size
+    h5.attrs['variable'] = variable
+    h5.create_dataset('lat', data=lats)
+    h5.create_dataset('lon', data=lons)
+    h5.create_dataset('time', shape=(0,), maxshape=(None,), dtype='i8', chunks=(1024,))
+    h5.create_dataset('source', shape=(0,), maxshape=(None,),
+                      dtype=h5py.string_dtype(), chunks=(1024,))
+    h5.create_dataset('mesh', shape=(0, ny, nx), maxshape=(None, ny, nx), dtype='f4',
+                      chunks=(1, min(CHUNK, ny), min(CHUNK, nx)),
+                      compression='gzip', compression_opts=4, shuffle=True,
+                      fillvalue=np.nan)
+
+
+def ingest(files: Iterable[str], store: str, variable: Optional[str] = None) -> int:
+    """Append ``files`` to ``store`` in valid-time order and return how many were added.
+
+    Files already recorded in the store are skipped, so an interrupted or
+    repeated ingest picks up where it left off.
+    """
+    import h5py
+
+    files = sorted(files, key=valid_time)
+    added = 0
+    with h5py.File(store, 'a') as h5:
+        done = set(h5['source'].asstr()[:]) if 'source' in h5 else set()
+        for path in files:
+            name = os.path.basename(path)
+            if name in done:
+                continue
+            when = int(valid_time(path).timestamp())
+            lats, lons, data = load_mesh(path, variable=variable)
+            if data.ndim == 3 and data.shape[0] == 1:
+                data = data[0]
+            if 'mesh' not in h5:
+                _create(h5, lats, lons, variable or 'auto')
+            mesh = h5['mesh']
+            if data.shape != mesh.shape[1:]:
+                raise ValueError(f"{path}: grid {data.shape} does not match store grid {mesh.shape[1:]}")
+            n = h5['source'].shape[0]
+            mesh.resize(n + 1, axis=0)
+            mesh[n] = data
+            h5['time'].resize((n + 1,))
+            h5['time'][n] = when
+            h5['source'].resize((n + 1,))
+            h5['source'][n] = name
+            h5.flush()
+            done.add(name)
+            added += 1
+    return added
+
+
+def store_times(store: str) -> List[datetime]:
+    """Return the valid times held in ``store`` in storage order."""
+    import h5py
+
+    with h5py.File(store, 'r') as h5:
+        n = h5['source'].shape[0]
+        return [datetime.fromtimestamp(int(t), timezone.utc) for t in h5['time'][:n]]
+
+
+def load_store(store: str, time: Optional[datetime] = None, index: Optional[int] = None,
+               bbox: Optional[BBox] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return lat, lon, mesh arrays for one time step of ``store``.
+
+    Select the step by valid ``time`` or by storage ``index`` (default: the
+    latest). Only the chunks covering that step and ``bbox`` are read.
+    """
+    import h5py
+
+    with h5py.File(store, 'r') as h5:
+        n = h5['source'].shape[0]
+        if time is not None:
+            matches = np.flatnonzero(h5['time'][:n] == int(time.timestamp()))
+            if not matches.size:
+                raise KeyError(f"no grid valid at {time:%Y-%m-%d %H:%M:%S} in {store}")
+            index = int(matches[-1])
+        elif index is None:
+            index = n - 1
+        if not -n <= index < n:
+            raise IndexError(f"time index {index} out of range for {n} steps")
+        index %= n
+        lats = h5['lat'][:]
+        lons = h5['lon'][:]
+        if bbox is None:
+            return lats, lons, h5['mesh'][index]
+        rows, cols = grid_window(lats, lons, bbox)
+        return lats[rows], lons[cols], h5['mesh'][index, rows, cols]
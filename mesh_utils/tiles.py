@@ -0,0 +1,196 @@
+"""Web-Mercator XYZ tile pyramids of MESH grids for slippy maps.
+
+Tiles are 256x256 RGBA PNGs laid out as ``<root>/<z>/<x>/<y>.png``. Only
+tiles that contain a cell at or above the hail threshold are written.
+Each pixel takes the grid cell nearest its centre, coloured on one scale
+for the whole file so neighbouring tiles match.
+
+By default a pyramid lives under ``CACHE_DIR/tiles/<key>``, keyed by the
+source digest, variable and threshold, so it is reused across sessions.
+Pyramids there are evicted least recently used first once they exceed the
+grid cache's size limit. Each zoom level is written to a temporary
+directory and renamed into place when complete; a zoom directory that
+exists is never rendered again.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from process_mesh import CACHE_DIR, HAIL_THRESHOLD, GridCache, file_digest, load_mesh
+from .query import _gather, grid_spacing, point_cells
+from .raster import _colour, colormap_lut, encode_png
+
+TILE_SIZE = 256
+# Web-Mercator is undefined past this latitude
+MAX_LAT = 85.0511287798
+# zoom 7 is about one pixel per 0.01 degree MRMS cell at mid latitudes
+MIN_ZOOM = 3
+MAX_ZOOM = 7
+# tiles rendered per worker task
+TILES_PER_TASK = 32
+
+
+def tile_root(path: str, root: Optional[str] = None, variable: Optional[str] = None,
+              threshold: float = HAIL_THRESHOLD) -> str:
+    """Return the cache directory holding the tile pyramid of ``path``."""
+    key = '|'.join([file_digest(path), variable or 'auto', f'{threshold:g}'])
+    return os.path.join(root or os.path.join(CACHE_DIR, 'tiles'),
+                        hashlib.sha256(key.encode()).hexdigest()[:32])
+
+
+def tile_index(lat, lon, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the x, y indices of the tiles containing each point."""
+    n = 2 ** zoom
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -MAX_LAT, MAX_LAT))
+    lon = (np.asarray(lon, dtype=np.float64) + 180) % 360
+    x = np.floor(lon / 360 * n)
+    y = np.floor((1 - np.arcsinh(np.tan(lat)) / np.pi) / 2 * n)
+    return (np.clip(x, 0, n - 1).astype(np.int64),
+            np.clip(y, 0, n - 1).astype(np.int64))
+
+
+def tile_pixels(zoom: int, x: int, y: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the latitudes of a tile's pixel rows and longitudes of its columns."""
+    n = 2 ** zoom
+    f = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    lon = (x + f) / n * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + f) / n))))
+    return lat, lon
+
+
+def occupied_tiles(lats: np.ndarray, lons: np.ndarray, index: np.ndarray,
+                   zoom: int) -> np.ndarray:
+    """Return ``(n, 2)`` x, y of the tiles touched by the flat cells ``index``."""
+    _, dlat, _, dlon = grid_spacing(lats, lons)
+    rows, cols = np.divmod(index, lons.size)
+    clat = lats[rows].astype(np.float64)
+    clon = lons[cols].astype(np.float64)
+    # a cell may straddle a tile edge, so take the tiles of all four corners
+    found = []
+    for sy in (-0.5, 0.5):
+        for sx in (-0.5, 0.5):
+            found.append(np.stack(tile_index(clat + sy * dlat, clon + sx * dlon, zoom), axis=1))
+    return np.unique(np.concatenate(found), axis=0)
+
+
+_grid = None
+
+
+def _init_tiles(path: str, variable: Optional[str], cache: bool, threshold: float,
+                vmin: float, vmax: float) -> None:
+    global _grid
+    lats, lons, grid = load_mesh(path, variable=variable, cache=cache, sparse=True,
+                                 threshold=threshold)
+    _grid = (lats, lons, grid, threshold, vmin, vmax)
+
+
+def _render_tiles(zoom: int, tiles: List[Tuple[int, int]], out: str) -> int:
+    lats, lons, grid, threshold, vmin, vmax = _grid
+    lut = colormap_lut()
+    written = 0
+    for x, y in tiles:
+        plat, plon = tile_pixels(zoom, x, y)
+        rows, cols, inside = point_cells(lats, lons, plat[:, None], plon[None, :])
+        rows, cols, inside = np.broadcast_arrays(rows, cols, inside)
+        values = _gather(grid, rows, cols, inside)
+        hail = values >= threshold
+        if not hail.any():
+            continue
+        rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+        rgba[hail] = _colour(values[hail], vmin, vmax, lut)
+        tile_dir = os.path.join(out, str(x))
+        os.makedirs(tile_dir, exist_ok=True)
+        with open(os.path.join(tile_dir, f'{y}.png'), 'wb') as f:
+            f.write(encode_png(rgba))
+        written += 1
+    return written
+
+
+def make_tiles(path: str, out_dir: Optional[str] = None, min_zoom: int = MIN_ZOOM,
+               max_zoom: int = MAX_ZOOM, variable: Optional[str] = None,
+               threshold: float = HAIL_THRESHOLD, jobs: Optional[int] = None,
+               cache: bool = True,
+               cancel: Optional[threading.Event] = None) -> Tuple[str, int]:
+    """Write the XYZ tile pyramid of ``path`` and return its root and new tile count.
+
+    ``out_dir`` defaults to ``tile_root(path, ...)`` in the size-limited tile
+    cache. Zoom levels already present are skipped. ``cache`` is passed to
+    ``load_mesh``; with it the workers memory-map one decoded copy of the
+    grid instead of each decoding it. Once ``cancel`` is set no further zoom
+    level is started; the finished ones are kept for the next call.
+    """
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+        return out_dir, _write_zooms(path, out_dir, min_zoom, max_zoom, variable, threshold,
+                                     jobs, cache, cancel)
+    root = tile_root(path, variable=variable, threshold=threshold)
+    tile_cache = GridCache(os.path.dirname(root))
+    # held while writing, so no process evicts the pyramid from under it
+    with tile_cache.use(root):
+        try:
+            written = _write_zooms(path, root, min_zoom, max_zoom, variable, threshold,
+                                   jobs, cache, cancel)
+        finally:
+            # the directory mtime records last use, as for cached grids
+            os.utime(root)
+            tile_cache.evict()
+    return root, written
+
+
+def _write_zooms(path: str, root: str, min_zoom: int, max_zoom: int, variable: Optional[str],
+                 threshold: float, jobs: Optional[int], cache: bool,
+                 cancel: Optional[threading.Event]) -> int:
+    zooms = [z for z in range(min_zoom, max_zoom + 1)
+             if not os.path.isdir(os.path.join(root, str(z)))]
+    if not zooms:
+        return 0
+
+    lats, lons, grid = load_mesh(path, variable=variable, cache=cache, sparse=True,
+                                 threshold=threshold)
+    keep = grid.values >= threshold
+    index, values = grid.index[keep], grid.values[keep]
+    vmin = float(values.min()) if values.size else 0.0
+    vmax = float(values.max()) if values.size else 1.0
+    initargs = (path, variable, cache, threshold, vmin, vmax)
+
+    jobs = jobs or os.cpu_count() or 1
+    pool = None
+    if jobs == 1:
+        _init_tiles(*initargs)
+    else:
+        pool = ProcessPoolExecutor(jobs, initializer=_init_tiles, initargs=initargs)
+    written = 0
+    try:
+        for zoom in zooms:
+            if cancel is not None and cancel.is_set():
+                break
+            tiles = [tuple(t) for t in occupied_tiles(lats, lons, index, zoom).tolist()]
+            tmp = os.path.join(root, f'.tmp-{zoom}-{uuid.uuid4().hex}')
+            os.makedirs(tmp)
+            tasks = [(zoom, tiles[i:i + TILES_PER_TASK], tmp)
+                     for i in range(0, len(tiles), TILES_PER_TASK)]
+            try:
+                if pool is None:
+                    written += sum(_render_tiles(*task) for task in tasks)
+                elif tasks:
+                    written += sum(pool.map(_render_tiles, *zip(*tasks)))
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            try:
+                os.rename(tmp, os.path.join(root, str(zoom)))
+            except OSError:
+                # another process finished this zoom first
+                shutil.rmtree(tmp, ignore_errors=True)
+                if not os.path.isdir(os.path.join(root, str(zoom))):
+                    raise
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return written
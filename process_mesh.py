@@ -1,31 +1,598 @@
+import contextlib
 import gzip
+import hashlib
 import os
-from typing import Tuple
+import re
+import shutil
+import struct
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import Optional, Tuple, Union
 import numpy as np
-from netCDF4 import Dataset
-import xarray as xr
 
+from mesh_trace import span
 
-def _open_dataset(path: str):
-    """Open an uncompressed hail dataset."""
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# (south, west, north, east) in degrees
+BBox = Tuple[float, float, float, float]
+
+CACHE_DIR = os.environ.get(
+    "MESH_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mesh-map"))
+CACHE_MAX_BYTES = int(os.environ.get("MESH_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# "auto" decodes plain single-message lat/lon GRIB2 with eccodes and
+# everything else with cfgrib; "eccodes" or "cfgrib" forces one
+GRIB_ENGINE = os.environ.get("MESH_GRIB_ENGINE", "auto")
+GRIB_ENGINES = ("auto", "eccodes", "cfgrib")
+
+# MESH below this size (mm) is treated as no hail
+HAIL_THRESHOLD = 2.0
+# rows decoded at a time when building a SparseGrid from netCDF
+SPARSE_BLOCK_ROWS = 256
+
+# MRMS file names end in the valid time, e.g. ..._20240228-100000.grib2.gz
+_TIME_RE = re.compile(r"(\d{8})-(\d{6})")
+
+# per-thread scratch buffer reused across gzip loads
+_local = threading.local()
+# libnetcdf/HDF5 are not thread-safe; opening and reading a dataset is
+# serialised, only the gunzip runs concurrently
+_decode_lock = threading.Lock()
+
+
+def valid_time(path: str) -> datetime:
+    """Return the UTC valid time encoded in a MRMS file name."""
+    match = _TIME_RE.search(os.path.basename(path))
+    if not match:
+        raise ValueError(f"no YYYYMMDD-HHMMSS valid time in file name: {path}")
+    return datetime.strptime("".join(match.groups()), "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+
+
+def _gzip_size(path: str) -> int:
+    """Return the uncompressed size stored in a gzip trailer (modulo 2**32)."""
+    with open(path, "rb") as f:
+        f.seek(-4, os.SEEK_END)
+        return struct.unpack("<I", f.read(4))[0]
+
+
+def _gunzip(path: str) -> memoryview:
+    """Decompress ``path`` into a reusable per-thread buffer.
+
+    The returned view aliases the buffer, so it is only valid until the
+    next call on the same thread.
+    """
+    buf = getattr(_local, "buffer", None)
+    size = max(_gzip_size(path), 1)
+    if buf is None or len(buf) < size:
+        buf = bytearray(size)
+    n = 0
+    d = zlib.decompressobj(31)
+    pending = b""
+    in_member = False
+    with span("gunzip", file=os.path.basename(path)) as s, open(path, "rb") as f_in:
+        while True:
+            if not pending:
+                pending = f_in.read(1 << 20)
+                if not pending:
+                    break
+            out = d.decompress(pending, 1 << 22)
+            in_member = not d.eof
+            if d.eof:
+                # gzip allows several members and trailing zero padding
+                pending = d.unused_data.lstrip(b"\0")
+                d = zlib.decompressobj(31)
+            else:
+                pending = d.unconsumed_tail
+            if n + len(out) > len(buf):
+                # trailer size wraps at 4 GiB and ignores extra members
+                grown = bytearray(max(len(buf) * 2, n + len(out)))
+                grown[:n] = memoryview(buf)[:n]
+                buf = grown
+            buf[n:n + len(out)] = out
+            n += len(out)
+        s.set(bytes_in=f_in.tell(), bytes_out=n)
+    if in_member:
+        raise EOFError(f"Compressed file ended before the end-of-stream marker: {path}")
+    _local.buffer = buf
+    return memoryview(buf)[:n]
+
+
+def _gunzip_to_file(path: str, dest: str) -> None:
+    """Stream the gzipped ``path`` into ``dest``."""
+    with span("gunzip", file=os.path.basename(path)) as s, \
+            gzip.open(path, "rb") as f_in, open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out, 1 << 20)
+        s.set(bytes_out=f_out.tell())
+
+
+def _open_dataset(path: str, memory=None, indexpath: Optional[str] = None):
+    """Open an uncompressed hail dataset, optionally from an in-memory buffer.
+
+    ``indexpath`` is where cfgrib keeps the GRIB2 message index.
+    """
+    # imported here: xarray and netCDF4 dominate start-up for commands
+    # that never decode a file
     if path.endswith(".grib2"):
-        return xr.open_dataset(path, engine="cfgrib")
-    return Dataset(path)
+        import xarray as xr
+
+        kwargs = {"backend_kwargs": {"indexpath": indexpath}} if indexpath else {}
+        return xr.open_dataset(path, engine="cfgrib", **kwargs)
+    from netCDF4 import Dataset
+
+    return Dataset(path, memory=memory)
+
+
+def decode_grib2(message, variable: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return lat, lon, data decoded with eccodes from one GRIB2 message.
+
+    ``message`` is any bytes-like object, such as the view ``_gunzip``
+    returns, so gzipped files never touch the disk. Only a single message
+    on a regular lat/lon grid is supported; anything else raises
+    ValueError. Values are unpacked straight into a float32 array with
+    bitmap-masked cells as NaN, and the coordinates are built from the
+    section-3 grid keys instead of per-point arrays. A ``variable`` that
+    is not the message's shortName or cfgrib name raises KeyError.
+    """
+    import eccodes
+
+    gid = eccodes.codes_new_from_message(message)
+    try:
+        total = eccodes.codes_get(gid, "totalLength")
+        if total < len(message) and bytes(message[total:]).strip(b"\0"):
+            raise ValueError("more than one GRIB message")
+        if variable and variable not in {eccodes.codes_get(gid, "shortName"),
+                                         eccodes.codes_get(gid, "cfVarName")}:
+            raise KeyError(f"variable {variable!r} not found in GRIB message")
+        grid_type = eccodes.codes_get(gid, "gridType")
+        if grid_type != "regular_ll":
+            raise ValueError(f"unsupported GRIB grid type: {grid_type}")
+        if eccodes.codes_get(gid, "iScansNegatively") or eccodes.codes_get(gid, "jPointsAreConsecutive"):
+            raise ValueError("unsupported GRIB scanning mode")
+        ni = eccodes.codes_get(gid, "Ni")
+        nj = eccodes.codes_get(gid, "Nj")
+        dlat = eccodes.codes_get(gid, "jDirectionIncrementInDegrees", float)
+        if not eccodes.codes_get(gid, "jScansPositively"):
+            dlat = -dlat
+        lats = _grib_axis(eccodes.codes_get(gid, "latitudeOfFirstGridPointInDegrees", float),
+                          eccodes.codes_get(gid, "latitudeOfLastGridPointInDegrees", float),
+                          dlat, nj)
+        lons = _grib_axis(eccodes.codes_get(gid, "longitudeOfFirstGridPointInDegrees", float),
+                          eccodes.codes_get(gid, "longitudeOfLastGridPointInDegrees", float),
+                          eccodes.codes_get(gid, "iDirectionIncrementInDegrees", float), ni)
+        data = eccodes.codes_get_float_array(gid, "values").reshape(nj, ni)
+        if eccodes.codes_get(gid, "bitmapPresent"):
+            data[data == eccodes.codes_get(gid, "missingValue", float)] = np.nan
+    finally:
+        eccodes.codes_release(gid)
+    return lats, lons, data
+
+
+def _grib_axis(first: float, last: float, step: float, n: int) -> np.ndarray:
+    """Return grid coordinates exactly as eccodes' regular_ll iterator makes them.
+
+    The iterator adds the increment point by point and pins the last point
+    to the header value; matching it bit for bit keeps bbox windows the
+    same as through cfgrib.
+    """
+    axis = np.full(n, step)
+    axis[0] = first
+    axis = np.cumsum(axis)
+    axis[-1] = last
+    return axis
+
+
+_digests = {}
+
+
+def file_digest(path: str) -> str:
+    """Return the SHA-256 of a file's contents, memoised on its stat identity."""
+    st = os.stat(path)
+    ident = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    digest = _digests.get(ident)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = _digests[ident] = h.hexdigest()
+    return digest
+
+
+def _tree_size(path: str) -> int:
+    """Return the total size of the files under ``path``."""
+    total = 0
+    for dirpath, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.stat(os.path.join(dirpath, name)).st_size
+            except FileNotFoundError:
+                continue
+    return total
+
+
+class GridCache:
+    """Content-addressed on-disk cache of decoded grids.
+
+    Each entry is a directory holding ``lats.npy``, ``lons.npy`` and
+    ``data.npy``, returned memory-mapped on a hit. Entries are published
+    and removed with atomic renames so concurrent processes never see a
+    partial entry. The directory mtime records last use and the least
+    recently used entries are evicted once the cache exceeds ``max_bytes``.
+    """
+
+    _ARRAYS = ("lats", "lons", "data")
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = root or os.path.join(CACHE_DIR, "grids")
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, path: str, variable: Optional[str] = None,
+            bbox: Optional[BBox] = None) -> str:
+        parts = [file_digest(path), variable or "auto"]
+        if bbox is not None:
+            parts.append(",".join(f"{v:g}" for v in _check_bbox(bbox)))
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()[:32]
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        entry = os.path.join(self.root, key)
+        try:
+            arrays = tuple(np.load(os.path.join(entry, f"{name}.npy"), mmap_mode="r")
+                           for name in self._ARRAYS)
+            os.utime(entry)
+        except (FileNotFoundError, NotADirectoryError):
+            # missing, or evicted by another process while opening
+            return None
+        return arrays
+
+    def put(self, key: str, lats: np.ndarray, lons: np.ndarray, data: np.ndarray) -> None:
+        tmp = os.path.join(self.root, f".tmp-{key}-{uuid.uuid4().hex}")
+        os.mkdir(tmp)
+        try:
+            with span("cache_put", bytes=lats.nbytes + lons.nbytes + data.nbytes):
+                for name, arr in zip(self._ARRAYS, (lats, lons, data)):
+                    np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(arr), allow_pickle=False)
+            os.rename(tmp, os.path.join(self.root, key))
+        except OSError:
+            # another process published the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(os.path.join(self.root, key)):
+                raise
+        self.evict()
+
+    def grib_entry(self, path: str) -> Tuple[str, str]:
+        """Return the GRIB2 file to open for ``path`` and its cfgrib index path.
+
+        cfgrib only reuses an index written for the same file path, so a
+        gzipped file is decompressed once into the entry and opened from
+        there; a plain file is opened in place. Either way the index lives
+        in the entry rather than beside the data, and is evicted with the
+        decoded grids.
+        """
+        gzipped = path.endswith(".gz")
+        ident = file_digest(path) if gzipped else f"{file_digest(path)}|{os.path.realpath(path)}"
+        entry = os.path.join(self.root, "grib-" + hashlib.sha256(ident.encode()).hexdigest()[:32])
+        grib = os.path.join(entry, "data.grib2") if gzipped else path
+        if not os.path.isdir(entry):
+            tmp = os.path.join(self.root, f".tmp-{os.path.basename(entry)}-{uuid.uuid4().hex}")
+            os.mkdir(tmp)
+            try:
+                if gzipped:
+                    _gunzip_to_file(path, os.path.join(tmp, "data.grib2"))
+                os.rename(tmp, entry)
+            except OSError:
+                shutil.rmtree(tmp, ignore_errors=True)
+                if not os.path.isdir(entry):
+                    raise
+            self.evict()
+        else:
+            os.utime(entry)
+        return grib, os.path.join(entry, "{short_hash}.idx")
+
+    def _entries(self):
+        for name in os.listdir(self.root):
+            if name.startswith("."):
+                continue
+            entry = os.path.join(self.root, name)
+            try:
+                yield os.stat(entry).st_mtime, _tree_size(entry), entry
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
 
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(os.path.join(self.root, ".lock"), "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
 
-def load_mesh(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
-    """Return lat, lon, mesh arrays from a MRMS MESH file."""
-    tmp_path = None
+    @contextlib.contextmanager
+    def use(self, entry: str):
+        """Create the entry directory ``entry`` if needed and keep it from eviction.
+
+        For entries filled in place over time, such as tile pyramids. The
+        entry holds a shared lock on its ``.use`` file while the block runs.
+        """
+        with self._locked():
+            os.makedirs(entry, exist_ok=True)
+            marker = open(os.path.join(entry, ".use"), "a")
+            if fcntl:
+                fcntl.flock(marker, fcntl.LOCK_SH)
+        try:
+            yield entry
+        finally:
+            marker.close()
+
+    @staticmethod
+    def _in_use(entry: str) -> bool:
+        if not fcntl:
+            return False
+        try:
+            marker = open(os.path.join(entry, ".use"))
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+        with marker:
+            try:
+                fcntl.flock(marker, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+        return False
+
+    def evict(self, max_bytes: Optional[int] = None) -> None:
+        """Remove least recently used entries until the cache fits ``max_bytes``.
+
+        Entries held through ``use`` are skipped.
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self._locked():
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in entries:
+                if total <= limit:
+                    break
+                if self._in_use(entry):
+                    continue
+                self._remove(entry)
+                total -= size
+
+    def _remove(self, entry: str) -> None:
+        trash = os.path.join(self.root, f".trash-{uuid.uuid4().hex}")
+        try:
+            os.rename(entry, trash)
+        except FileNotFoundError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def clear(self) -> None:
+        self.evict(0)
+
+
+_default_cache = None
+
+
+def default_cache() -> GridCache:
+    """Return the process-wide cache under ``CACHE_DIR``."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = GridCache()
+    return _default_cache
+
+
+class SparseGrid:
+    """Cells of a MESH grid at or above ``threshold``, in COO form.
+
+    ``index`` holds the sorted row-major flat index of each stored cell and
+    ``values`` its MESH value. ``lats``, ``lons`` and ``shape`` describe the
+    full grid. Every other cell is below the threshold.
+    """
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray, shape: Tuple[int, int],
+                 index: np.ndarray, values: np.ndarray, threshold: float = HAIL_THRESHOLD):
+        self.lats = lats
+        self.lons = lons
+        self.shape = tuple(shape)
+        self.index = index
+        self.values = values
+        self.threshold = threshold
+
+    @classmethod
+    def from_row_blocks(cls, lats, lons, shape: Tuple[int, int], blocks,
+                        threshold: float = HAIL_THRESHOLD) -> "SparseGrid":
+        """Build from consecutive row blocks so the dense grid is never held at once."""
+        ncols = shape[1]
+        index, values = [], []
+        row = 0
+        for block in blocks:
+            block = np.asarray(block).reshape(-1, ncols)
+            flat = np.flatnonzero(block >= threshold)
+            index.append(flat + row * ncols)
+            values.append(block.reshape(-1)[flat].astype(np.float32))
+            row += block.shape[0]
+        if row != shape[0]:
+            raise ValueError(f"row blocks cover {row} rows, expected {shape[0]}")
+        index_dtype = np.int32 if shape[0] * ncols < 2 ** 31 else np.int64
+        return cls(lats, lons, shape,
+                   np.concatenate(index).astype(index_dtype, copy=False),
+                   np.concatenate(values), threshold)
+
+    @classmethod
+    def from_dense(cls, lats, lons, data: np.ndarray,
+                   threshold: float = HAIL_THRESHOLD) -> "SparseGrid":
+        shape = data.shape[-2:]
+        return cls.from_row_blocks(lats, lons, shape, [data], threshold)
+
+    @property
+    def nnz(self) -> int:
+        return int(self.index.size)
+
+    @property
+    def nbytes(self) -> int:
+        return self.index.nbytes + self.values.nbytes
+
+    def cells(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the row and column of every stored cell."""
+        return np.unravel_index(self.index, self.shape)
+
+    def lookup(self, rows: np.ndarray, cols: np.ndarray, fill: float = np.nan) -> np.ndarray:
+        """Return the values at ``rows``/``cols``, with ``fill`` for cells below threshold."""
+        flat = np.ravel_multi_index((np.asarray(rows), np.asarray(cols)), self.shape)
+        out = np.full(flat.shape, fill, dtype=np.float32)
+        if self.index.size:
+            pos = np.minimum(np.searchsorted(self.index, flat), self.index.size - 1)
+            found = self.index[pos] == flat
+            out[found] = self.values[pos[found]]
+        return out
+
+    def to_dense(self, fill: float = np.nan) -> np.ndarray:
+        data = np.full(self.shape, fill, dtype=np.float32)
+        data.reshape(-1)[self.index] = self.values
+        return data
+
+
+def as_dense(data, fill: float = np.nan) -> np.ndarray:
+    """Return ``data`` as a dense array, expanding a ``SparseGrid``."""
+    if isinstance(data, SparseGrid):
+        return data.to_dense(fill)
+    return data
+
+
+def _check_bbox(bbox: BBox) -> BBox:
+    south, west, north, east = (float(v) for v in bbox)
+    if not (south < north and west < east):
+        raise ValueError(f"bbox must be (south, west, north, east), got {tuple(bbox)}")
+    return south, west, north, east
+
+
+def _nonzero_slice(mask: np.ndarray) -> slice:
+    idx = np.flatnonzero(mask)
+    if not idx.size:
+        raise ValueError("bbox does not intersect the grid")
+    return slice(int(idx[0]), int(idx[-1]) + 1)
+
+
+def grid_window(lats: np.ndarray, lons: np.ndarray, bbox: BBox) -> Tuple[slice, slice]:
+    """Return the row and column slices of the grid covering ``bbox``."""
+    south, west, north, east = _check_bbox(bbox)
+    if np.nanmax(lons) > 180 and west < 0:
+        # GRIB2 grids use 0..360 longitudes
+        west += 360
+        east += 360
+    lat_in = (lats >= south) & (lats <= north)
+    lon_in = (lons >= west) & (lons <= east)
+    if lats.ndim == 1:
+        return _nonzero_slice(lat_in), _nonzero_slice(lon_in)
+    inside = lat_in & lon_in
+    return _nonzero_slice(inside.any(axis=1)), _nonzero_slice(inside.any(axis=0))
+
+
+def _subset_coords(lats, lons, rows: slice, cols: slice):
+    if lats.ndim == 1:
+        return lats[rows], lons[cols]
+    return lats[rows, cols], lons[rows, cols]
+
+
+def load_mesh(path: str, bbox: Optional[BBox] = None, variable: Optional[str] = None,
+              cache: Union[bool, GridCache] = False, sparse: bool = False,
+              threshold: float = HAIL_THRESHOLD,
+              engine: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return lat, lon, mesh arrays from a MRMS MESH file.
+
+    With ``bbox=(south, west, north, east)`` only the grid window covering
+    the box is read. ``variable`` overrides the product variable lookup.
+    Gzipped netCDF is decoded in memory. GRIB2 message indexes are kept in
+    the grid cache (``cache`` if it is a ``GridCache``, else the default
+    one) instead of beside the data. cfgrib can only open real files, so
+    gzipped GRIB2 is decompressed once into the cache too.
+
+    ``cache=True`` (or a ``GridCache``) serves repeated loads of the same
+    file contents from memory-mapped arrays on disk. ``sparse=True``
+    returns the mesh as a ``SparseGrid`` of the cells at or above
+    ``threshold``.
+
+    ``engine`` picks the GRIB2 decoder and defaults to ``GRIB_ENGINE``.
+    With "auto", a single message on a regular lat/lon grid is decoded by
+    ``decode_grib2`` straight from the (gunzipped) bytes, and anything
+    else, or a named ``variable``, goes through cfgrib.
+    """
+    engine = engine or GRIB_ENGINE
+    if engine not in GRIB_ENGINES:
+        raise ValueError(f"unknown GRIB engine {engine!r}, expected one of {GRIB_ENGINES}")
+    with span("load_mesh", file=os.path.basename(path)) as s:
+        if cache:
+            if cache is True:
+                cache = default_cache()
+            key = cache.key(path, variable, bbox)
+            arrays = cache.get(key)
+            s.set(cache="miss" if arrays is None else "hit")
+            if arrays is None:
+                arrays = _load(path, bbox, variable, False, threshold, cache, engine)
+                cache.put(key, *arrays)
+            if sparse:
+                lats, lons, data = arrays
+                return lats, lons, SparseGrid.from_dense(lats, lons, data, threshold)
+            return arrays
+        return _load(path, bbox, variable, sparse, threshold, engine=engine)
+
+
+def _load(path: str, bbox: Optional[BBox], variable: Optional[str], sparse: bool,
+          threshold: float, grib_cache: Optional[GridCache] = None, engine: str = "auto"):
+    memory = None
+    indexpath = None
     open_path = path
+    is_grib = path.endswith(".grib2") or path.endswith(".grib2.gz")
+    if is_grib and (engine == "eccodes" or (engine == "auto" and variable is None)):
+        try:
+            lats, lons, data = _read_grib(path, variable)
+        except ValueError:
+            if engine == "eccodes":
+                raise
+        else:
+            if bbox is not None:
+                rows, cols = grid_window(lats, lons, bbox)
+                lats, lons, data = lats[rows], lons[cols], data[rows, cols].copy()
+            if sparse:
+                data = SparseGrid.from_dense(lats, lons, data, threshold)
+            return lats, lons, data
+    if is_grib:
+        open_path, indexpath = (grib_cache or default_cache()).grib_entry(path)
+    elif path.endswith(".gz"):
+        open_path = path[:-3]
+        memory = _gunzip(path)
+
+    with _decode_lock, span("decode", engine="cfgrib" if is_grib else "netcdf") as s:
+        ds = _open_dataset(open_path, memory=memory, indexpath=indexpath)
+        try:
+            lats, lons, data = _read_dataset(ds, open_path, bbox, variable, sparse, threshold)
+        finally:
+            ds.close()
+        s.set(shape=data.shape)
+    return lats, lons, data
+
+
+def _read_grib(path: str, variable: Optional[str]):
     if path.endswith(".gz"):
-        tmp_path = path[:-3]
-        with gzip.open(path, "rb") as f_in, open(tmp_path, "wb") as f_out:
-            f_out.write(f_in.read())
-        open_path = tmp_path
+        message = _gunzip(path)
+    else:
+        with open(path, "rb") as f:
+            message = f.read()
+    with _decode_lock, span("decode", engine="eccodes", bytes=len(message)) as s:
+        lats, lons, data = decode_grib2(message, variable)
+        s.set(shape=data.shape)
+    return lats, lons, data
 
-    ds = _open_dataset(open_path)
 
-    var_candidates = ['MESH', 'MaxEstimatedHailSize', 'value']
+def _read_dataset(ds, open_path: str, bbox: Optional[BBox] = None,
+                  variable: Optional[str] = None, sparse: bool = False,
+                  threshold: float = HAIL_THRESHOLD) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    var_candidates = [variable] if variable else ['MESH', 'MaxEstimatedHailSize', 'value']
 
     if open_path.endswith('.grib2'):
         var_name = None
@@ -34,15 +601,22 @@ def load_mesh(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
                 var_name = name
                 break
         if var_name is None:
+            if variable:
+                raise KeyError(f"variable {variable!r} not found in {open_path}")
             var_name = list(ds.data_vars)[0]
-        data = ds[var_name].values
         lat_obj = ds['latitude'] if 'latitude' in ds else ds.coords.get('lat')
         lon_obj = ds['longitude'] if 'longitude' in ds else ds.coords.get('lon')
         lats = np.array(lat_obj.values)
         lons = np.array(lon_obj.values)
-        ds.close()
-        if tmp_path:
-            os.remove(tmp_path)
+        if bbox is None:
+            data = ds[var_name].values
+        else:
+            rows, cols = grid_window(lats, lons, bbox)
+            lats, lons = _subset_coords(lats, lons, rows, cols)
+            # positional indexing on the lazy backend array decodes only the window
+            data = ds[var_name][..., rows, cols].values
+        if sparse:
+            data = SparseGrid.from_dense(lats, lons, data, threshold)
         return lats, lons, data
 
     # netCDF path
@@ -52,12 +626,25 @@ def load_mesh(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
             var = ds.variables[name]
             break
     if var is None:
+        if variable:
+            raise KeyError(f"variable {variable!r} not found in {open_path}")
         var = next(iter(ds.variables.values()))
 
-    data = np.array(var[:])
     lats = np.array(ds.variables.get('Latitude', ds.variables.get('lat'))[:])
     lons = np.array(ds.variables.get('Longitude', ds.variables.get('lon'))[:])
-    ds.close()
-    if tmp_path:
-        os.remove(tmp_path)
-    return lats, lons, data
+    # unmasked reads already hold the raw fill values np.array() would give
+    var.set_auto_mask(False)
+    if bbox is None:
+        rows, cols = slice(0, var.shape[-2]), slice(None)
+    else:
+        rows, cols = grid_window(lats, lons, bbox)
+        lats, lons = _subset_coords(lats, lons, rows, cols)
+    if sparse:
+        # read in row blocks so the dense window is never materialised
+        starts = range(rows.start, rows.stop, SPARSE_BLOCK_ROWS)
+        blocks = (var[..., r:min(r + SPARSE_BLOCK_ROWS, rows.stop), cols] for r in starts)
+        shape = (rows.stop - rows.start, len(range(*cols.indices(var.shape[-1]))))
+        return lats, lons, SparseGrid.from_row_blocks(lats, lons, shape, blocks, threshold)
+    if bbox is None:
+        return lats, lons, np.asarray(var[:])
+    return lats, lons, np.asarray(var[..., rows, cols])
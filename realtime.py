@@ -1,40 +1,534 @@
 #!/usr/bin/env python3
 """Simple real-time downloader for new MRMS MESH files."""
 import argparse
+import asyncio
+import json
 import os
+import threading
 import time
-import boto3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import mesh_trace
+from mesh_trace import span
 
 BUCKET = 'noaa-mrms-pds'
 PREFIX = 'MESHMax/'
+STATE_FILE = '.watch_state.json'
 
 
-def watch(prefix: str, interval: int, out_dir: str) -> None:
-    s3 = boto3.client('s3')
-    seen = set()
-    os.makedirs(out_dir, exist_ok=True)
+def make_client():
+    """Return an anonymous S3 client for the public MRMS bucket."""
+    import boto3
+    from botocore import UNSIGNED
+    from botocore.config import Config
+
+    return boto3.client('s3', config=Config(signature_version=UNSIGNED))
+
+
+def list_keys(s3, prefix: str, start_after: Optional[str] = None,
+              bucket: str = BUCKET, page_size: int = 1000) -> Iterator[dict]:
+    """Yield every object under ``prefix`` sorting after ``start_after``.
+
+    Follows continuation tokens, so listings are not capped at one page.
+    """
+    kwargs = {'Bucket': bucket, 'Prefix': prefix, 'MaxKeys': page_size}
+    if start_after:
+        kwargs['StartAfter'] = start_after
     while True:
-        resp = s3.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
-        for obj in resp.get('Contents', []):
+        with span('s3_list', prefix=prefix) as s:
+            resp = s3.list_objects_v2(**kwargs)
+            s.set(objects=resp.get('KeyCount', len(resp.get('Contents', []))))
+        yield from resp.get('Contents', [])
+        if not resp.get('IsTruncated'):
+            return
+        kwargs['ContinuationToken'] = resp['NextContinuationToken']
+
+
+def list_dir(s3, prefix: str, bucket: str = BUCKET,
+             page_size: int = 1000) -> Tuple[List[str], List[dict]]:
+    """Return the sub-prefixes and the objects directly under ``prefix``.
+
+    Lists one level with ``Delimiter='/'`` and follows continuation tokens.
+    """
+    kwargs = {'Bucket': bucket, 'Prefix': prefix, 'Delimiter': '/', 'MaxKeys': page_size}
+    prefixes, objects = [], []
+    while True:
+        with span('s3_list', prefix=prefix) as s:
+            resp = s3.list_objects_v2(**kwargs)
+            s.set(objects=resp.get('KeyCount', len(resp.get('Contents', []))))
+        prefixes.extend(p['Prefix'] for p in resp.get('CommonPrefixes', []))
+        objects.extend(resp.get('Contents', []))
+        if not resp.get('IsTruncated'):
+            return prefixes, objects
+        kwargs['ContinuationToken'] = resp['NextContinuationToken']
+
+
+class ListingCache:
+    """Thread-safe cache of ``list_dir`` results that expire after ``ttl`` seconds."""
+
+    def __init__(self, s3, ttl: float = 60.0, bucket: str = BUCKET, clock=time.monotonic):
+        self.s3 = s3
+        self.ttl = ttl
+        self.bucket = bucket
+        self.clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def list(self, prefix: str, refresh: bool = False) -> Tuple[List[str], List[dict]]:
+        with self._lock:
+            entry = self._entries.get(prefix)
+        if entry and not refresh and self.clock() - entry[0] < self.ttl:
+            return entry[1]
+        listing = list_dir(self.s3, prefix, bucket=self.bucket)
+        with self._lock:
+            self._entries[prefix] = (self.clock(), listing)
+        return listing
+
+    def invalidate(self, prefix: Optional[str] = None) -> None:
+        """Forget ``prefix`` and everything below it, or every listing."""
+        with self._lock:
+            for key in [k for k in self._entries if prefix is None or k.startswith(prefix)]:
+                del self._entries[key]
+
+
+def hour_groups(objects: Sequence[dict]) -> Dict[str, List[dict]]:
+    """Group a day's objects by the ``HH`` of their valid time, in key order."""
+    from process_mesh import valid_time
+
+    groups = {}
+    for obj in sorted(objects, key=lambda o: o['Key']):
+        try:
+            hour = f'{valid_time(obj["Key"]):%H}'
+        except ValueError:
+            hour = ''
+        groups.setdefault(hour, []).append(obj)
+    return groups
+
+
+def date_prefixes(prefix: str, start: date, end: date) -> List[str]:
+    """Return the ``<prefix>YYYYMMDD/`` partitions from ``start`` to ``end``."""
+    days = (end - start).days
+    return [f'{prefix}{start + timedelta(d):%Y%m%d}/' for d in range(days + 1)]
+
+
+def load_state(out_dir: str) -> dict:
+    try:
+        with open(os.path.join(out_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(out_dir: str, state: dict) -> None:
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def download(s3, key: str, out_dir: str, retries: int = 3, backoff: float = 1.0,
+             bucket: str = BUCKET, progress: Optional[Callable[[str, int], None]] = None) -> str:
+    """Download ``key`` into ``out_dir``, retrying with exponential backoff.
+
+    The object is written to a ``.part`` file and renamed once complete, so
+    readers of ``out_dir`` never see a partial download. ``progress`` is
+    called with the key and the bytes received so far in this attempt.
+    """
+    local = os.path.join(out_dir, os.path.basename(key))
+    part = local + '.part'
+    for attempt in range(retries + 1):
+        try:
+            received = [0]
+
+            def callback(n):
+                received[0] += n
+                progress(key, received[0])
+            with span('s3_download', key=key, attempt=attempt) as s:
+                s3.download_file(bucket, key, part, Callback=callback if progress else None)
+                s.set(bytes=os.path.getsize(part))
+            os.replace(part, local)
+            return local
+        except Exception:
+            if os.path.exists(part):
+                os.remove(part)
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+    return local
+
+
+def download_all(s3, keys: Sequence[str], out_dir: str, jobs: int = 4, retries: int = 3,
+                 backoff: float = 1.0, bucket: str = BUCKET,
+                 progress: Optional[Callable[[str, int], None]] = None
+                 ) -> Tuple[List[str], Dict[str, Exception]]:
+    """Download ``keys`` with at most ``jobs`` transfers in flight.
+
+    Returns the local paths that completed and the error for each key that
+    still failed after retries. ``progress`` is passed to ``download`` and
+    is called from the transfer threads.
+    """
+    done, failed = [], {}
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        futures = {key: pool.submit(download, s3, key, out_dir, retries, backoff, bucket, progress)
+                   for key in keys}
+        for key, fut in futures.items():
+            try:
+                done.append(fut.result())
+                print(f'Downloaded {key}')
+            except Exception as exc:
+                failed[key] = exc
+                print(f'Failed to download {key}: {exc}')
+    return done, failed
+
+
+def new_keys(s3, prefix: str, state: dict, partitioned: bool = True,
+             today: Optional[date] = None, bucket: str = BUCKET) -> List[str]:
+    """Return the sorted ``.gz`` keys after the high-water mark in ``state``.
+
+    With ``partitioned`` only the ``YYYYMMDD/`` folders from the day of the
+    high-water mark (or ``state['since']``, or today) up to today are
+    listed, each starting after the mark.
+    """
+    high = state.get('last_key')
+    if partitioned:
+        today = today or datetime.now(timezone.utc).date()
+        start = today
+        if high and high.startswith(prefix):
+            start = datetime.strptime(high[len(prefix):len(prefix) + 8], '%Y%m%d').date()
+        elif state.get('since'):
+            start = datetime.strptime(state['since'], '%Y%m%d').date()
+        prefixes = date_prefixes(prefix, start, today)
+    else:
+        prefixes = [prefix]
+
+    keys = []
+    for part in prefixes:
+        for obj in list_keys(s3, part, start_after=high, bucket=bucket):
             key = obj['Key']
-            if not key.endswith('.gz'):
-                continue
-            if key in seen:
-                continue
-            seen.add(key)
-            local = os.path.join(out_dir, os.path.basename(key))
-            print(f'Downloading {key} to {local}')
-            s3.download_file(BUCKET, key, local)
+            if key.endswith('.gz'):
+                keys.append(key)
+    return sorted(keys)
+
+
+def poll(s3, prefix: str, out_dir: str, state: dict, jobs: int = 4, retries: int = 3,
+         backoff: float = 1.0, partitioned: bool = True, today: Optional[date] = None,
+         bucket: str = BUCKET) -> List[str]:
+    """Fetch new ``.gz`` files once and advance the high-water mark in ``state``.
+
+    The mark only advances past keys that downloaded, so failed ones are
+    retried on the next poll.
+    """
+    keys = new_keys(s3, prefix, state, partitioned, today, bucket)
+    # a restart after a lost state file should not refetch what is on disk
+    todo = [k for k in keys if not os.path.exists(os.path.join(out_dir, os.path.basename(k)))]
+    done, failed = download_all(s3, todo, out_dir, jobs, retries, backoff, bucket)
+
+    for key in keys:
+        if key in failed:
+            break
+        state['last_key'] = key
+    save_state(out_dir, state)
+    return done
+
+
+def watch(prefix: str, interval: int, out_dir: str, jobs: int = 4, retries: int = 3,
+          partitioned: bool = True, since: Optional[str] = None, once: bool = False,
+          history: Optional[str] = None, s3=None) -> None:
+    s3 = s3 or make_client()
+    os.makedirs(out_dir, exist_ok=True)
+    state = load_state(out_dir)
+    if since and 'last_key' not in state:
+        state['since'] = since
+    while True:
+        done = poll(s3, prefix, out_dir, state, jobs=jobs, retries=retries, partitioned=partitioned)
+        if history and done:
+            from mesh_utils import append_history
+
+            append_history(history, done)
+        if once:
+            return
         time.sleep(interval)
 
 
+class StageMetrics:
+    """Latency and queue-depth counters for one pipeline stage."""
+
+    def __init__(self, name: str, queue: Optional[asyncio.Queue] = None):
+        self.name = name
+        self.queue = queue
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.queue_max = 0
+
+    def record(self, seconds: float, ok: bool = True) -> None:
+        self.count += 1
+        self.errors += not ok
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def sample(self) -> None:
+        if self.queue is not None:
+            self.queue_max = max(self.queue_max, self.queue.qsize())
+
+    def snapshot(self) -> dict:
+        return {
+            'stage': self.name,
+            'count': self.count,
+            'errors': self.errors,
+            'mean_s': round(self.total / self.count, 4) if self.count else None,
+            'max_s': round(self.max, 4),
+            'queue_depth': self.queue.qsize() if self.queue is not None else None,
+            'queue_max': self.queue_max,
+        }
+
+
+class _Watermark:
+    """Advance ``state['last_key']`` over the contiguous run of finished keys.
+
+    A key is finished once it has been rendered or has failed at any stage.
+    Failed keys are kept in ``state['retry']`` and queued again on the next
+    listing, so a bad download or decode neither stalls the mark nor is lost
+    across restarts.
+    """
+
+    def __init__(self, out_dir: str, state: dict):
+        self.out_dir = out_dir
+        self.state = state
+        self.pending = deque()
+        self.waiting = set()
+        self.done = set()
+        self.active = set()
+
+    def add(self, key: str) -> bool:
+        """Track a newly listed key; False if it is already in flight as a retry."""
+        self.pending.append(key)
+        self.waiting.add(key)
+        if key in self.active:
+            return False
+        self.active.add(key)
+        return True
+
+    def retries(self) -> List[str]:
+        """Return the failed keys to queue again, now marked as in flight."""
+        keys = [k for k in self.state.get('retry', []) if k not in self.active]
+        self.active.update(keys)
+        return keys
+
+    def complete(self, key: str, ok: bool = True) -> None:
+        self.active.discard(key)
+        retry = self.state.get('retry', [])
+        changed = False
+        if ok and key in retry:
+            retry.remove(key)
+            changed = True
+        elif not ok and key not in retry:
+            self.state['retry'] = retry + [key]
+            changed = True
+        if key in self.waiting:
+            self.done.add(key)
+        while self.pending and self.pending[0] in self.done:
+            key = self.pending.popleft()
+            self.waiting.discard(key)
+            self.done.discard(key)
+            self.state['last_key'] = key
+            changed = True
+        if changed:
+            save_state(self.out_dir, self.state)
+
+
+_DONE = object()
+
+
+async def _run_stage(inq: asyncio.Queue, outq: Optional[asyncio.Queue], workers: int,
+                     fn, metrics: StageMetrics,
+                     failed: Optional[Callable[[object], None]] = None) -> None:
+    """Run ``workers`` consumers of ``inq`` until the end-of-stream marker.
+
+    Items that raise are reported, passed to ``failed`` and dropped.
+    """
+    async def worker():
+        while True:
+            item = await inq.get()
+            if item is _DONE:
+                await inq.put(_DONE)  # wake the sibling workers
+                return
+            metrics.sample()
+            start = time.perf_counter()
+            try:
+                result = await fn(item)
+            except Exception as exc:
+                metrics.record(time.perf_counter() - start, ok=False)
+                print(f'{metrics.name} failed for {item if isinstance(item, str) else item[0]}: {exc}')
+                if failed is not None:
+                    failed(item)
+                continue
+            metrics.record(time.perf_counter() - start)
+            if outq is not None:
+                await outq.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(max(workers, 1))))
+    if outq is not None:
+        await outq.put(_DONE)
+
+
+def render_outputs(lats, lons, data, base: str) -> str:
+    """Write ``<base>.tif`` and the ``<base>.png`` map overlay for one grid."""
+    from mesh_utils import save_geotiff, save_overlay
+
+    with span('render_outputs', file=os.path.basename(base)):
+        save_geotiff(lats, lons, data, base + '.tif')
+        save_overlay(lats, lons, data, base + '.png')
+    return base
+
+
+async def run_pipeline(s3, prefix: str, out_dir: str, render_dir: str, state: dict,
+                       interval: int = 60, once: bool = False, fetch_jobs: int = 4,
+                       decode_jobs: int = 2, render_jobs: int = 2, queue_size: int = 8,
+                       retries: int = 3, backoff: float = 1.0, partitioned: bool = True,
+                       metrics_interval: Optional[float] = None, history: Optional[str] = None,
+                       bucket: str = BUCKET) -> Dict[str, dict]:
+    """List, fetch, decode and render new files as concurrent stages.
+
+    Stages are joined by bounded queues, so a slow renderer holds back
+    decoding and fetching instead of piling grids up in memory. Fetches
+    and decodes run on a thread pool, renders on a process pool. Returns
+    the final per-stage metrics; ``metrics_interval`` also prints them
+    periodically as JSON lines. With ``history`` each decoded grid is also
+    appended to that history index. ``state['last_key']`` advances as files
+    are rendered; files that fail at any stage are retried on the next poll,
+    and on the next start from ``state['retry']``.
+    """
+    from process_mesh import load_mesh
+    from mesh_utils import append_grid
+
+    loop = asyncio.get_running_loop()
+    fetch_q = asyncio.Queue(queue_size)
+    decode_q = asyncio.Queue(queue_size)
+    # decoded grids are large, so keep only one per renderer waiting
+    render_q = asyncio.Queue(render_jobs)
+    metrics = {
+        'list': StageMetrics('list'),
+        'fetch': StageMetrics('fetch', fetch_q),
+        'decode': StageMetrics('decode', decode_q),
+        'render': StageMetrics('render', render_q),
+    }
+    mark = _Watermark(out_dir, state)
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(render_dir, exist_ok=True)
+
+    async def lister():
+        listed = dict(state)
+        while True:
+            start = time.perf_counter()
+            try:
+                keys = await asyncio.to_thread(new_keys, s3, prefix, listed, partitioned,
+                                               None, bucket)
+                metrics['list'].record(time.perf_counter() - start)
+            except Exception as exc:
+                metrics['list'].record(time.perf_counter() - start, ok=False)
+                print(f'list failed: {exc}')
+                keys = []
+            for key in mark.retries():
+                await fetch_q.put(key)
+            for key in keys:
+                listed['last_key'] = key
+                if mark.add(key):
+                    await fetch_q.put(key)
+            if once:
+                break
+            await asyncio.sleep(interval)
+        await fetch_q.put(_DONE)
+
+    async def fetch(key):
+        path = await loop.run_in_executor(threads, download, s3, key, out_dir, retries,
+                                          backoff, bucket)
+        return key, path
+
+    async def decode(item):
+        key, path = item
+        lats, lons, data = await loop.run_in_executor(threads, load_mesh, path)
+        if history:
+            # HDF5 writes are serialised on their own thread
+            await loop.run_in_executor(writer, append_grid, history, path, lats, lons, data)
+        return key, path, lats, lons, data
+
+    async def render(item):
+        key, path, lats, lons, data = item
+        stem = os.path.basename(path)[:-3].rsplit('.', 1)[0]
+        base = os.path.join(render_dir, stem)
+        await loop.run_in_executor(procs, render_outputs, lats, lons, data, base)
+        # the mark only passes a file once its outputs exist
+        mark.complete(key)
+        return base
+
+    def failed(item):
+        mark.complete(item if isinstance(item, str) else item[0], ok=False)
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(metrics_interval)
+            for m in metrics.values():
+                print(json.dumps(m.snapshot()))
+
+    with ThreadPoolExecutor(fetch_jobs + decode_jobs) as threads, \
+            ThreadPoolExecutor(1) as writer, ProcessPoolExecutor(render_jobs) as procs:
+        report = asyncio.create_task(reporter()) if metrics_interval else None
+        await asyncio.gather(
+            lister(),
+            _run_stage(fetch_q, decode_q, fetch_jobs, fetch, metrics['fetch'], failed),
+            _run_stage(decode_q, render_q, decode_jobs, decode, metrics['decode'], failed),
+            _run_stage(render_q, None, render_jobs, render, metrics['render'], failed),
+        )
+        if report:
+            report.cancel()
+    return {name: m.snapshot() for name, m in metrics.items()}
+
+
 def main() -> None:
     p = argparse.ArgumentParser(description="Watch MRMS bucket for new files")
     p.add_argument('--prefix', default=PREFIX)
     p.add_argument('--interval', type=int, default=300)
     p.add_argument('--out-dir', default='data')
+    p.add_argument('--jobs', type=int, default=4, help='Concurrent downloads')
+    p.add_argument('--retries', type=int, default=3)
+    p.add_argument('--since', help='First YYYYMMDD day to fetch when no state exists')
+    p.add_argument('--no-partition', dest='partitioned', action='store_false',
+                   help='Prefix is not split into YYYYMMDD/ folders')
+    p.add_argument('--once', action='store_true', help='Poll once and exit')
+    p.add_argument('--pipeline', action='store_true',
+                   help='Also decode each file and render a GeoTIFF and overlay PNG')
+    p.add_argument('--render-dir', default='output')
+    p.add_argument('--decode-jobs', type=int, default=2)
+    p.add_argument('--render-jobs', type=int, default=2)
+    p.add_argument('--metrics-interval', type=float, default=60,
+                   help='Seconds between pipeline metric reports')
+    p.add_argument('--history', help='Append new files to this history index')
+    p.add_argument('--profile', metavar='PATH',
+                   help='Write timing spans to PATH (Chrome trace, or JSON lines for .jsonl)')
     args = p.parse_args()
-    watch(args.prefix, args.interval, args.out_dir)
+    if args.profile:
+        mesh_trace.enable(args.profile, truncate=True)
+    if not args.pipeline:
+        watch(args.prefix, args.interval, args.out_dir, jobs=args.jobs, retries=args.retries,
+              partitioned=args.partitioned, since=args.since, once=args.once,
+              history=args.history)
+        return
+    state = load_state(args.out_dir) if os.path.isdir(args.out_dir) else {}
+    if args.since and 'last_key' not in state:
+        state['since'] = args.since
+    final = asyncio.run(run_pipeline(
+        make_client(), args.prefix, args.out_dir, args.render_dir, state,
+        interval=args.interval, once=args.once, fetch_jobs=args.jobs,
+        decode_jobs=args.decode_jobs, render_jobs=args.render_jobs, retries=args.retries,
+        partitioned=args.partitioned, metrics_interval=args.metrics_interval,
+        history=args.history))
+    for m in final.values():
+        print(json.dumps(m))
 
 
 if __name__ == '__main__':
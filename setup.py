@@ -16,7 +16,14 @@ setup(
         'rasterio',
         'python-docx',
         'cfgrib',
+        'contourpy',
     ],
+    extras_require={
+        # simplified swath polygons and FlatGeobuf output
+        'vector': ['shapely>=2.0', 'pyogrio'],
+        # Parquet point tables for mesh-cli query
+        'parquet': ['pyarrow'],
+    },
     entry_points={
         'console_scripts': [
             'mesh-app=run_app:main',
@@ -0,0 +1,126 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# the synthetic MRMS writers shared with the benchmarks
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'benchmarks'))
+
+
+class DirectoryS3:
+    """Directory-backed stand-in for the subset of the boto3 S3 client we use.
+
+    Objects live under ``root/<bucket>/<key>``. ``fail`` maps keys to the
+    number of downloads of that key that should raise before one succeeds.
+    """
+
+    def __init__(self, root):
+        self.root = str(root)
+        self.fail = {}
+        self.list_calls = 0
+
+    def put(self, bucket, key, body=b'data'):
+        path = os.path.join(self.root, bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+
+    def _keys(self, bucket):
+        base = os.path.join(self.root, bucket)
+        for dirpath, _, names in os.walk(base):
+            for name in names:
+                yield os.path.relpath(os.path.join(dirpath, name), base).replace(os.sep, '/')
+
+    def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, MaxKeys=1000,
+                        StartAfter=None, ContinuationToken=None):
+        self.list_calls += 1
+        after = ContinuationToken or StartAfter or ''
+        keys = sorted(k for k in self._keys(Bucket) if k.startswith(Prefix) and k > after)
+        contents, prefixes = [], []
+        for key in keys:
+            if Delimiter and Delimiter in key[len(Prefix):]:
+                common = key[:key.index(Delimiter, len(Prefix)) + 1]
+                if common not in prefixes:
+                    prefixes.append(common)
+                continue
+            contents.append(key)
+        entries = sorted([(k, 'key') for k in contents] + [(p, 'prefix') for p in prefixes])
+        page = entries[:MaxKeys]
+        resp = {
+            'Contents': [{'Key': k, 'Size': os.path.getsize(os.path.join(self.root, Bucket, k))}
+                         for k, kind in page if kind == 'key'],
+            'CommonPrefixes': [{'Prefix': p} for p, kind in page if kind == 'prefix'],
+            'IsTruncated': len(entries) > MaxKeys,
+        }
+        if resp['IsTruncated']:
+            last = page[-1][0]
+            # skip past every key inside a rolled-up prefix
+            resp['NextContinuationToken'] = last + '￿' if page[-1][1] == 'prefix' else last
+        return resp
+
+    def download_file(self, Bucket, Key, Filename, Callback=None):
+        if self.fail.get(Key):
+            self.fail[Key] -= 1
+            raise IOError(f'simulated failure for {Key}')
+        src = os.path.join(self.root, Bucket, Key)
+        shutil.copyfile(src, Filename)
+        if Callback:
+            Callback(os.path.getsize(src))
+
+
+@pytest.fixture(autouse=True)
+def _isolated_grid_cache(tmp_path_factory, monkeypatch):
+    """Keep the default grid cache (and GRIB2 indexes) out of the user's home."""
+    import process_mesh
+
+    monkeypatch.setattr(process_mesh, '_default_cache',
+                        process_mesh.GridCache(str(tmp_path_factory.mktemp('grid-cache'))))
+
+
+@pytest.fixture
+def write_nc():
+    """Return ``write(path, values, dims=('lat', 'lon'), lats=None, lons=None)``.
+
+    It writes small MESH netCDF files. Latitudes default to one-degree steps
+    down to 40N and longitudes to steps up from 100W; coordinates passed as
+    float64 arrays are stored as doubles.
+    """
+    def write(path, values, dims=('lat', 'lon'), lats=None, lons=None):
+        import netCDF4
+        import numpy as np
+
+        values = np.asarray(values, dtype='f4')
+        lats = np.asarray(40 + np.arange(values.shape[0])[::-1] if lats is None else lats)
+        lons = np.asarray(-100 + np.arange(values.shape[1]) if lons is None else lons)
+        with netCDF4.Dataset(path, 'w') as ds:
+            ds.createDimension(dims[0], values.shape[0])
+            ds.createDimension(dims[1], values.shape[1])
+            ds.createVariable('MESH', 'f4', dims)[:] = values
+            for name, dim, coord in (('lat', dims[:1], lats), ('lon', dims[1:], lons)):
+                dtype = 'f8' if coord.dtype == np.float64 else 'f4'
+                ds.createVariable(name, dtype, dim)[:] = coord
+    return write
+
+
+@pytest.fixture
+def write_grib2():
+    """Return ``write(path, values, north=42, west=-100, step=1)`` for small GRIB2 files.
+
+    Longitudes are stored 0..360 as in MRMS, and NaN values are missing in
+    the bitmap. The values keep the eccodes sample's packing.
+    """
+    def write(path, values, north=42, west=-100, step=1):
+        import numpy as np
+        from synthetic import write_grib2
+
+        values = np.asarray(values, dtype=np.float64)
+        lats = north - step * np.arange(values.shape[0])
+        lons = west + step * np.arange(values.shape[1])
+        write_grib2(str(path), lats, lons, values, step=step, decimals=None)
+    return write
+
+
+@pytest.fixture
+def fake_s3(tmp_path):
+    return DirectoryS3(tmp_path / 's3')
@@ -0,0 +1,88 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from process_mesh import GridCache, load_mesh
+
+
+def test_cache_hit_returns_memmap(tmp_path, write_nc):
+    src = tmp_path / 'a.nc'
+    write_nc(src, [[1, 2], [3, 4]], dims=('y', 'x'))
+    cache = GridCache(str(tmp_path / 'cache'))
+    first = load_mesh(str(src), cache=cache)
+    second = load_mesh(str(src), cache=cache)
+    assert isinstance(second[2], np.memmap)
+    for a, b in zip(first, second):
+        np.testing.assert_array_equal(a, b)
+    # the key follows file contents and the requested window
+    assert cache.key(str(src)) != cache.key(str(src), bbox=(0, 0, 1, 1))
+    write_nc(src, [[5, 6], [7, 8]], dims=('y', 'x'))
+    np.testing.assert_array_equal(load_mesh(str(src), cache=cache)[2], [[5, 6], [7, 8]])
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = GridCache(str(tmp_path / 'cache'), max_bytes=10 ** 9)
+    grid = np.zeros((10, 10), dtype='f4')
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, np.arange(10), np.arange(10), grid)
+        os.utime(os.path.join(cache.root, key), (i, i))
+    assert cache.get('a') is not None  # refreshes 'a'
+    entry_size = cache.size() // 3
+    cache.evict(2 * entry_size)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+
+def _put(args):
+    root, key = args
+    grid = np.full((50, 50), 3, dtype='f4')
+    GridCache(root).put(key, np.arange(50), np.arange(50), grid)
+    return float(GridCache(root).get(key)[2].sum())
+
+
+def test_cache_concurrent_put(tmp_path):
+    root = str(tmp_path / 'cache')
+    with ProcessPoolExecutor(4) as pool:
+        results = list(pool.map(_put, [(root, 'same')] * 8))
+    assert results == [3 * 2500.0] * 8
+    assert sorted(os.listdir(root)) == ['.lock', 'same']
+
+
+def test_grib_index_lives_in_cache_and_is_reused(tmp_path, monkeypatch, write_grib2):
+    import gzip
+    from cfgrib import messages
+
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    raw = data_dir / 'MESH_20240501-000000.grib2'
+    write_grib2(raw, np.arange(6).reshape(2, 3), north=41)
+    gz = data_dir / 'MESH_20240501-000000.grib2.gz'
+    gz.write_bytes(gzip.compress(raw.read_bytes()))
+    cache = GridCache(str(tmp_path / 'cache'))
+    monkeypatch.setattr('process_mesh._default_cache', cache)
+
+    scans = []
+    real = messages.FileIndex.from_fieldset.__func__
+    monkeypatch.setattr(messages.FileIndex, 'from_fieldset',
+                        classmethod(lambda cls, *a, **k: scans.append(1) or real(cls, *a, **k)))
+    os.chmod(data_dir, 0o555)
+    try:
+        for path in (raw, gz, raw, gz):
+            _, _, data = load_mesh(str(path), engine='cfgrib')
+            np.testing.assert_array_equal(data, [[0, 1, 2], [3, 4, 5]])
+    finally:
+        os.chmod(data_dir, 0o755)
+    # one message scan per file identity; later opens read the stored index
+    assert len(scans) == 2
+    assert sorted(os.listdir(data_dir)) == [raw.name, gz.name]
+    entries = [e for e in os.listdir(cache.root) if e.startswith('grib-')]
+    assert len(entries) == 2
+    assert all(any(f.endswith('.idx') for f in os.listdir(os.path.join(cache.root, e)))
+               for e in entries)
+
+    cache.clear()
+    assert not [e for e in os.listdir(cache.root) if not e.startswith('.')]
@@ -0,0 +1,28 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from mesh_cli import main
+
+
+def test_batch_isolates_failures(tmp_path, write_nc):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    for name in ('a.nc', 'b.nc'):
+        write_nc(data_dir / name, np.arange(20).reshape(4, 5))
+    (data_dir / 'broken.nc').write_bytes(b'not netcdf')
+    out_dir = tmp_path / 'out'
+    report = tmp_path / 'report.json'
+
+    with pytest.raises(SystemExit) as exc:
+        main(['--no-cache', 'batch', str(data_dir / '*.nc'), '--out-dir', str(out_dir),
+              '--outputs', 'png,geotiff', '--jobs', '2', '--report', str(report)])
+    assert exc.value.code == 1
+    assert sorted(os.listdir(out_dir)) == ['a.png', 'a.tif', 'b.png', 'b.tif']
+    files = {os.path.basename(f['path']): f for f in json.loads(report.read_text())['files']}
+    assert files['a.nc']['error'] is None
+    assert files['broken.nc']['error']
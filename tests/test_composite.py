@@ -0,0 +1,60 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from mesh_cli import main
+from mesh_utils import composite
+
+
+def _files(tmp_path, write_nc):
+    grids = [
+        [[0, 5, 0], [30, 0, 0]],
+        [[0, 40, 1], [10, 0, 0]],
+        [[0, 0, 25], [0, 0, 0]],
+    ]
+    paths = []
+    for hour, grid in zip((10, 11, 12), grids):
+        path = tmp_path / f'MESH_20240501-{hour}0000.nc'
+        write_nc(path, grid)
+        paths.append(str(path))
+    return paths
+
+
+def test_composite_running_grids(tmp_path, write_nc):
+    paths = _files(tmp_path, write_nc)
+    serial = composite(paths, threshold=20, jobs=1)
+    parallel = composite(reversed(paths), threshold=20, jobs=2)
+    for comp in (serial, parallel):
+        assert comp.files == 3
+        np.testing.assert_array_equal(comp.max, [[np.nan, 40, 25], [30, np.nan, np.nan]])
+        np.testing.assert_array_equal(comp.count, [[0, 1, 1], [1, 0, 0]])
+        hour = lambda h: int(datetime(2024, 5, 1, h, tzinfo=timezone.utc).timestamp())
+        np.testing.assert_array_equal(comp.first_time,
+                                      [[-1, hour(11), hour(12)], [hour(10), -1, -1]])
+
+    end = datetime(2024, 5, 1, 11, tzinfo=timezone.utc)
+    assert composite(paths, end=end, jobs=1).files == 2
+
+
+def test_composite_cli(tmp_path, write_nc):
+    paths = _files(tmp_path, write_nc)
+    npz = tmp_path / 'swath.npz'
+    main(['--no-cache', 'composite', *paths, '--jobs', '1', '--start', '20240501-110000',
+          '--geotiff', str(tmp_path / 'swath.tif'), '--npz', str(npz)])
+    assert (tmp_path / 'swath.tif').exists()
+    assert np.load(npz)['count'].sum() == 3
+
+
+def test_composite_count_does_not_wrap():
+    from mesh_utils.composite import Composite
+
+    lats, lons = np.array([41.0, 40.0]), np.array([-100.0, -99.0])
+    grid = np.array([[30, 0], [0, 0]], dtype='f4')
+    comp = Composite(threshold=20)
+    comp.add(lats, lons, grid, datetime(2024, 5, 1, tzinfo=timezone.utc))
+    comp.count[0, 0] = 2 ** 16 - 1   # a season of 2-minute files
+    comp.add(lats, lons, grid, datetime(2024, 5, 2, tzinfo=timezone.utc))
+    assert comp.count[0, 0] == 2 ** 16
@@ -0,0 +1,105 @@
+import csv
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from mesh_cli import main
+from mesh_utils import Geocoder, GeocodeCache, OfflineBackend
+from mesh_utils.geocode import RateLimiter, normalise_address
+
+
+class CountingBackend(OfflineBackend):
+    def __init__(self, table, fail=()):
+        super().__init__(table)
+        self.calls = []
+        self.fail = set(fail)
+
+    def geocode(self, address):
+        self.calls.append(address)
+        if address in self.fail:
+            raise IOError('provider down')
+        return super().geocode(address)
+
+
+def test_normalise_address():
+    assert normalise_address('123 N. Main St.,  Denver CO') == '123 north main street denver co'
+    assert normalise_address('123 north MAIN street Denver, CO') == '123 north main street denver co'
+
+
+def test_geocoder_caches_hits_and_misses(tmp_path):
+    table = {'1 Main St, Denver CO': (39.7, -105.0)}
+    backend = CountingBackend(table)
+    geocoder = Geocoder(backend, GeocodeCache(str(tmp_path / 'geo.sqlite')))
+    assert geocoder.geocode('1 main street denver co') == (39.7, -105.0)
+    assert geocoder.geocode('nowhere') is None
+    assert geocoder.geocode('1 MAIN ST., Denver, CO') == (39.7, -105.0)
+    assert geocoder.geocode('Nowhere') is None
+    assert len(backend.calls) == 2
+
+    # a new process resumes from the persistent cache
+    backend = CountingBackend(table)
+    geocoder = Geocoder(backend, GeocodeCache(str(tmp_path / 'geo.sqlite')))
+    assert geocoder.geocode_batch(['1 Main St Denver CO', 'nowhere']) == [(39.7, -105.0), None]
+    assert backend.calls == []
+
+
+def test_batch_resumes_after_failure(tmp_path):
+    table = {f'{i} Main St': (float(i), 0.0) for i in range(6)}
+    cache = GeocodeCache(str(tmp_path / 'geo.sqlite'))
+    backend = CountingBackend(table, fail={'3 Main St'})
+    with pytest.raises(IOError):
+        Geocoder(backend, cache).geocode_batch(table, jobs=3)
+    backend = CountingBackend(table)
+    assert Geocoder(backend, cache).geocode_batch(table, jobs=3)[3] == (3.0, 0.0)
+    assert backend.calls == ['3 Main St']
+
+
+def test_interrupted_batch_stops_promptly_and_resumes(tmp_path):
+    import signal
+    import threading
+
+    main_thread = threading.main_thread().ident
+
+    class SlowBackend(CountingBackend):
+        def geocode(self, address):
+            time.sleep(0.02)
+            if len(self.calls) == 4:
+                signal.pthread_kill(main_thread, signal.SIGINT)   # Ctrl-C
+            return super().geocode(address)
+
+    table = {f'{i} Main St': (float(i), 0.0) for i in range(40)}
+    cache = GeocodeCache(str(tmp_path / 'geo.sqlite'))
+    backend = SlowBackend(table)
+    with pytest.raises(KeyboardInterrupt):
+        Geocoder(backend, cache).geocode_batch(table, jobs=2)
+    # only the lookups already running finish; nothing carries on afterwards
+    done = set(backend.calls)
+    time.sleep(0.3)
+    assert len(backend.calls) == len(done) <= 8
+
+    backend = CountingBackend(table)
+    results = Geocoder(backend, cache).geocode_batch(table, jobs=2)
+    assert results == list(table.values())
+    assert set(backend.calls) == set(table) - done
+
+
+def test_rate_limiter_spaces_threads():
+    limiter = RateLimiter(0.05)
+    start = time.monotonic()
+    for _ in range(4):
+        limiter.wait()
+    assert time.monotonic() - start >= 0.15
+
+
+def test_geocode_cli_offline(tmp_path, monkeypatch):
+    monkeypatch.setattr('mesh_utils.geocode.CACHE_DIR', str(tmp_path / 'cache'))
+    (tmp_path / 'table.csv').write_text('address,lat,lon\n1 Main St,39.7,-105\n')
+    (tmp_path / 'in.csv').write_text('id,address\na,1 main street\nb,elsewhere\n')
+    main(['geocode', str(tmp_path / 'in.csv'), str(tmp_path / 'out.csv'),
+          '--offline', str(tmp_path / 'table.csv')])
+    rows = list(csv.DictReader(open(tmp_path / 'out.csv')))
+    assert (rows[0]['lat'], rows[0]['lon']) == ('39.7', '-105.0')
+    assert rows[1]['lat'] == ''
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import numpy as np
+import rasterio
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from mesh_utils import save_geotiff
+from process_mesh import SparseGrid
+
+
+def _grid():
+    lats = np.linspace(45, 35, 700)
+    lons = np.linspace(-105, -95, 900)
+    data = np.zeros((700, 900), dtype='f8')
+    data[600:690, 100:400] = np.linspace(2, 90, 300)
+    data[10, 10] = 1.5   # below the hail threshold
+    return lats, lons, data
+
+
+def test_save_geotiff_writes_tiled_cog_with_overviews(tmp_path):
+    lats, lons, data = _grid()
+    path = tmp_path / 'mesh.tif'
+    save_geotiff(lats, lons, data, str(path), compress='zstd')
+    with rasterio.open(path) as src:
+        assert src.tags(ns='IMAGE_STRUCTURE')['LAYOUT'] == 'COG'
+        assert src.dtypes[0] == 'float32' and src.compression.name == 'zstd'
+        assert src.block_shapes[0] == (512, 512)
+        assert src.overviews(1)
+        band = src.read(1, masked=True)
+    assert np.isnan(src.nodata)
+    assert band.count() == 90 * 300
+    np.testing.assert_allclose(band[600, 100:400], data[600, 100:400], rtol=1e-6)
+    assert os.listdir(tmp_path) == ['mesh.tif']
+
+
+def test_save_geotiff_quantises_with_scale(tmp_path):
+    lats, lons, data = _grid()
+    path = tmp_path / 'mesh.tif'
+    save_geotiff(lats, lons, SparseGrid.from_dense(lats, lons, data), str(path), dtype='uint16')
+    with rasterio.open(path) as src:
+        assert src.dtypes[0] == 'uint16' and src.nodata == 0
+        band = src.read(1, masked=True) * src.scales[0] + src.offsets[0]
+    assert band.count() == 90 * 300
+    np.testing.assert_allclose(band[650, 100:400], data[650, 100:400], atol=0.005)
+
+
+def test_save_geotiff_leaves_read_only_input_untouched(tmp_path):
+    lats, lons, data = _grid()
+    np.save(tmp_path / 'grid.npy', data.astype('f4'))
+    cached = np.load(tmp_path / 'grid.npy', mmap_mode='r')   # as the grid cache returns it
+    save_geotiff(lats, lons, cached, str(tmp_path / 'mesh.tif'))
+    np.testing.assert_array_equal(cached, data.astype('f4'))
+    with rasterio.open(tmp_path / 'mesh.tif') as src:
+        assert src.read(1, masked=True).count() == 90 * 300
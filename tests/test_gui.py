@@ -0,0 +1,52 @@
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+pytest.importorskip('tkinter')
+from mesh_gui import Cancelled, build_tiles, prepare_file
+from process_mesh import GridCache
+
+
+def test_prepare_file_renders_off_the_tk_thread(tmp_path, monkeypatch, write_nc):
+    monkeypatch.setattr('process_mesh._default_cache', GridCache(str(tmp_path / 'cache')))
+    path = str(tmp_path / 'MESH_20240501-000000.nc')
+    data = np.zeros((3, 4), dtype='f4')
+    data[1, 2] = 30
+    write_nc(path, data)
+    (lats, lons, grid), lod, (key, rgba, extent) = prepare_file(path, threading.Event())
+    assert rgba.shape == (3, 4, 4) and rgba[1, 2, 3] == 255 and rgba[..., 3].sum() == 255
+    assert extent == (-100.5, -96.5, 39.5, 42.5) and (lod.vmin, lod.vmax) == (30, 30)
+
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(Cancelled):
+        prepare_file(path, cancel)
+
+
+def test_build_tiles_stops_between_zoom_levels(tmp_path, monkeypatch, write_nc):
+    from mesh_utils import tiles
+
+    monkeypatch.setattr(tiles, 'CACHE_DIR', str(tmp_path / 'cache'))
+    path = str(tmp_path / 'MESH_20240501-000000.nc')
+    write_nc(path, np.full((3, 4), 30))
+    cancel = threading.Event()
+    real = tiles.occupied_tiles
+
+    def cancel_during(*args):
+        cancel.set()
+        return real(*args)
+
+    monkeypatch.setattr(tiles, 'occupied_tiles', cancel_during)
+    with pytest.raises(Cancelled):
+        build_tiles(path, cancel)
+    root = tiles.tile_root(path)
+    assert [n for n in os.listdir(root) if not n.startswith('.')] == [str(tiles.MIN_ZOOM)]
+
+    monkeypatch.setattr(tiles, 'occupied_tiles', real)
+    assert build_tiles(path, threading.Event()) == root
+    assert len([n for n in os.listdir(root) if not n.startswith('.')]) == \
+        tiles.MAX_ZOOM - tiles.MIN_ZOOM + 1
@@ -0,0 +1,100 @@
+import os
+import sys
+
+import h5py
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from mesh_utils import append_history, point_history
+from mesh_utils import history as history_mod
+
+
+def _day(tmp_path, write_nc, day, cells):
+    data = np.zeros((100, 150), dtype='f4')
+    for (r, c), v in cells.items():
+        data[r, c] = v
+    path = tmp_path / f'MESH_202405{day:02d}-000000.nc'
+    write_nc(path, data, lats=np.round(41 - 0.01 * np.arange(100), 4),
+             lons=np.round(-100 + 0.01 * np.arange(150), 4))
+    return str(path)
+
+
+def test_history_index_point_and_radius(tmp_path, monkeypatch, write_nc):
+    monkeypatch.setattr(history_mod, 'TILE', 16)
+    index = str(tmp_path / 'history.h5')
+    a = _day(tmp_path, write_nc, 1, {(50, 70): 30, (50, 71): 1})
+    b = _day(tmp_path, write_nc, 2, {(50, 72): 12})
+    assert append_history(index, [b, a]) == 2
+    assert append_history(index, [a]) == 0
+
+    lat, lon = 41 - 0.5, -100 + 0.7
+    assert [(t.day, v) for t, v in point_history(index, lat, lon)] == [(1, 30.0)]
+    # the neighbouring hit crosses into another tile
+    assert [(t.day, v) for t, v in point_history(index, lat, lon, radius_km=2)] == [(1, 30.0), (2, 12.0)]
+    assert [t.day for t, _ in point_history(index, lat, lon, radius_km=2, min_value=25)] == [1]
+
+    c = _day(tmp_path, write_nc, 3, {(50, 70): 40})
+    assert append_history(index, [a, b, c]) == 1
+    assert [(t.day, v) for t, v in point_history(index, lat, lon)] == [(1, 30.0), (3, 40.0)]
+    with h5py.File(index, 'r') as h5:
+        # below-threshold cells are never stored
+        assert sum(seg['time'].shape[0] for t in h5['tiles'].values()
+                   for seg in t.values()) == 3
+
+
+def test_history_recovers_interrupted_append(tmp_path, monkeypatch, write_nc):
+    monkeypatch.setattr(history_mod, 'TILE', 16)
+    index = str(tmp_path / 'history.h5')
+    a = _day(tmp_path, write_nc, 1, {(10, 10): 30})
+    append_history(index, [a])
+    # another product valid at the same time, touching a's tile and a new one
+    b = str(tmp_path / 'MESHMax_20240501-000000.nc')
+    os.rename(_day(tmp_path, write_nc, 2, {(10, 10): 20, (40, 40): 50}), b)
+
+    # crash after b's first tile merged with a's segment, before the commit
+    real = history_mod._add_segment
+    calls = []
+
+    def crash(*args):
+        calls.append(real(*args))
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+    monkeypatch.setattr(history_mod, '_add_segment', crash)
+    with pytest.raises(KeyboardInterrupt):
+        append_history(index, [b])
+    monkeypatch.setattr(history_mod, '_add_segment', real)
+
+    # a's records survive although b has the same valid time
+    assert [(t.day, v) for t, v in point_history(index, 40.9, -99.9)] == [(1, 30.0)]
+    assert append_history(index, [a, b]) == 1
+    assert [(t.day, v) for t, v in point_history(index, 40.9, -99.9)] == [(1, 30.0)]
+    assert [(t.day, v) for t, v in point_history(index, 40.6, -99.6)] == [(1, 50.0)]
+    with h5py.File(index, 'r') as h5:
+        assert sum(seg['time'].shape[0] for t in h5['tiles'].values()
+                   for seg in t.values()) == 3
+
+
+def test_history_segments_stay_few_and_sorted_by_cell(tmp_path, monkeypatch, write_nc):
+    monkeypatch.setattr(history_mod, 'TILE', 16)
+    index = str(tmp_path / 'history.h5')
+    rng = np.random.default_rng(0)
+    truth = {}
+    for day in range(1, 29):
+        cells = {(50 + int(dr), 70 + int(dc)): float(rng.integers(3, 80))
+                 for dr, dc in rng.integers(-3, 4, size=(6, 2))}
+        path = _day(tmp_path, write_nc, day, cells)
+        assert append_history(index, [path]) == 1
+        for cell, v in cells.items():
+            truth.setdefault(cell, []).append((day, v))
+
+    with h5py.File(index, 'r') as h5:
+        for tile in h5['tiles'].values():
+            # at most one segment per halving of the tile's records
+            assert len(tile) == len(tile.attrs['segments']) <= 6
+            for seg in tile.values():
+                cell, start = seg['cell'][:], seg['start'][:]
+                assert (np.diff(cell) > 0).all() and start[-1] == seg['time'].shape[0]
+    for (r, c), hits in truth.items():
+        lat, lon = 41 - 0.01 * r, -100 + 0.01 * c
+        assert [(t.day, v) for t, v in point_history(index, lat, lon)] == hits
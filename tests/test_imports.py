@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# backends that only the commands decoding or rendering a file should load
+HEAVY = ('matplotlib', 'xarray', 'netCDF4', 'rasterio', 'docx', 'boto3', 'h5py', 'pandas',
+         'cfgrib', 'eccodes')
+
+
+def _loaded_after(code):
+    script = (f'import sys\n{code}\n'
+              f'print(",".join(m for m in {HEAVY!r} if m in sys.modules))')
+    out = subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True,
+                         capture_output=True, text=True).stdout
+    return [m for m in out.strip().split(',') if m]
+
+
+def test_cli_help_imports_no_backends():
+    code = ('import contextlib, io, mesh_cli, realtime\n'
+            'with contextlib.redirect_stdout(io.StringIO()), contextlib.suppress(SystemExit):\n'
+            '    mesh_cli.main(["--help"])')
+    assert _loaded_after(code) == []
+
+
+def test_mesh_utils_loads_submodules_on_first_use():
+    code = 'import mesh_utils\nfrom mesh_utils import make_tiles, composite'
+    assert _loaded_after(code) == []
+    assert 'matplotlib' in _loaded_after('from mesh_utils import save_overlay')
+
+
+def test_lazy_exports_resolve():
+    import mesh_utils
+    from mesh_utils.composite import composite
+
+    assert mesh_utils.composite is composite
+    assert set(mesh_utils.__all__) <= set(dir(mesh_utils))
+    for name in mesh_utils.__all__:
+        assert getattr(mesh_utils, name).__name__ == name
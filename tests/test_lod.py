@@ -0,0 +1,36 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from mesh_utils import LevelOfDetail
+
+
+def _lod():
+    lats = np.round(50 - 0.01 * np.arange(2000), 4)
+    lons = np.round(-110 + 0.01 * np.arange(3000), 4)
+    data = np.zeros((2000, 3000), dtype='f4')
+    data[1000, 1500] = 40   # 40N, 95W: a single hail cell
+    data[10, 10] = 5
+    return LevelOfDetail(lats, lons, data, min_size=256)
+
+
+def test_pyramid_keeps_isolated_hail():
+    lod = _lod()
+    assert [lvl[2].shape for lvl in lod.levels] == [(2000, 3000), (1000, 1500), (500, 750),
+                                                    (250, 375), (125, 188)]
+    assert all(np.nanmax(lvl[2]) == 40 for lvl in lod.levels)
+    assert (lod.vmin, lod.vmax) == (5, 40)
+
+
+def test_view_picks_level_by_zoom_and_windows_it():
+    lod = _lod()
+    key, rgba, extent = lod.view((-110, -80), (30, 50), 800, 600)
+    assert key[0] == 1 and rgba.shape[1] <= 1502
+    assert rgba[..., 3].sum() == 2 * 255  # both cells survive pooling
+
+    key, rgba, extent = lod.view((-95.5, -94.5), (39.5, 40.5), 800, 600)
+    assert key[0] == 0 and rgba.shape[:2] == (103, 103)
+    assert extent[0] <= -95.5 and extent[1] >= -94.5
+    assert lod.view((0, 10), (0, 10), 800, 600) is None
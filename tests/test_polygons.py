@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from mesh_cli import main
+from mesh_utils import file_polygons, swath_polygons
+from mesh_utils.polygons import _ring_area
+
+
+def _grid():
+    lats = np.linspace(45, 35, 101)
+    lons = np.linspace(-105, -95, 101)
+    data = np.zeros((101, 101), dtype='f4')
+    data[30:70, 30:70] = 30    # 1" to 1.5"
+    data[45:55, 45:55] = 45    # 1.5" to 2"
+    data[35, 35] = np.nan
+    return lats, lons, data
+
+
+def test_bands_do_not_overlap_and_follow_rfc7946():
+    lats, lons, data = _grid()
+    features = swath_polygons(lats, lons, data, levels=[25.4, 38.1, 50.8])
+    assert [f['properties']['min_mm'] for f in features] == [25.4, 38.1]
+    assert features[1]['properties']['max_mm'] == 50.8
+    (outer, *holes), = features[0]['geometry']['coordinates']
+    assert len(holes) == 2  # the inner band and the NaN cell
+    assert _ring_area(np.array(outer)) > 0
+    assert all(_ring_area(np.array(h)) < 0 for h in holes)
+    assert outer[0] == outer[-1]
+
+
+def test_file_polygons_are_cached(tmp_path, monkeypatch, write_nc):
+    monkeypatch.setattr('mesh_utils.polygons.CACHE_DIR', str(tmp_path / 'cache'))
+    lats, lons, data = _grid()
+    src = str(tmp_path / 'MESH_20240501-000000.nc')
+    write_nc(src, data, lats=lats.astype('f4'), lons=lons.astype('f4'))
+    first = file_polygons(src, bbox=(38, -103, 42, -99), cache=True)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('decoded a cached file')
+
+    monkeypatch.setattr('mesh_utils.polygons.load_mesh', fail)
+    assert file_polygons(src, bbox=(38, -103, 42, -99), cache=True) == first
+
+    # polygon files are evicted under the grid cache's size limit
+    from process_mesh import GridCache
+
+    polygons = str(tmp_path / 'cache' / 'polygons')
+    (entry,) = [n for n in os.listdir(polygons) if not n.startswith('.')]
+    monkeypatch.undo()
+    monkeypatch.setattr('mesh_utils.polygons.CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr('process_mesh.CACHE_MAX_BYTES', GridCache(polygons).size())
+    os.utime(os.path.join(polygons, entry), (0, 0))
+    file_polygons(src, bbox=(38, -102, 42, -99), cache=True)
+    assert entry not in os.listdir(polygons) and GridCache(polygons).size() > 0
+
+    out = tmp_path / 'swath.geojson'
+    monkeypatch.undo()
+    main(['--no-cache', 'polygons', src, str(out), '--levels', '1', '1.5'])
+    assert len(json.loads(out.read_text())['features']) == 2
+
+
+def test_flatgeobuf_roundtrip(tmp_path):
+    pyogrio = pytest.importorskip('pyogrio')
+    pytest.importorskip('shapely')
+    from mesh_utils import write_polygons
+
+    lats, lons, data = _grid()
+    features = swath_polygons(lats, lons, data, levels=[25.4, 38.1], simplify=0.05)
+    path = str(tmp_path / 'swath.fgb')
+    write_polygons(features, path)
+    meta, _, geometry, fields = pyogrio.raw.read(path)
+    assert meta['geometry_type'] == 'MultiPolygon' and len(geometry) == 2
+    np.testing.assert_array_equal(fields[0], [25.4, 38.1])
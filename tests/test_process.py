@@ -1,25 +1,16 @@
 import os
 import sys
 import numpy as np
+import pytest
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from process_mesh import load_mesh
+from process_mesh import decode_grib2, load_mesh
 
 
-def test_load_mesh(tmp_path):
+def test_load_mesh(tmp_path, write_nc):
     # create a small dummy netCDF file
-    import netCDF4
-
     path = tmp_path / 'test.nc'
-    with netCDF4.Dataset(path, 'w') as ds:
-        ds.createDimension('x', 2)
-        ds.createDimension('y', 2)
-        v = ds.createVariable('MESH', 'f4', ('y', 'x'))
-        lat = ds.createVariable('lat', 'f4', ('y',))
-        lon = ds.createVariable('lon', 'f4', ('x',))
-        v[:] = np.array([[1, 2], [3, 4]])
-        lat[:] = [0, 1]
-        lon[:] = [0, 1]
+    write_nc(path, [[1, 2], [3, 4]], dims=('y', 'x'), lats=[0, 1], lons=[0, 1])
     lats, lons, data = load_mesh(str(path))
     assert lats.shape == (2,)
     assert lons.shape == (2,)
@@ -48,3 +39,90 @@ def test_load_mesh_grib2(tmp_path):
     assert lats.size == 1
     assert lons.size == 1
     assert data.shape == (1, 1)
+
+
+def test_load_mesh_gz_in_memory(tmp_path, write_nc):
+    import gzip
+    import shutil
+
+    src = tmp_path / 'test.nc'
+    write_nc(src, [[1, 2], [3, 4]], dims=('y', 'x'))
+    gz_path = tmp_path / 'test.nc.gz'
+    with open(src, 'rb') as f_in, gzip.open(gz_path, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(src)
+
+    os.chmod(tmp_path, 0o555)
+    try:
+        lats, lons, data = load_mesh(str(gz_path))
+        # a second load reuses the decompression buffer
+        _, _, again = load_mesh(str(gz_path))
+    finally:
+        os.chmod(tmp_path, 0o755)
+    assert sorted(os.listdir(tmp_path)) == ['test.nc.gz']
+    np.testing.assert_array_equal(data, [[1, 2], [3, 4]])
+    np.testing.assert_array_equal(again, data)
+
+
+def test_load_mesh_bbox(tmp_path, write_nc):
+    path = tmp_path / 'grid.nc'
+    # MRMS stores latitude north to south, 44N to 40N here
+    write_nc(path, np.arange(30).reshape(5, 6))
+    lats, lons, data = load_mesh(str(path), bbox=(41, -98.5, 42.5, -96.5))
+    np.testing.assert_array_equal(lats, [42, 41])
+    np.testing.assert_array_equal(lons, [-98, -97])
+    np.testing.assert_array_equal(data, [[14, 15], [20, 21]])
+
+    with pytest.raises(ValueError):
+        load_mesh(str(path), bbox=(10, -98, 12, -96))
+    with pytest.raises(ValueError):
+        load_mesh(str(path), bbox=(42, -98, 41, -96))
+
+
+def test_load_mesh_grib2_bbox(tmp_path, write_grib2):
+    path = tmp_path / 'grid.grib2'
+    write_grib2(path, np.arange(12).reshape(3, 4))
+
+    # western-hemisphere bbox against 0..360 GRIB longitudes
+    lats, lons, data = load_mesh(str(path), bbox=(40.5, -99.5, 41.5, -97.5))
+    np.testing.assert_array_equal(lats, [41])
+    np.testing.assert_array_equal(lons, [261, 262])
+    np.testing.assert_array_equal(data, [[5, 6]])
+
+
+@pytest.mark.parametrize('bbox', [None, (20.5, -129.5, 21.5, -128.0)])
+def test_grib2_engines_agree(tmp_path, bbox, write_grib2):
+    rng = np.random.default_rng(0)
+    values = np.round(rng.gamma(2.0, 10.0, size=(50, 80)), 1)
+    values[::3, ::7] = np.nan   # missing in the bitmap
+    path = tmp_path / 'MESH_20240501-000000.grib2'
+    write_grib2(path, values, north=22.0, west=-130.0, step=0.05)
+
+    fast = load_mesh(str(path), bbox=bbox, engine='eccodes')
+    slow = load_mesh(str(path), bbox=bbox, engine='cfgrib')
+    np.testing.assert_array_equal(fast[0], slow[0])
+    np.testing.assert_array_equal(fast[1], slow[1])
+    assert fast[2].dtype == slow[2].dtype == np.float32
+    np.testing.assert_array_equal(fast[2], slow[2])
+    assert np.isnan(fast[2]).any()
+
+
+def test_decode_grib2_from_gzipped_bytes(tmp_path, write_grib2):
+    import gzip
+
+    path = tmp_path / 'grid.grib2'
+    write_grib2(path, np.arange(12).reshape(3, 4))
+    gz = tmp_path / 'MESH_20240501-000000.grib2.gz'
+    gz.write_bytes(gzip.compress(path.read_bytes()))
+
+    lats, lons, data = decode_grib2(gzip.decompress(gz.read_bytes()))
+    np.testing.assert_array_equal(lats, [42, 41, 40])
+    np.testing.assert_array_equal(lons, [260, 261, 262, 263])
+    np.testing.assert_array_equal(data, np.arange(12).reshape(3, 4))
+    # auto decodes the gzip in memory without a cfgrib cache entry
+    np.testing.assert_array_equal(load_mesh(str(gz))[2], data)
+
+    with pytest.raises(ValueError):
+        decode_grib2(path.read_bytes() * 2)
+    with pytest.raises(KeyError):
+        load_mesh(str(path), variable='MESH', engine='eccodes')
@@ -0,0 +1,75 @@
+import csv
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from mesh_cli import main
+from mesh_utils import point_cells, sample
+from process_mesh import SparseGrid
+
+
+def _grid():
+    # 0.01 degree MRMS-style grid, north to south
+    lats = np.round(40.1 - 0.01 * np.arange(11), 4)
+    lons = np.round(-100 + 0.01 * np.arange(21), 4)
+    data = np.zeros((11, 21), dtype='f4')
+    data[5, 10] = 30   # 40.05, -99.90
+    data[5, 12] = 45   # 40.05, -99.88
+    return lats, lons, data
+
+
+def test_point_cells_is_arithmetic():
+    lats, lons, _ = _grid()
+    rows, cols, inside = point_cells(lats, lons, [40.051, 39.0, 40.1], [-99.899, -99.9, 260.05 - 360])
+    assert rows[0] == 5 and cols[0] == 10
+    assert list(inside) == [True, False, True]
+
+
+def test_sample_dense_sparse_and_neighbourhood():
+    lats, lons, data = _grid()
+    plat, plon = [40.05, 40.05, 40.0], [-99.90, -99.89, -99.90]
+    dense = sample(lats, lons, data, plat, plon)
+    sparse = sample(lats, lons, SparseGrid.from_dense(lats, lons, data), plat, plon)
+    np.testing.assert_array_equal(dense, [30, np.nan, np.nan])
+    np.testing.assert_array_equal(sparse, dense)
+    # 0.01 deg is ~1.1 km north-south and ~0.85 km east-west at 40N
+    near = sample(lats, lons, data, plat, plon, radius_km=1.0)
+    np.testing.assert_array_equal(near, [30, 45, np.nan])
+
+
+def _write_hours(tmp_path, write_nc):
+    lats, lons, data = _grid()
+    for hour, scale in ((10, 1), (11, 2)):
+        write_nc(tmp_path / f'MESH_20240501-{hour}0000.nc', data * scale, lats=lats, lons=lons)
+
+
+def test_query_cli(tmp_path, write_nc):
+    _write_hours(tmp_path, write_nc)
+    points = tmp_path / 'points.csv'
+    points.write_text('id,Latitude,Longitude\na,40.05,-99.90\nb,35,-90\n')
+    out = tmp_path / 'out.csv'
+    main(['query', str(points), str(out), str(tmp_path / '*.nc'), '--jobs', '2'])
+    rows = list(csv.DictReader(open(out)))
+    assert rows[0]['id'] == 'a' and float(rows[0]['mesh_max']) == 60
+    assert rows[0]['mesh_max_time'].startswith('2024-05-01T11:00:00')
+    assert rows[1]['mesh_max'] == ''
+
+
+def test_query_parquet_round_trip(tmp_path, write_nc):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+
+    _write_hours(tmp_path, write_nc)
+    points = tmp_path / 'points.parquet'
+    pq.write_table(pa.table({'id': ['a', 'b'], 'lat': [40.05, 35.0], 'lon': [-99.90, -90.0]}), points)
+    out = tmp_path / 'out.parquet'
+    main(['query', str(points), str(out), str(tmp_path / '*.nc'), '--jobs', '1'])
+    table = pq.read_table(out)
+    assert table.column_names == ['id', 'lat', 'lon', 'mesh_max', 'mesh_max_time']
+    rows = table.to_pylist()
+    assert rows[0]['id'] == 'a' and rows[0]['mesh_max'] == 60
+    assert rows[0]['mesh_max_time'].startswith('2024-05-01T11:00:00')
+    assert rows[1]['mesh_max'] is None and rows[1]['mesh_max_time'] is None
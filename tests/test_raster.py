@@ -0,0 +1,68 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from mesh_utils import render_rgba, save_overlay, colormap_lut
+from process_mesh import SparseGrid
+
+
+def test_render_rgba_transparency_orientation_and_sparse():
+    lats = np.array([40., 41., 42.])  # south to north
+    lons = np.array([-100., -99.])
+    data = np.array([[1, 10], [np.nan, 2], [5, 0]], dtype='f4')
+    rgba = render_rgba(lats, lons, data)
+    assert rgba.shape == (3, 2, 4)
+    # north-up: the last input row comes first
+    np.testing.assert_array_equal(rgba[..., 3], [[255, 0], [0, 255], [0, 255]])
+    lut = colormap_lut()
+    np.testing.assert_array_equal(rgba[1, 1], lut[0])     # vmin = 2
+    np.testing.assert_array_equal(rgba[2, 1], lut[-1])    # vmax = 10
+    sparse = render_rgba(lats, lons, SparseGrid.from_dense(lats, lons, data))
+    np.testing.assert_array_equal(sparse, rgba)
+
+
+def test_save_overlay_png_roundtrip(tmp_path):
+    from PIL import Image
+
+    lats = np.array([42., 41.])
+    lons = np.array([-100., -99., -98.])
+    data = np.array([[0, 3, 4], [5, 0, 0]], dtype='f4')
+    path = tmp_path / 'overlay.png'
+    save_overlay(lats, lons, data, str(path))
+    with Image.open(path) as img:
+        assert img.mode == 'RGBA'
+        np.testing.assert_array_equal(np.asarray(img), render_rgba(lats, lons, data))
+
+
+def test_max_pool_keeps_block_maxima():
+    from mesh_utils import max_pool
+
+    lats = np.array([43., 42., 41., 40., 39.])
+    lons = np.array([-100., -99., -98.])
+    data = np.full((5, 3), np.nan, dtype='f4')
+    data[0, 1] = 7
+    data[4, 2] = 3
+    plat, plon, pooled = max_pool(lats, lons, data, 2)
+    np.testing.assert_array_equal(pooled, [[7, np.nan], [np.nan, np.nan], [np.nan, 3]])
+    np.testing.assert_allclose(plat, [42.5, 40.5, 39])
+    np.testing.assert_allclose(plon, [-99.5, -98])
+
+
+def test_save_animation_streams_frames(tmp_path, write_nc):
+    from PIL import Image
+    from mesh_utils import save_animation
+
+    files = []
+    for n in range(5):
+        path = str(tmp_path / f'MESH_20240501-00{n}000.nc')
+        grid = np.zeros((4, 6), dtype='f4')
+        grid[1, n] = 10 + 8 * n  # distinct, or the GIF merges frames
+        write_nc(path, grid, lats=[42, 41, 40, 39])
+        files.append(path)
+    out = str(tmp_path / 'anim.gif')
+    save_animation(files, out, pin=(40.5, -97.0), downsample=2, jobs=2, ahead=2,
+                   vmin=2, vmax=50)
+    with Image.open(out) as img:
+        assert img.n_frames == 5
@@ -0,0 +1,145 @@
+import os
+import sys
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import realtime
+
+
+def _key(day, n):
+    return f'MESHMax/{day}/MRMS_MESH_Max_{day}-{n:06d}.grib2.gz'
+
+
+def test_list_keys_paginates(fake_s3):
+    s3 = fake_s3
+    for n in range(25):
+        s3.put(realtime.BUCKET, _key('20240501', n))
+    keys = [o['Key'] for o in realtime.list_keys(s3, 'MESHMax/', page_size=10)]
+    assert len(keys) == 25
+    assert s3.list_calls == 3
+
+
+def test_poll_is_incremental_and_survives_restart(tmp_path, fake_s3):
+    s3 = fake_s3
+    out = str(tmp_path / 'data')
+    os.makedirs(out)
+    for n in range(3):
+        s3.put(realtime.BUCKET, _key('20240501', n))
+    s3.put(realtime.BUCKET, _key('20240502', 0))
+    s3.fail[_key('20240502', 0)] = 1  # recovered by a retry
+
+    state = {'since': '20240501'}
+    done = realtime.poll(s3, 'MESHMax/', out, state, jobs=2, backoff=0, today=date(2024, 5, 2))
+    assert len(done) == 4
+    assert not [f for f in os.listdir(out) if f.endswith('.part')]
+    assert state['last_key'] == _key('20240502', 0)
+
+    # a fresh watcher resumes from the persisted high-water mark
+    s3.put(realtime.BUCKET, _key('20240502', 1))
+    s3.fail[_key('20240502', 1)] = 5
+    state = realtime.load_state(out)
+    assert realtime.poll(s3, 'MESHMax/', out, state, retries=1, backoff=0,
+                         today=date(2024, 5, 2)) == []
+    assert state['last_key'] == _key('20240502', 0)
+
+    done = realtime.poll(s3, 'MESHMax/', out, state, retries=5, backoff=0, today=date(2024, 5, 2))
+    assert [os.path.basename(p) for p in done] == [os.path.basename(_key('20240502', 1))]
+    assert realtime.load_state(out)['last_key'] == _key('20240502', 1)
+
+
+def test_pipeline_renders_new_files(tmp_path, fake_s3, write_nc):
+    import asyncio
+    import gzip
+
+    import numpy as np
+
+    for n in range(3):
+        nc = tmp_path / f'{n}.nc'
+        write_nc(nc, np.full((3, 4), 10 + n))
+        fake_s3.put(realtime.BUCKET, f'MESHMax/20240501/MESH_20240501-00{n}000.nc.gz',
+                    gzip.compress(nc.read_bytes()))
+    fake_s3.put(realtime.BUCKET, 'MESHMax/20240501/MESH_20240501-009000.nc.gz', b'corrupt')
+
+    out, render = str(tmp_path / 'data'), str(tmp_path / 'render')
+    metrics = asyncio.run(realtime.run_pipeline(
+        fake_s3, 'MESHMax/', out, render, {'since': '20240501'}, once=True,
+        queue_size=1, backoff=0, partitioned=False))
+
+    assert sorted(os.listdir(render)) == sorted(
+        f'MESH_20240501-00{n}000.{ext}' for n in range(3) for ext in ('png', 'tif'))
+    assert metrics['fetch']['count'] == 4
+    assert metrics['decode']['errors'] == 1
+    assert metrics['render']['count'] == 3
+    assert metrics['fetch']['queue_max'] <= 1
+    state = realtime.load_state(out)
+    assert state['last_key'].endswith('009000.nc.gz')
+    # the corrupt file is kept for another try rather than skipped for good
+    assert state['retry'] == ['MESHMax/20240501/MESH_20240501-009000.nc.gz']
+
+
+def test_pipeline_retries_failed_downloads_after_restart(tmp_path, fake_s3, write_nc):
+    import asyncio
+    import gzip
+
+    import numpy as np
+
+    nc = tmp_path / 'grid.nc'
+    write_nc(nc, np.full((3, 4), 20))
+    keys = [f'MESHMax/20240501/MESH_20240501-00{n}000.nc.gz' for n in range(3)]
+    for key in keys:
+        fake_s3.put(realtime.BUCKET, key, gzip.compress(nc.read_bytes()))
+    fake_s3.fail[keys[0]] = 99
+
+    out, render = str(tmp_path / 'data'), str(tmp_path / 'render')
+    metrics = asyncio.run(realtime.run_pipeline(
+        fake_s3, 'MESHMax/', out, render, {'since': '20240501'}, once=True,
+        retries=1, backoff=0, partitioned=False))
+    assert metrics['fetch']['errors'] == 1 and metrics['render']['count'] == 2
+    # the failed first key neither stalls the mark nor is forgotten
+    state = realtime.load_state(out)
+    assert state == {'since': '20240501', 'last_key': keys[2], 'retry': [keys[0]]}
+
+    del fake_s3.fail[keys[0]]
+    metrics = asyncio.run(realtime.run_pipeline(
+        fake_s3, 'MESHMax/', out, render, state, once=True, backoff=0, partitioned=False))
+    assert metrics['fetch']['count'] == 1 and metrics['render']['count'] == 1
+    assert realtime.load_state(out) == {'since': '20240501', 'last_key': keys[2], 'retry': []}
+    assert len(os.listdir(render)) == 6
+
+
+def test_list_dir_follows_pages_and_listing_cache_expires(fake_s3):
+    for day in ('20240501', '20240502', '20240503'):
+        fake_s3.put(realtime.BUCKET, f'MESHMax/{day}/MESH_{day}-000000.nc.gz')
+    fake_s3.put(realtime.BUCKET, 'MESHMax/README.txt')
+    prefixes, objects = realtime.list_dir(fake_s3, 'MESHMax/', page_size=2)
+    assert prefixes == [f'MESHMax/2024050{d}/' for d in (1, 2, 3)]
+    assert [o['Key'] for o in objects] == ['MESHMax/README.txt']
+    assert fake_s3.list_calls == 2
+
+    now = [0.0]
+    cache = realtime.ListingCache(fake_s3, ttl=30, clock=lambda: now[0])
+    calls = fake_s3.list_calls
+    cache.list('MESHMax/')
+    cache.list('MESHMax/')
+    assert fake_s3.list_calls == calls + 1
+    now[0] = 31
+    cache.list('MESHMax/')
+    cache.invalidate('MESHMax/')
+    cache.list('MESHMax/')
+    assert fake_s3.list_calls == calls + 3
+
+
+def test_hour_groups_and_download_progress(tmp_path, fake_s3):
+    keys = [f'MESHMax/20240501/MESH_20240501-{h:02d}{m:02d}00.nc.gz'
+            for h in (0, 1) for m in (0, 30)]
+    for key in keys:
+        fake_s3.put(realtime.BUCKET, key, b'x' * 10)
+    _, objects = realtime.list_dir(fake_s3, 'MESHMax/20240501/')
+    groups = realtime.hour_groups(objects)
+    assert list(groups) == ['00', '01'] and [len(g) for g in groups.values()] == [2, 2]
+
+    seen = {}
+    done, failed = realtime.download_all(fake_s3, keys, str(tmp_path), jobs=3,
+                                         progress=lambda key, n: seen.__setitem__(key, n))
+    assert len(done) == 4 and not failed
+    assert seen == {key: 10 for key in keys}
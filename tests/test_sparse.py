@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import process_mesh
+from process_mesh import SparseGrid, load_mesh
+
+
+def test_sparse_roundtrip_and_lookup():
+    data = np.zeros((4, 5), dtype='f4')
+    data[1, 2] = 3.5
+    data[3, 0] = 12
+    data[2, 4] = 1.9
+    grid = SparseGrid.from_dense(np.arange(4), np.arange(5), data)
+    assert grid.nnz == 2
+    rows, cols = grid.cells()
+    assert list(zip(rows, cols)) == [(1, 2), (3, 0)]
+    dense = grid.to_dense(fill=0)
+    np.testing.assert_array_equal(dense, np.where(data >= 2, data, 0))
+    np.testing.assert_array_equal(grid.lookup([1, 3, 0], [2, 0, 0], fill=0), [3.5, 12, 0])
+
+
+def test_load_mesh_sparse_reads_row_blocks(tmp_path, monkeypatch, write_nc):
+    monkeypatch.setattr(process_mesh, 'SPARSE_BLOCK_ROWS', 2)
+    data = np.zeros((5, 6), dtype='f4')
+    data[0, 0] = 4
+    data[3, 5] = 8
+    data[4, 2] = 2
+    path = tmp_path / 'grid.nc'
+    write_nc(path, data)
+
+    lats, lons, grid = load_mesh(str(path), sparse=True)
+    assert isinstance(grid, SparseGrid)
+    assert grid.shape == (5, 6)
+    np.testing.assert_array_equal(grid.to_dense(fill=0), data)
+
+    lats, lons, grid = load_mesh(str(path), sparse=True, bbox=(40, -98.5, 41.5, -94))
+    np.testing.assert_array_equal(lats, [41, 40])
+    assert grid.shape == (2, 4)
+    np.testing.assert_array_equal(grid.to_dense(fill=0), data[3:, 2:])
+
+
+def test_save_geotiff_accepts_sparse(tmp_path):
+    import rasterio
+    from mesh_utils import save_geotiff
+
+    data = np.zeros((3, 3), dtype='f4')
+    data[1, 1] = 5
+    lats, lons = np.array([42., 41., 40.]), np.array([-100., -99., -98.])
+    grid = SparseGrid.from_dense(lats, lons, data)
+    path = tmp_path / 'out.tif'
+    save_geotiff(lats, lons, grid, str(path))
+    with rasterio.open(path) as src:
+        band = src.read(1, masked=True)
+        assert band[1, 1] == 5
+        assert band.count() == 1
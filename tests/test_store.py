@@ -0,0 +1,48 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+import h5py
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from mesh_utils import ingest, load_store, store_times
+from mesh_cli import main
+
+
+def _name(hour):
+    return f'MRMS_MESH_Max_1440min_00.50_20240228-{hour:02d}0000.nc'
+
+
+def test_ingest_is_resumable_and_append_only(tmp_path, write_nc):
+    grids = {h: np.full((3, 4), h, dtype='f4') for h in (10, 11, 12)}
+    for h, grid in grids.items():
+        write_nc(tmp_path / _name(h), grid)
+    store = str(tmp_path / 'mesh.h5')
+
+    assert ingest([str(tmp_path / _name(11)), str(tmp_path / _name(10))], store) == 2
+    main(['ingest', store, str(tmp_path)])
+    assert ingest([str(tmp_path / _name(10))], store) == 0
+
+    times = store_times(store)
+    assert [t.hour for t in times] == [10, 11, 12]
+    lats, lons, data = load_store(store, time=datetime(2024, 2, 28, 11, tzinfo=timezone.utc))
+    np.testing.assert_array_equal(data, grids[11])
+    assert lats.shape == (3,) and lons.shape == (4,)
+    with h5py.File(store, 'r') as h5:
+        assert h5['mesh'].chunks[0] == 1
+        assert h5['mesh'].compression == 'gzip'
+
+
+def test_load_store_window(tmp_path, write_nc):
+    grid = np.arange(12, dtype='f4').reshape(3, 4)
+    write_nc(tmp_path / _name(10), grid)
+    store = str(tmp_path / 'mesh.h5')
+    ingest([str(tmp_path / _name(10))], store)
+    lats, lons, data = load_store(store, bbox=(40.5, -99.5, 41.5, -97.5))
+    np.testing.assert_array_equal(lats, [41])
+    np.testing.assert_array_equal(lons, [-99, -98])
+    np.testing.assert_array_equal(data, [[5, 6]])
+    with pytest.raises(KeyError):
+        load_store(store, time=datetime(2024, 1, 1, tzinfo=timezone.utc))
@@ -0,0 +1,111 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from mesh_cli import main
+from mesh_utils import make_tiles
+from mesh_utils.tiles import tile_index, tile_pixels
+
+
+def _write(path, write_nc):
+    data = np.zeros((101, 101), dtype='f4')
+    data[48:53, 48:53] = 25   # around 40N, 100W
+    write_nc(path, data, lats=np.round(45 - 0.1 * np.arange(101), 3).astype('f4'),
+             lons=np.round(-105 + 0.1 * np.arange(101), 3).astype('f4'))
+
+
+def test_tile_index_roundtrips_pixel_centres():
+    plat, plon = tile_pixels(6, 14, 24)
+    x, y = tile_index(plat, plon, 6)
+    assert set(x) == {14} and set(y) == {24}
+
+
+def test_make_tiles_skips_empty_tiles_and_reuses_zooms(tmp_path, write_nc):
+    from PIL import Image
+
+    src = str(tmp_path / 'MESH_20240501-000000.nc')
+    _write(src, write_nc)
+    out = str(tmp_path / 'tiles')
+    root, written = make_tiles(src, out_dir=out, min_zoom=3, max_zoom=6, jobs=1, cache=False)
+    assert root == out
+    tiles = sorted(os.path.relpath(os.path.join(d, f), out)
+                   for d, _, files in os.walk(out) for f in files)
+    assert len(tiles) == written and not any(t.startswith('.tmp') for t in tiles)
+
+    for z in range(3, 7):
+        x, y = (int(v) for v in tile_index(40.0, -100.0, z))
+        with Image.open(os.path.join(out, str(z), str(x), f'{y}.png')) as img:
+            alpha = np.asarray(img)[..., 3]
+        plat, plon = tile_pixels(z, x, y)
+        i, j = np.abs(plat - 40.0).argmin(), np.abs(plon + 100.0).argmin()
+        assert alpha[i, j] == 255
+        assert alpha.min() == 0
+    # a 0.5 degree storm never spans more than 2x2 tiles at zoom 6
+    assert len(os.listdir(os.path.join(out, '6'))) <= 2
+
+    assert make_tiles(src, out_dir=out, min_zoom=3, max_zoom=6, jobs=1, cache=False)[1] == 0
+
+
+def test_cli_tiles_parallel(tmp_path, capsys, write_nc):
+    src = str(tmp_path / 'MESH_20240501-000000.nc')
+    _write(src, write_nc)
+    out = str(tmp_path / 'tiles')
+    main(['--no-cache', 'tiles', src, '--out-dir', out, '--min-zoom', '5', '--max-zoom', '5',
+          '-j', '2'])
+    assert 'Wrote' in capsys.readouterr().out
+    assert os.listdir(os.path.join(out, '5'))
+
+
+def test_tile_cache_is_keyed_by_options_and_evicted(tmp_path, monkeypatch, write_nc):
+    import process_mesh
+    from mesh_utils import tiles, tile_root
+
+    monkeypatch.setattr(tiles, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(process_mesh, 'CACHE_MAX_BYTES', 1)
+    src = str(tmp_path / 'MESH_20240501-000000.nc')
+    _write(src, write_nc)
+    assert tile_root(src) != tile_root(src, threshold=30) != tile_root(src, variable='MESH')
+
+    first, written = make_tiles(src, min_zoom=3, max_zoom=4, jobs=1, cache=False)
+    assert written and first == tile_root(src)
+    # a different threshold gets its own pyramid, with no tiles at 30 mm
+    second, written = make_tiles(src, min_zoom=3, max_zoom=4, jobs=1, cache=False, threshold=30)
+    assert second != first and written == 0
+    # over the size limit the least recently used pyramid goes, never the one just made
+    assert os.path.isdir(second) and not os.path.exists(first)
+
+
+def test_tile_pyramid_in_use_is_not_evicted(tmp_path, monkeypatch, write_nc):
+    import process_mesh
+    from mesh_utils import tiles, tile_root
+
+    monkeypatch.setattr(tiles, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(process_mesh, 'CACHE_MAX_BYTES', 1)
+    src = str(tmp_path / 'MESH_20240501-000000.nc')
+    _write(src, write_nc)
+    first = tile_root(src)
+    # another process is still writing the first pyramid
+    with process_mesh.GridCache(os.path.dirname(first)).use(first):
+        make_tiles(src, min_zoom=3, max_zoom=3, jobs=1, cache=False)
+        second, _ = make_tiles(src, min_zoom=3, max_zoom=3, jobs=1, cache=False, threshold=30)
+        assert os.path.isdir(first) and os.path.isdir(second)
+    make_tiles(src, min_zoom=3, max_zoom=3, jobs=1, cache=False, threshold=30)
+    assert not os.path.exists(first)
+
+
+def test_failed_zoom_rename_raises_unless_another_writer_won(tmp_path, monkeypatch, write_nc):
+    import pytest
+
+    src = str(tmp_path / 'MESH_20240501-000000.nc')
+    _write(src, write_nc)
+
+    def fail(src_dir, dst):
+        raise PermissionError(dst)
+
+    monkeypatch.setattr(os, 'rename', fail)
+    with pytest.raises(PermissionError):
+        make_tiles(src, out_dir=str(tmp_path / 'tiles'), min_zoom=3, max_zoom=3, jobs=1,
+                   cache=False)
+    assert os.listdir(tmp_path / 'tiles') == []
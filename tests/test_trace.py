@@ -0,0 +1,80 @@
+import gzip
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+import mesh_trace
+from mesh_cli import main
+from mesh_utils import save_overlay
+from process_mesh import load_mesh
+
+
+@pytest.fixture(autouse=True)
+def _no_profile(monkeypatch):
+    monkeypatch.delenv(mesh_trace.ENV_VAR, raising=False)
+    yield
+    mesh_trace.disable()
+
+
+def _write_gz(path, write_nc):
+    nc = str(path)[:-3]
+    write_nc(nc, np.arange(12).reshape(3, 4) * 3)
+    with open(nc, 'rb') as f_in, gzip.open(path, 'wb') as f_out:
+        f_out.write(f_in.read())
+    os.remove(nc)
+
+
+def _chrome_events(path):
+    text = path.read_text().rstrip().rstrip(',')
+    return json.loads(text + ']')
+
+
+def test_disabled_spans_are_shared_no_ops(tmp_path):
+    a = mesh_trace.span('x', bytes=1)
+    assert a is mesh_trace.span('y')
+    with a as s:
+        s.set(cells=3)
+    assert not mesh_trace.enabled()
+
+
+def test_chrome_trace_nests_stages(tmp_path, write_nc):
+    src = tmp_path / 'MESH_20240501-000000.nc.gz'
+    _write_gz(src, write_nc)
+    trace = tmp_path / 'trace.json'
+    mesh_trace.enable(str(trace), truncate=True)
+    assert os.environ[mesh_trace.ENV_VAR] == str(trace)
+    lats, lons, data = load_mesh(str(src))
+    save_overlay(lats, lons, data, str(tmp_path / 'overlay.png'))
+    with pytest.raises(KeyError):
+        with mesh_trace.span('failing'):
+            raise KeyError('x')
+    mesh_trace.disable()
+    assert mesh_trace.ENV_VAR not in os.environ
+
+    events = {e['name']: e for e in _chrome_events(trace) if e['ph'] == 'X'}
+    assert {'gunzip', 'decode', 'load_mesh', 'render_rgba', 'save_png'} <= set(events)
+    outer, inner = events['load_mesh'], events['decode']
+    assert outer['ts'] <= inner['ts'] and inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur'] + 1
+    assert events['gunzip']['args']['bytes_out'] > events['gunzip']['args']['bytes_in'] > 0
+    assert events['decode']['args']['shape'] == [3, 4]
+    assert events['decode']['args']['peak_rss_mib'] > 0
+    assert events['failing']['args']['error'] == 'KeyError'
+
+
+def test_cli_profile_writes_json_lines(tmp_path, write_nc):
+    src = tmp_path / 'MESH_20240501-000000.nc.gz'
+    _write_gz(src, write_nc)
+    trace = tmp_path / 'trace.jsonl'
+    trace.write_text('stale\n')
+    main(['--no-cache', '--profile', str(trace), 'plot', str(src),
+          '--png', str(tmp_path / 'out.png')])
+    records = [json.loads(line) for line in trace.read_text().splitlines()]
+    names = [r['name'] for r in records]
+    assert names[-1] == 'cli.plot'
+    assert {'load_mesh', 'mask', 'pcolormesh', 'savefig'} <= set(names)
+    assert all(r['ms'] >= 0 for r in records)
+    assert not mesh_trace.enabled()